@@ -0,0 +1,301 @@
+"""
+Out-of-specification detection and SPC statistics for test results.
+
+``SampleTestLink.pass_or_fail`` is whatever the poster entered; nothing
+compares ``test_result`` with the acceptance limits of the test.  This
+module does, and adds the trend statistics of an individuals control
+chart, per test:
+
+* OOS: results below ``Test.min_acceptable_result`` or above
+  ``Test.max_acceptable_result`` (either limit may be absent), and the
+  number of stored ``pass_or_fail`` flags that disagree with the limits;
+* mean, sample standard deviation, minimum and maximum;
+* moving ranges of consecutive results and their mean, which estimates
+  the within-process sigma as ``MR-bar / d2`` (``d2 = 1.128``);
+* Cpk from the within sigma and Ppk from the overall standard deviation;
+* Western Electric rule violations around the mean, in units of the
+  within sigma: (1) one point beyond 3 sigma, (2) two of three
+  consecutive points beyond 2 sigma on the same side, (3) four of five
+  beyond 1 sigma on the same side and (4) eight consecutive points on the
+  same side.  A rule is counted at every point that completes a window
+  satisfying it.
+
+Results are read in time order (``deadline``, then ``id``) per test
+through the ``(test, deadline, id)`` index, ``ANALYTICS_CHUNK_SIZE`` rows
+per round-trip, with the decimal column cast to a float in SQL, and
+collected into NumPy arrays; with sharded results (see ``sharding.py``)
+the shards are read side by side and their streams merged in that order.
+All statistics are computed over the whole array at once, with
+``reduceat`` over the per-test segments and cumulative sums for the
+sliding windows of the rules, so the cost per row is a handful of vector
+operations rather than interpreted Python.
+
+NumPy is optional.  Without it :func:`analyse` falls back to
+:func:`analyse_rows`, a plain per-row loop that returns the same results;
+``benchmark_analytics`` compares the two.
+"""
+
+from __future__ import annotations
+
+import heapq
+import math
+from itertools import islice
+
+from django.conf import settings
+from django.db.models import FloatField
+from django.db.models.functions import Cast
+
+from . import sharding
+from .models import SampleTestLink, Test
+
+try:
+    import numpy as np  # type: ignore
+except ImportError:  # pragma: no cover
+    np = None  # type: ignore
+
+
+# Bias correction relating the mean moving range of two points to sigma.
+D2 = 1.128
+# (name, window, points required, threshold in sigma), checked on each side.
+RULES = (
+    ("rule_1", 1, 1, 3.0),
+    ("rule_2", 3, 2, 2.0),
+    ("rule_3", 5, 4, 1.0),
+    ("rule_4", 8, 8, 0.0),
+)
+# Number of most recent OOS results and rule violations listed per test.
+RECENT = 10
+
+
+def chunk_size() -> int:
+    return getattr(settings, "ANALYTICS_CHUNK_SIZE", 20000)
+
+
+def result_chunks(queryset, size: int | None = None):
+    """Yield lists of ``(test_id, id, result, pass_or_fail)`` tuples in analysis order.
+
+    With sharded results the ordered streams of the shards are merged.
+    """
+    size = size or chunk_size()
+    ordered = queryset.annotate(result_value=Cast("test_result", FloatField())).order_by("test_id", "deadline", "id")
+    databases = sharding.databases_for(SampleTestLink)
+    if len(databases) == 1:
+        rows = (
+            ordered.using(databases[0])
+            .values_list("test_id", "id", "result_value", "pass_or_fail")
+            .iterator(chunk_size=size)
+        )
+    else:
+        streams = [
+            ordered.using(database)
+            .values_list("test_id", "deadline", "id", "result_value", "pass_or_fail")
+            .iterator(chunk_size=size)
+            for database in databases
+        ]
+        merged = heapq.merge(*streams, key=lambda row: row[:3])
+        rows = ((test_id, pk, value, passed) for test_id, _, pk, value, passed in merged)
+    while True:
+        chunk = list(islice(rows, size))
+        if not chunk:
+            return
+        yield chunk
+
+
+def test_limits(test_ids) -> dict:
+    """Return ``{test_id: (sop_id, lower, upper)}`` with ``None`` for absent limits."""
+    # Retired tests keep their limits for the results recorded against them.
+    rows = Test._base_manager.filter(pk__in=list(test_ids)).values_list(
+        "pk", "sop_id", "min_acceptable_result", "max_acceptable_result"
+    )
+    return {
+        pk: (sop_id, None if lower is None else float(lower), None if upper is None else float(upper))
+        for pk, sop_id, lower, upper in rows
+    }
+
+
+def capability(mean, sigma, lower, upper):
+    """Cpk/Ppk: distance from the mean to the nearer limit in units of 3 sigma."""
+    if sigma is None or not sigma > 0:
+        return None
+    sides = []
+    if upper is not None:
+        sides.append((upper - mean) / (3 * sigma))
+    if lower is not None:
+        sides.append((mean - lower) / (3 * sigma))
+    return min(sides) if sides else None
+
+
+def _summary(test_id, limits, count, mean, std, minimum, maximum, oos, mismatches, mr_bar,
+             rules, oos_ids, violation_ids) -> dict:
+    sop_id, lower, upper = limits.get(test_id, (None, None, None))
+    sigma = mr_bar / D2 if mr_bar is not None else None
+    return {
+        "test": test_id,
+        "sop": sop_id,
+        "count": count,
+        "lower_limit": lower,
+        "upper_limit": upper,
+        "mean": mean,
+        "std": std,
+        "min": minimum,
+        "max": maximum,
+        "oos": oos,
+        "oos_rate": oos / count,
+        "pass_or_fail_mismatches": mismatches,
+        "mr_bar": mr_bar,
+        "sigma_within": sigma,
+        "cpk": capability(mean, sigma, lower, upper),
+        "ppk": capability(mean, std, lower, upper),
+        "western_electric": rules,
+        "recent_oos": oos_ids,
+        "recent_violations": violation_ids,
+    }
+
+
+# ---------------------------------------------------------------------------
+# Reference implementation: one Python iteration per row
+# ---------------------------------------------------------------------------
+
+def analyse_rows(rows, limits: dict) -> list[dict]:
+    """Per-row implementation over ``(test_id, id, result, pass_or_fail)`` tuples."""
+    results = []
+    start = 0
+    while start < len(rows):
+        test_id = rows[start][0]
+        end = start
+        while end < len(rows) and rows[end][0] == test_id:
+            end += 1
+        group = rows[start:end]
+        start = end
+        _, lower, upper = limits.get(test_id, (None, None, None))
+        count = len(group)
+        mean = sum(row[2] for row in group) / count
+        std = math.sqrt(sum((row[2] - mean) ** 2 for row in group) / (count - 1)) if count > 1 else None
+        oos_ids, mismatches = [], 0
+        for _, pk, value, passed in group:
+            out = (lower is not None and value < lower) or (upper is not None and value > upper)
+            if out:
+                oos_ids.append(pk)
+            if (lower is not None or upper is not None) and passed == out:
+                mismatches += 1
+        mr_bar = None
+        if count > 1:
+            mr_bar = sum(abs(group[i][2] - group[i - 1][2]) for i in range(1, count)) / (count - 1)
+        sigma = mr_bar / D2 if mr_bar is not None else None
+        rules = {name: 0 for name, *_ in RULES}
+        violated = []
+        if sigma is not None and sigma > 0:
+            z = [(row[2] - mean) / sigma for row in group]
+            for i in range(count):
+                fired = False
+                for name, window, needed, threshold in RULES:
+                    if i < window - 1:
+                        continue
+                    recent = z[i - window + 1: i + 1]
+                    if (sum(1 for value in recent if value > threshold) >= needed
+                            or sum(1 for value in recent if -value > threshold) >= needed):
+                        rules[name] += 1
+                        fired = True
+                if fired:
+                    violated.append(group[i][1])
+        results.append(_summary(
+            test_id, limits, count, mean, std, min(row[2] for row in group), max(row[2] for row in group),
+            len(oos_ids), mismatches, mr_bar, rules, oos_ids[::-1][:RECENT], violated[::-1][:RECENT],
+        ))
+    return results
+
+
+# ---------------------------------------------------------------------------
+# Vectorised implementation
+# ---------------------------------------------------------------------------
+
+def load_arrays(queryset, size: int | None = None) -> dict:
+    """Read the results of ``queryset`` into NumPy column arrays, chunk by chunk."""
+    parts = [np.array(chunk, dtype=np.float64) for chunk in result_chunks(queryset, size)]
+    table = np.concatenate(parts) if parts else np.empty((0, 4))
+    return {
+        "test": table[:, 0].astype(np.int64),
+        "id": table[:, 1].astype(np.int64),
+        "value": table[:, 2],
+        "passed": table[:, 3].astype(bool),
+    }
+
+
+def _recent(ids, flags, starts, ends) -> list[list[int]]:
+    positions = np.flatnonzero(flags)
+    first = np.searchsorted(positions, starts)
+    last = np.searchsorted(positions, ends)
+    return [ids[positions[max(lo, hi - RECENT):hi]][::-1].tolist() for lo, hi in zip(first, last)]
+
+
+def analyse_arrays(arrays: dict, limits: dict) -> list[dict]:
+    """Vectorised implementation over the arrays of :func:`load_arrays`."""
+    tests, ids, values, passed = arrays["test"], arrays["id"], arrays["value"], arrays["passed"]
+    total = len(values)
+    if not total:
+        return []
+    starts = np.flatnonzero(np.r_[True, tests[1:] != tests[:-1]])
+    ends = np.r_[starts[1:], total]
+    counts = ends - starts
+    group = np.repeat(np.arange(len(starts)), counts)
+    position = np.arange(total) - starts[group]
+    group_tests = tests[starts].tolist()
+
+    nan = float("nan")
+    bounds = [limits.get(test_id, (None, None, None))[1:] for test_id in group_tests]
+    lower = np.array([nan if lo is None else lo for lo, _ in bounds])
+    upper = np.array([nan if hi is None else hi for _, hi in bounds])
+    # Comparisons with NaN are false, so an absent limit never flags a result.
+    oos = (values < lower[group]) | (values > upper[group])
+    has_limits = ~(np.isnan(lower) & np.isnan(upper))
+    mismatches = has_limits[group] & (passed == oos)
+
+    with np.errstate(invalid="ignore", divide="ignore"):
+        mean = np.add.reduceat(values, starts) / counts
+        deviation = values - mean[group]
+        std = np.sqrt(np.add.reduceat(deviation * deviation, starts) / (counts - 1))
+        moving_range = np.abs(np.diff(values, prepend=values[0]))
+        moving_range[position == 0] = 0.0
+        mr_bar = np.add.reduceat(moving_range, starts) / (counts - 1)
+        sigma = mr_bar / D2
+        z = np.where((sigma > 0)[group], deviation / sigma[group], nan)
+
+    any_rule = np.zeros(total, dtype=bool)
+    rule_counts = {}
+    for name, window, needed, threshold in RULES:
+        fired = np.zeros(total, dtype=bool)
+        for side in (z, -z):
+            hits = np.cumsum(side > threshold)
+            in_window = hits.copy()
+            in_window[window:] -= hits[:-window]
+            fired |= (in_window >= needed) & (position >= window - 1)
+        rule_counts[name] = np.add.reduceat(fired.astype(np.int64), starts).tolist()
+        any_rule |= fired
+
+    oos_counts = np.add.reduceat(oos.astype(np.int64), starts).tolist()
+    mismatch_counts = np.add.reduceat(mismatches.astype(np.int64), starts).tolist()
+    minimum = np.minimum.reduceat(values, starts).tolist()
+    maximum = np.maximum.reduceat(values, starts).tolist()
+    recent_oos = _recent(ids, oos, starts, ends)
+    recent_violations = _recent(ids, any_rule, starts, ends)
+    counts, mean, std, mr_bar = counts.tolist(), mean.tolist(), std.tolist(), mr_bar.tolist()
+    return [
+        _summary(
+            test_id, limits, counts[i], mean[i],
+            std[i] if counts[i] > 1 else None, minimum[i], maximum[i],
+            oos_counts[i], mismatch_counts[i],
+            mr_bar[i] if counts[i] > 1 else None,
+            {name: rule_counts[name][i] for name, *_ in RULES},
+            recent_oos[i], recent_violations[i],
+        )
+        for i, test_id in enumerate(group_tests)
+    ]
+
+
+def analyse(queryset, size: int | None = None) -> list[dict]:
+    """Per-test OOS and SPC statistics for the ``SampleTestLink`` rows of ``queryset``."""
+    if np is None:
+        rows = [row for chunk in result_chunks(queryset, size) for row in chunk]
+        return analyse_rows(rows, test_limits({row[0] for row in rows}))
+    arrays = load_arrays(queryset, size)
+    return analyse_arrays(arrays, test_limits(np.unique(arrays["test"]).tolist()))
@@ -8,4 +8,8 @@ from django.apps import AppConfig
 class LimsAppConfig(AppConfig):
     default_auto_field = "django.db.models.BigAutoField"
     name = "lims_app"
-    verbose_name = "LISMS"
\ No newline at end of file
+    verbose_name = "LISMS"
+
+    def ready(self) -> None:
+        # Connect the signal handlers that maintain derived tables.
+        from . import signals  # noqa: F401
\ No newline at end of file
@@ -0,0 +1,160 @@
+"""
+Async (ASGI) versions of the hot read endpoints.
+
+Served under ASGI, a synchronous DRF view holds a worker thread for as long
+as its queries run, so a few slow requests are enough to exhaust the
+thread pool.  The views here are native ``async`` Django views::
+
+    GET /api/async/samples/
+    GET /api/async/sample-test-links/
+    GET /api/async/dashboard/warehouse-clients/
+    GET /api/async/dashboard/version-changes/
+
+The list views take their queryset, serializer, filters and ordering from
+the corresponding viewset in ``views.py`` and accept the same ``?fields=``,
+``?expand=``, ``?depth=``, ``?ordering=`` and filter parameters.  Pages
+are read with ``QuerySet.aiterator()`` (see
+``pagination.AsyncKeysetPagination``) and the reference tables nested
+objects are rendered from (see ``refdata.py``) are loaded before
+rendering, so serialization does not touch the database.  The dashboard
+views read the summary tables the same way.  JWTs are verified with
+``Auth0JWTAuthentication.authenticate_async``, which never blocks the
+event loop on a JWKS fetch.
+
+With sample sharding on (see ``sharding.py``) the list views gather their
+pages from the shards like the synchronous ones.  The response bodies
+have the same shape as the synchronous endpoints; only the opaque cursor
+strings differ.  Under WSGI the views still work,
+each request running on its own event loop.
+"""
+
+from __future__ import annotations
+
+from asgiref.sync import sync_to_async
+from django.core.exceptions import SynchronousOnlyOperation
+from django.http import HttpResponse
+from django.views import View
+from rest_framework import exceptions
+from rest_framework.renderers import JSONRenderer
+
+from . import dashboard, sharding
+from .authentication import Auth0JWTAuthentication
+from .fieldsets import FieldSpec
+from .filters import QueryParamFilterBackend
+from .pagination import AsyncKeysetPagination
+from .querysets import optimize_queryset, plan_queryset
+from .refdata import preload_reference_tables
+from .serializers import DashboardVersionChangeSerializer, DashboardWarehouseClientsSerializer
+from .views import SampleTestLinkViewSet, SampleViewSet
+
+
+class AsyncAPIView(View):
+    """Authentication and JSON rendering shared by the async views."""
+
+    http_method_names = ["get", "head", "options"]
+    authentication_class = Auth0JWTAuthentication
+
+    def render(self, data, status: int = 200) -> HttpResponse:
+        return HttpResponse(JSONRenderer().render(data), status=status, content_type="application/json")
+
+    async def authenticate(self, request) -> None:
+        user = await request.auser()
+        if not user.is_authenticated:
+            result = await self.authentication_class().authenticate_async(request)
+            if result is not None:
+                user, request.auth = result
+        # Same rule as ``IsAuthenticated`` on the synchronous views.
+        if user is None or not user.is_authenticated:
+            raise exceptions.NotAuthenticated()
+
+    async def dispatch(self, request, *args, **kwargs):
+        try:
+            await self.authenticate(request)
+            return await super().dispatch(request, *args, **kwargs)
+        except (exceptions.NotAuthenticated, exceptions.AuthenticationFailed) as exc:
+            # The session backend comes first and sends no WWW-Authenticate
+            # header, so DRF answers these with 403 as well.
+            return self.render({"detail": exc.detail}, status=403)
+        except exceptions.APIException as exc:
+            detail = exc.detail if isinstance(exc.detail, (list, dict)) else {"detail": exc.detail}
+            return self.render(detail, status=exc.status_code)
+
+
+class AsyncListView(AsyncAPIView):
+    """Paginated list of the rows served by ``viewset``'s list endpoint."""
+
+    viewset = None
+
+    def get_ordering(self, request) -> list[str]:
+        allowed = set(getattr(self.viewset, "ordering_fields", ()))
+        raw = request.GET.get("ordering")
+        if raw:
+            terms = [term.strip() for term in raw.split(",")]
+            ordering = [term for term in terms if term and term.lstrip("-") in allowed]
+            if ordering:
+                return ordering
+        ordering = getattr(self.viewset, "ordering", None) or ("pk",)
+        return [ordering] if isinstance(ordering, str) else list(ordering)
+
+    def get_queryset(self, request, paginator, context):
+        viewset = self.viewset
+        queryset = viewset.queryset.all()
+        filter_fields = getattr(viewset, "filter_fields", None)
+        if filter_fields:
+            conditions = QueryParamFilterBackend().build_conditions(request.GET, queryset.model, filter_fields)
+            if conditions:
+                queryset = queryset.filter(**conditions)
+        if context["field_spec"] is None:
+            return optimize_queryset(queryset, viewset.serializer_class)
+        plan = plan_queryset(viewset.serializer_class(context=context))
+        plan.columns.extend(name for name, _ in paginator.ordering)
+        return plan.apply(queryset, defer=True)
+
+    async def get(self, request, *args, **kwargs):
+        serializer_class = self.viewset.serializer_class
+        context = {"field_spec": FieldSpec.from_query_params(request.GET)}
+        model = serializer_class.Meta.model
+        if sharding.enabled() and issubclass(self.viewset, sharding.ShardedViewSetMixin):
+            paginator = sharding.ShardedPagination(model, self.get_ordering(request))
+            queryset = self.get_queryset(request, paginator, context)
+            aliases = await sync_to_async(sharding.list_shards)(self.viewset.shard_key, request.GET)
+            rows, next_link, previous_link = await paginator.apaginate(queryset, request, aliases)
+        else:
+            paginator = AsyncKeysetPagination(model, self.get_ordering(request))
+            queryset = self.get_queryset(request, paginator, context)
+            rows, next_link, previous_link = await paginator.paginate(queryset, request)
+        serializer = serializer_class(rows, many=True, context=context)
+        await sync_to_async(preload_reference_tables)(serializer)
+        try:
+            results = serializer.data
+        except SynchronousOnlyOperation:
+            # A reference row created after its table was loaded is fetched
+            # on its own (see ``refdata.py``), which needs a thread.
+            results = await sync_to_async(lambda: serializer.data)()
+        return self.render({"next": next_link, "previous": previous_link, "results": results})
+
+
+class AsyncSampleListView(AsyncListView):
+    viewset = SampleViewSet
+
+
+class AsyncSampleTestLinkListView(AsyncListView):
+    viewset = SampleTestLinkViewSet
+
+
+class AsyncDashboardWarehouseClientsView(AsyncAPIView):
+    """Async counterpart of ``views.DashboardWarehouseClientsView``."""
+
+    async def get(self, request, *args, **kwargs):
+        rows = [row async for row in dashboard.warehouse_clients_query().aiterator()]
+        formatted = dashboard.format_warehouse_clients(rows)
+        return self.render(DashboardWarehouseClientsSerializer(formatted, many=True).data)
+
+
+class AsyncDashboardVersionChangeView(AsyncAPIView):
+    """Async counterpart of ``views.DashboardVersionChangeView``."""
+
+    async def get(self, request, *args, **kwargs):
+        rows = [row async for row in dashboard.version_changes_query().aiterator()]
+        formatted = dashboard.format_version_changes(rows)
+        return self.render(DashboardVersionChangeSerializer(formatted, many=True).data)
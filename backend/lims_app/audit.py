@@ -0,0 +1,348 @@
+"""
+Audit trail of the changes made through the API.
+
+Every create, update and delete handled by a model viewset, including the
+rows written by ``<resource>/bulk/``, is recorded as an
+:class:`~lims_app.models.AuditEntry` saying who changed what and why:
+
+* the actor is the ``sub`` claim of the Auth0 token in ``request.auth``,
+  or the username of a session login;
+* the changes are a field-level diff, ``{field: [old, new]}``, of the
+  row's concrete fields;
+* the comment is taken from the ``X-Audit-Comment`` request header.  It is
+  required (``AUDIT_REQUIRE_COMMENT``): a write without one is rejected
+  with 400 before anything is saved.
+
+Entries are not inserted by the request that makes the change.  Once its
+transaction has committed they are put on a bounded in-process queue, and
+a background thread inserts them with ``bulk_create`` whenever
+``AUDIT_BATCH_SIZE`` entries are waiting or ``AUDIT_FLUSH_INTERVAL``
+seconds have passed since the first of them arrived.  A write request
+pays for building a dict per row and a queue put, and a bulk upload of
+thousands of results adds a few batched inserts, off the request path.
+
+When the queue is full or an insert fails (the database is down, say),
+the entries are appended to a JSON-lines spool file in
+``AUDIT_SPOOL_DIR`` and fsynced instead of being dropped.  After its next
+successful insert the writer loads the spool files of its own process,
+and those left behind by processes that are no longer running, back into
+the database.  A spool file is renamed to ``*.<pid>.replay`` while it is
+replayed; one left behind because its process died mid-replay is claimed
+and replayed again (its entries may then be inserted twice, but are not
+lost).  Entries still queued when the process exits are flushed by
+an ``atexit`` hook; only a hard crash loses the entries of the last flush
+interval.  With ``AUDIT_ASYNC = False`` entries are inserted on commit,
+in the request.
+"""
+
+from __future__ import annotations
+
+import atexit
+import datetime
+import glob
+import json
+import logging
+import os
+import queue
+import threading
+import time
+
+from django.conf import settings
+from django.db import close_old_connections, transaction
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+from rest_framework import exceptions
+
+from .models import AuditEntry
+
+
+logger = logging.getLogger(__name__)
+
+COMMENT_HEADER = "X-Audit-Comment"
+
+
+def require_comment(request) -> str:
+    """Return the audit comment of ``request``; raise 400 if it is missing but required."""
+    comment = (request.headers.get(COMMENT_HEADER) or "").strip()
+    if not comment and getattr(settings, "AUDIT_REQUIRE_COMMENT", True):
+        raise exceptions.ValidationError(
+            {"audit_comment": [f"Explain the change in the {COMMENT_HEADER} header."]}
+        )
+    return comment
+
+
+def actor_for(request) -> str:
+    """Who made the request: the token subject, or the session user's username."""
+    payload = getattr(request, "auth", None)
+    if isinstance(payload, dict):
+        return str(payload.get("sub") or payload.get("email") or "unknown")
+    user = getattr(request, "user", None)
+    if user is not None and user.is_authenticated:
+        return user.get_username()
+    return "anonymous"
+
+
+def _json_value(value):
+    if value is None or isinstance(value, (bool, int, float, str)):
+        return value
+    if isinstance(value, (datetime.date, datetime.time)):
+        return value.isoformat()
+    return str(value)
+
+
+def snapshot(instance) -> dict:
+    """JSON-ready values of the concrete fields of ``instance``, by field name."""
+    return {
+        field.name: _json_value(field.value_from_object(instance))
+        for field in instance._meta.concrete_fields
+    }
+
+
+def diff(before: dict, after: dict) -> dict:
+    """``{field: [old, new]}`` for the fields whose value differs."""
+    return {
+        name: [before.get(name), after.get(name)]
+        for name in {**before, **after}
+        if before.get(name) != after.get(name)
+    }
+
+
+def record(request, comment: str, model, changes) -> None:
+    """Audit ``changes``, ``(pk, action, diff)`` tuples on ``model``, once the write commits."""
+    actor = actor_for(request)
+    recorded_at = timezone.now().isoformat()
+    label = model._meta.label_lower
+    entries = [
+        {
+            "model": label,
+            "object_id": str(pk),
+            "action": action,
+            "actor": actor,
+            "comment": comment,
+            "changes": fields,
+            "recorded_at": recorded_at,
+        }
+        for pk, action, fields in changes
+    ]
+    if entries:
+        transaction.on_commit(lambda: audit_writer.submit(entries))
+
+
+class AuditWriter:
+    """Inserts audit entries in batches from a background thread, spooling to disk on failure."""
+
+    _stop = object()
+
+    def __init__(self) -> None:
+        self._queue: queue.Queue | None = None
+        self._thread: threading.Thread | None = None
+        self._lock = threading.Lock()
+        self._spool_lock = threading.Lock()
+        # Spool files this process is replaying right now.
+        self._replaying: set[str] = set()
+
+    # -- producer side -----------------------------------------------------
+
+    def submit(self, entries: list[dict]) -> None:
+        if not getattr(settings, "AUDIT_ASYNC", True):
+            try:
+                self._save(entries)
+            except Exception:
+                logger.exception("Could not write %d audit entries; spooling them to disk.", len(entries))
+                self.spool(entries)
+            return
+        pending = self._start()
+        for index, entry in enumerate(entries):
+            try:
+                pending.put_nowait(entry)
+            except queue.Full:
+                logger.warning("Audit queue full; spooling %d entries to disk.", len(entries) - index)
+                self.spool(entries[index:])
+                return
+
+    def flush(self, timeout: float = 10.0) -> bool:
+        """Insert everything queued so far; return whether that finished in time."""
+        if self._queue is None:
+            return True
+        done = threading.Event()
+        self._queue.put(done, timeout=timeout)
+        return done.wait(timeout)
+
+    def stop(self, timeout: float = 10.0) -> None:
+        if self._thread is None:
+            return
+        try:
+            self._queue.put(self._stop, timeout=timeout)
+        except queue.Full:
+            pass
+        self._thread.join(timeout)
+
+    def _start(self) -> queue.Queue:
+        if self._thread is None:
+            with self._lock:
+                if self._thread is None:
+                    self._queue = queue.Queue(maxsize=getattr(settings, "AUDIT_QUEUE_SIZE", 20000))
+                    self._thread = threading.Thread(target=self._run, name="audit-writer", daemon=True)
+                    self._thread.start()
+                    atexit.register(self.stop)
+        return self._queue
+
+    # -- writer thread -----------------------------------------------------
+
+    def _run(self) -> None:
+        batch_size = getattr(settings, "AUDIT_BATCH_SIZE", 500)
+        interval = getattr(settings, "AUDIT_FLUSH_INTERVAL", 1.0)
+        batch: list[dict] = []
+        waiters: list[threading.Event] = []
+        deadline = None
+        while True:
+            timeout = interval if deadline is None else max(0.0, deadline - time.monotonic())
+            try:
+                item = self._queue.get(timeout=timeout)
+            except queue.Empty:
+                item = None
+            if isinstance(item, threading.Event):
+                waiters.append(item)
+            elif item is not None and item is not self._stop:
+                batch.append(item)
+                if deadline is None:
+                    deadline = time.monotonic() + interval
+                if len(batch) < batch_size and time.monotonic() < deadline:
+                    continue
+            if batch:
+                self._write(batch)
+                batch, deadline = [], None
+            elif item is None:
+                # Idle: retry anything spooled while the database was unavailable.
+                self._replay()
+            for waiter in waiters:
+                waiter.set()
+            waiters = []
+            if item is self._stop:
+                close_old_connections()
+                return
+
+    def _write(self, batch: list[dict]) -> None:
+        close_old_connections()
+        try:
+            self._save(batch)
+        except Exception:
+            logger.exception("Could not write %d audit entries; spooling them to disk.", len(batch))
+            self.spool(batch)
+            return
+        self._replay()
+
+    def _save(self, entries: list[dict]) -> None:
+        # Eight columns per row; stay below the bind-parameter limit of SQL Server.
+        batch_size = max(1, getattr(settings, "BULK_PARAMETER_LIMIT", 2000) // 8)
+        with transaction.atomic():
+            AuditEntry.objects.bulk_create(
+                [AuditEntry(**{**entry, "recorded_at": parse_datetime(entry["recorded_at"])}) for entry in entries],
+                batch_size=batch_size,
+            )
+
+    # -- spool -------------------------------------------------------------
+
+    def _spool_dir(self) -> str:
+        return str(getattr(settings, "AUDIT_SPOOL_DIR", os.path.join(settings.BASE_DIR, "audit-spool")))
+
+    def _spool_path(self, pid: int) -> str:
+        return os.path.join(self._spool_dir(), f"audit-{pid}.jsonl")
+
+    def spool(self, entries: list[dict]) -> None:
+        """Append ``entries`` to this process's spool file and fsync it."""
+        with self._spool_lock:
+            os.makedirs(self._spool_dir(), exist_ok=True)
+            with open(self._spool_path(os.getpid()), "a", encoding="utf-8") as handle:
+                handle.writelines(json.dumps(entry) + "\n" for entry in entries)
+                handle.flush()
+                os.fsync(handle.fileno())
+
+    def _replayable(self) -> list[str]:
+        """Spool files to replay: unfinished replays first, then spools."""
+        directory = self._spool_dir()
+        paths = []
+        for path in sorted(glob.glob(os.path.join(directory, "audit-*.jsonl.*.replay"))):
+            pid = _claimer_pid(path)
+            # Claimed by a process that died before it finished, or by an
+            # earlier process with our PID (after a restart in a container).
+            if pid is not None and (not _running(pid) or (pid == os.getpid() and path not in self._replaying)):
+                paths.append(path)
+        for path in sorted(glob.glob(os.path.join(directory, "audit-*.jsonl"))):
+            pid = _spool_pid(path)
+            # Another live process may still be appending to it.
+            if pid is not None and (pid == os.getpid() or not _running(pid)):
+                paths.append(path)
+        return paths
+
+    def _replay(self) -> None:
+        for path in self._replayable():
+            claimed = f"{path[:path.index('.jsonl') + len('.jsonl')]}.{os.getpid()}.replay"
+            with self._spool_lock:
+                if claimed in self._replaying or (claimed != path and os.path.exists(claimed)):
+                    continue
+                try:
+                    if claimed != path:
+                        os.rename(path, claimed)
+                except OSError:
+                    continue
+                self._replaying.add(claimed)
+            try:
+                replayed = self._replay_file(path, claimed)
+            finally:
+                with self._spool_lock:
+                    self._replaying.discard(claimed)
+            if not replayed:
+                return
+
+    def _replay_file(self, path: str, claimed: str) -> bool:
+        """Insert the entries of the spool file claimed as ``claimed``; ``False`` if that failed."""
+        entries = []
+        with open(claimed, encoding="utf-8") as handle:
+            for line in handle:
+                try:
+                    entries.append(json.loads(line))
+                except ValueError:
+                    # A line cut short by a crash mid-write.
+                    logger.warning("Skipping a malformed line in audit spool %s.", path)
+        try:
+            self._save(entries)
+        except Exception:
+            logger.exception("Could not replay audit spool %s.", path)
+            self.spool(entries)
+            os.remove(claimed)
+            return False
+        os.remove(claimed)
+        logger.info("Replayed %d spooled audit entries from %s.", len(entries), path)
+        return True
+
+
+def _claimer_pid(path: str) -> int | None:
+    """The PID in ``audit-<owner>.jsonl.<pid>.replay``."""
+    try:
+        return int(os.path.basename(path).split(".")[-2])
+    except (IndexError, ValueError):
+        return None
+
+
+def _spool_pid(path: str) -> int | None:
+    try:
+        return int(os.path.basename(path)[len("audit-"):-len(".jsonl")])
+    except ValueError:
+        return None
+
+
+def _running(pid: int) -> bool:
+    if os.name == "nt":
+        # ``os.kill`` terminates the process on Windows; only replay our own spool there.
+        return True
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+
+audit_writer = AuditWriter()
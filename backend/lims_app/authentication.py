@@ -8,11 +8,26 @@ valid token is present in the ``Authorization`` header of the request it
 returns an anonymous user along with the token payload; otherwise it
 returns ``None`` to allow other authentication backends (e.g.
 SessionAuthentication) to attempt authentication.
+
+The signing keys published at Auth0's ``/.well-known/jwks.json`` endpoint
+are held in a process-wide :class:`JWKSKeyStore` so that the endpoint is
+only contacted when the cached key set expires or a token arrives signed
+with a key we have not seen yet.  Tokens that have already been verified
+are remembered by a :class:`VerifiedTokenCache` until they expire, so the
+RS256 signature check runs roughly once per token rather than once per
+request.  The async views use :meth:`Auth0JWTAuthentication.authenticate_async`,
+which never blocks the event loop: cached keys are returned directly and
+a JWKS fetch, when one is needed, runs in a worker thread.
 """
 
 from __future__ import annotations
 
+import asyncio
+import hashlib
 import json
+import threading
+import time
+from collections import OrderedDict
 from urllib.request import urlopen
 
 from django.conf import settings
@@ -25,6 +40,229 @@ except Exception as exc:  # pragma: no cover
     jwt = None  # type: ignore
 
 
+class JWKSKeyStore:
+    """Thread-safe, TTL-bound cache of JSON Web Keys indexed by ``kid``.
+
+    Keys are fetched from ``url`` (``settings.AUTH0_JWKS_URL`` by default)
+    and kept for ``ttl`` seconds.  When a token references an unknown
+    ``kid`` the store refreshes once; concurrent callers wait on the same
+    refresh instead of issuing their own request, and forced refreshes are
+    throttled by ``min_refresh_interval`` so that tokens with bogus key IDs
+    cannot be used to hammer Auth0.  If the remote endpoint is unavailable
+    (or no URL is configured) the key set is read from ``local_file``,
+    which allows air-gapped deployments and tests to run without network
+    access.
+    """
+
+    def __init__(
+        self,
+        url: str | None = None,
+        ttl: float | None = None,
+        local_file: str | None = None,
+        min_refresh_interval: float | None = None,
+        timeout: float | None = None,
+    ) -> None:
+        self._url = url
+        self._ttl = ttl
+        self._local_file = local_file
+        self._min_refresh_interval = min_refresh_interval
+        self._timeout = timeout
+        self._keys: dict[str, dict] = {}
+        self._fetched_at: float | None = None
+        self._generation = 0
+        self._lock = threading.Lock()
+
+    # Configuration is resolved lazily so that settings overrides (and the
+    # benchmark command) take effect without rebuilding the store.
+    @property
+    def url(self) -> str | None:
+        if self._url is not None:
+            return self._url
+        return getattr(settings, "AUTH0_JWKS_URL", None)
+
+    @property
+    def ttl(self) -> float:
+        if self._ttl is not None:
+            return self._ttl
+        return getattr(settings, "AUTH0_JWKS_CACHE_TTL", 3600)
+
+    @property
+    def local_file(self) -> str | None:
+        if self._local_file is not None:
+            return self._local_file
+        return getattr(settings, "AUTH0_JWKS_FILE", None)
+
+    @property
+    def min_refresh_interval(self) -> float:
+        if self._min_refresh_interval is not None:
+            return self._min_refresh_interval
+        return getattr(settings, "AUTH0_JWKS_MIN_REFRESH_INTERVAL", 30)
+
+    @property
+    def timeout(self) -> float:
+        if self._timeout is not None:
+            return self._timeout
+        return getattr(settings, "AUTH0_JWKS_TIMEOUT", 5)
+
+    def get_key(self, kid: str | None) -> dict | None:
+        """Return the RSA key for ``kid``, refreshing the key set if needed."""
+        generation = self._generation
+        if self._is_stale():
+            self.refresh(seen_generation=generation)
+        key = self._keys.get(kid)
+        if key is None and self._age() >= self.min_refresh_interval:
+            # Unknown key ID: Auth0 may have rotated its signing keys.
+            self.refresh(seen_generation=generation)
+            key = self._keys.get(kid)
+        return key
+
+    async def aget_key(self, kid: str | None) -> dict | None:
+        """Async :meth:`get_key`; network and file I/O run off the event loop."""
+        key = self._keys.get(kid)
+        if key is not None and not self._is_stale():
+            return key
+        return await asyncio.to_thread(self.get_key, kid)
+
+    def refresh(self, seen_generation: int | None = None) -> None:
+        """Reload the key set.
+
+        ``seen_generation`` is the generation the caller observed before
+        deciding to refresh.  If another thread completed a refresh in the
+        meantime the call returns immediately, which makes concurrent
+        refreshes collapse into a single fetch.
+        """
+        with self._lock:
+            if seen_generation is not None and seen_generation != self._generation:
+                return
+            jwks = self._load()
+            if jwks is not None:
+                self._keys = self._index(jwks)
+            # Even a failed fetch resets the clock so that an unreachable
+            # endpoint is retried once per interval rather than per request;
+            # any previously cached keys remain in use until then.
+            self._fetched_at = time.monotonic()
+            self._generation += 1
+
+    def clear(self) -> None:
+        """Drop all cached keys so that the next lookup refetches them."""
+        with self._lock:
+            self._keys = {}
+            self._fetched_at = None
+            self._generation += 1
+
+    def _age(self) -> float:
+        if self._fetched_at is None:
+            return float("inf")
+        return time.monotonic() - self._fetched_at
+
+    def _is_stale(self) -> bool:
+        return self._age() >= self.ttl
+
+    def _load(self) -> dict | None:
+        url = self.url
+        if url:
+            try:
+                with urlopen(url, timeout=self.timeout) as response:
+                    return json.loads(response.read())
+            except Exception:
+                if not self.local_file:
+                    return None
+        if self.local_file:
+            try:
+                with open(self.local_file, "r", encoding="utf-8") as fh:
+                    return json.load(fh)
+            except (OSError, ValueError):
+                return None
+        return None
+
+    @staticmethod
+    def _index(jwks: dict) -> dict[str, dict]:
+        keys = {}
+        for key in jwks.get("keys", []):
+            keys[key.get("kid")] = {
+                "kty": key.get("kty"),
+                "kid": key.get("kid"),
+                "use": key.get("use"),
+                "n": key.get("n"),
+                "e": key.get("e"),
+            }
+        return keys
+
+
+class VerifiedTokenCache:
+    """Bounded, thread-safe LRU cache of verified token payloads.
+
+    Entries are keyed by the SHA-256 digest of the raw token so that the
+    bearer credential itself is never kept in memory, and each entry is
+    discarded once the token's ``exp`` claim has passed.  Tokens without
+    an ``exp`` claim are never cached.  ``hits`` and ``misses`` count
+    lookups since the cache was created or last cleared.
+    """
+
+    def __init__(self, max_size: int | None = None) -> None:
+        self._max_size = max_size
+        self._entries: OrderedDict[str, tuple[float, dict]] = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    @property
+    def max_size(self) -> int:
+        if self._max_size is not None:
+            return self._max_size
+        return getattr(settings, "AUTH0_TOKEN_CACHE_SIZE", 1024)
+
+    @staticmethod
+    def _digest(token: str) -> str:
+        return hashlib.sha256(token.encode()).hexdigest()
+
+    def get(self, token: str) -> dict | None:
+        """Return a copy of the cached payload for ``token`` or ``None``."""
+        digest = self._digest(token)
+        with self._lock:
+            entry = self._entries.get(digest)
+            if entry is not None:
+                expires_at, payload = entry
+                if expires_at > time.time():
+                    self._entries.move_to_end(digest)
+                    self.hits += 1
+                    return dict(payload)
+                del self._entries[digest]
+            self.misses += 1
+            return None
+
+    def set(self, token: str, payload: dict) -> None:
+        """Remember ``payload`` as the verified claims of ``token``."""
+        max_size = self.max_size
+        try:
+            expires_at = float(payload["exp"])
+        except (KeyError, TypeError, ValueError):
+            return
+        if max_size <= 0 or expires_at <= time.time():
+            return
+        digest = self._digest(token)
+        with self._lock:
+            self._entries[digest] = (expires_at, dict(payload))
+            self._entries.move_to_end(digest)
+            while len(self._entries) > max_size:
+                self._entries.popitem(last=False)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self.hits = 0
+            self.misses = 0
+
+    def stats(self) -> dict[str, int]:
+        with self._lock:
+            return {"hits": self.hits, "misses": self.misses, "size": len(self._entries)}
+
+
+# Shared by every ``Auth0JWTAuthentication`` instance in the process.
+jwks_store = JWKSKeyStore()
+token_cache = VerifiedTokenCache()
+
+
 class Auth0JWTAuthentication(authentication.BaseAuthentication):
     """Authenticates requests using an Auth0-issued JWT.
 
@@ -35,37 +273,26 @@ class Auth0JWTAuthentication(authentication.BaseAuthentication):
     is raised.
     """
 
-    def authenticate(self, request):  # type: ignore[override]
+    key_store = jwks_store
+    token_cache = token_cache
+
+    def _get_token(self, request) -> str | None:
         auth_header = request.headers.get("Authorization")
         if not auth_header:
             return None
         parts = auth_header.split()
         if parts[0].lower() != "bearer" or len(parts) != 2:
             return None
-        token = parts[1]
         if jwt is None:
             raise exceptions.AuthenticationFailed(
                 "python-jose is not installed; cannot validate JWT."
             )
+        return parts[1]
+
+    def _decode(self, token: str, rsa_key: dict | None) -> dict:
+        if rsa_key is None:
+            raise exceptions.AuthenticationFailed("Unauthenticated: Unable to find appropriate key")
         try:
-            # Fetch the signing keys from Auth0.  The JWKS endpoint returns
-            # a set of keys that can be used to verify the JWT signature.
-            jsonurl = urlopen(f"https://{settings.AUTH0_DOMAIN}/.well-known/jwks.json")
-            jwks = json.loads(jsonurl.read())
-            unverified_header = jwt.get_unverified_header(token)
-            rsa_key = None
-            for key in jwks.get("keys", []):
-                if key.get("kid") == unverified_header.get("kid"):
-                    rsa_key = {
-                        "kty": key.get("kty"),
-                        "kid": key.get("kid"),
-                        "use": key.get("use"),
-                        "n": key.get("n"),
-                        "e": key.get("e"),
-                    }
-                    break
-            if rsa_key is None:
-                raise exceptions.AuthenticationFailed("Unable to find appropriate key")
             payload = jwt.decode(
                 token,
                 rsa_key,
@@ -75,6 +302,24 @@ class Auth0JWTAuthentication(authentication.BaseAuthentication):
             )
         except Exception as exc:
             raise exceptions.AuthenticationFailed(f"Unauthenticated: {exc}")
+        self.token_cache.set(token, payload)
+        return payload
+
+    def _kid(self, token: str) -> str | None:
+        try:
+            return jwt.get_unverified_header(token).get("kid")
+        except Exception as exc:
+            raise exceptions.AuthenticationFailed(f"Unauthenticated: {exc}")
+
+    def authenticate(self, request):  # type: ignore[override]
+        token = self._get_token(request)
+        if token is None:
+            return None
+        payload = self.token_cache.get(token)
+        if payload is None:
+            # Look up the signing key in the cached JWKS.  The store only
+            # contacts Auth0 when its copy has expired or the ``kid`` is new.
+            payload = self._decode(token, self.key_store.get_key(self._kid(token)))
         # At this point the token is valid.  Since Auth0 stores user
         # information in the token, you could look up a corresponding
         # ``UserAccount`` instance here or create one on the fly.  For
@@ -83,5 +328,15 @@ class Auth0JWTAuthentication(authentication.BaseAuthentication):
         # ``request.auth`` to examine token claims if necessary.
         return (None, payload)
 
+    async def authenticate_async(self, request):
+        """Async counterpart of :meth:`authenticate` for plain Django requests."""
+        token = self._get_token(request)
+        if token is None:
+            return None
+        payload = self.token_cache.get(token)
+        if payload is None:
+            payload = self._decode(token, await self.key_store.aget_key(self._kid(token)))
+        return (None, payload)
+
     def authenticate_header(self, request):  # type: ignore[override]
-        return "Bearer"
\ No newline at end of file
+        return "Bearer"
@@ -0,0 +1,78 @@
+"""
+Helpers for the API benchmark commands.
+
+:class:`Timings` collects per-request latencies and query counts and
+summarises them as the JSON-ready dict the ``benchmark_*`` commands print:
+p50/p95/p99/mean latency in milliseconds, throughput in requests per
+second and mean/max query counts.  Percentiles use the nearest-rank
+method on the raw samples so that runs on different commits can be
+compared directly.
+"""
+
+from __future__ import annotations
+
+import math
+import subprocess
+import time
+from contextlib import contextmanager
+
+from django.conf import settings
+from django.db import connection, reset_queries
+from django.test.utils import CaptureQueriesContext
+
+
+def percentile(values: list[float], quantile: float) -> float:
+    """Nearest-rank percentile of ``values`` (which need not be sorted)."""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    rank = max(1, math.ceil(quantile * len(ordered)))
+    return ordered[rank - 1]
+
+
+class Timings:
+    """Latency and query-count samples for one benchmarked operation."""
+
+    def __init__(self) -> None:
+        self.seconds: list[float] = []
+        self.queries: list[int] = []
+        self.errors = 0
+
+    @contextmanager
+    def measure(self):
+        # The query log keeps at most 9000 entries, after which the count
+        # of a capture is wrong; start every measurement from an empty log.
+        reset_queries()
+        with CaptureQueriesContext(connection) as ctx:
+            start = time.perf_counter()
+            yield
+            elapsed = time.perf_counter() - start
+        self.seconds.append(elapsed)
+        self.queries.append(len(ctx.captured_queries))
+
+    def summary(self) -> dict:
+        total = sum(self.seconds)
+        count = len(self.seconds)
+        return {
+            "requests": count,
+            "errors": self.errors,
+            "p50_ms": round(percentile(self.seconds, 0.50) * 1000, 3),
+            "p95_ms": round(percentile(self.seconds, 0.95) * 1000, 3),
+            "p99_ms": round(percentile(self.seconds, 0.99) * 1000, 3),
+            "mean_ms": round(total / count * 1000, 3) if count else 0.0,
+            "throughput_rps": round(count / total, 1) if total else 0.0,
+            "queries_mean": round(sum(self.queries) / count, 2) if count else 0.0,
+            "queries_max": max(self.queries, default=0),
+        }
+
+
+def git_revision() -> str | None:
+    """Short hash of the checked-out commit, if the code runs from a git tree."""
+    try:
+        result = subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            cwd=settings.BASE_DIR, capture_output=True, text=True, timeout=5, check=True,
+        )
+    except (OSError, subprocess.SubprocessError):
+        return None
+    return result.stdout.strip() or None
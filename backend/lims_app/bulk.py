@@ -0,0 +1,301 @@
+"""
+Bulk create, update and upsert support for high-volume resources.
+
+Instrument results arrive in batches of hundreds of rows.  Posting them one
+at a time costs a transaction and a round-trip per row, so viewsets that
+mix in :class:`BulkWriteMixin` expose ``POST /api/<resource>/bulk/``,
+which accepts a JSON list of rows and writes them with ``bulk_create`` and
+``bulk_update`` in a single transaction::
+
+    POST /api/sample-test-links/bulk/?mode=upsert
+    [{"sample": 1, "test": 3, "test_result": "4.2", ...}, ...]
+
+``mode`` is one of:
+
+``create`` (default)
+    Every row is inserted.
+``update``
+    Rows carry an ``id``; only the fields present in a row are changed.
+``upsert``
+    Rows are matched on the view's ``bulk_upsert_keys`` (a natural key such
+    as ``("sample", "test")``); matches are updated, the rest inserted.
+
+Rows are validated in one pass: each row goes through a flat serializer in
+which foreign keys are plain IDs, and the referenced IDs are then checked
+with one ``pk__in`` query per related table instead of one query per row;
+like the single-row endpoints, rows cannot refer to or update retired
+records (see ``retire.py``).  Invalid rows are reported by index and
+skipped without aborting the rest of the batch.  All statements are
+chunked so that no query exceeds ``BULK_PARAMETER_LIMIT`` bind parameters
+(SQL Server refuses more than 2100).  Every written row is audited like a
+single write (see ``audit.py``), so the request needs an
+``X-Audit-Comment`` header.  On a sharded resource (see ``sharding.py``)
+the rows are grouped by the shard they belong on and each group is
+written in its own transaction; a group that fails reports its rows as
+errors without undoing the others.
+"""
+
+from __future__ import annotations
+
+from django.conf import settings
+from django.db import DatabaseError, router, transaction
+from rest_framework import exceptions, serializers, status
+from rest_framework.decorators import action
+from rest_framework.response import Response
+from rest_framework.validators import UniqueValidator
+
+from . import audit, sharding
+from .models import AuditEntry
+
+
+MODES = ("create", "update", "upsert")
+
+
+def parameter_limit() -> int:
+    return getattr(settings, "BULK_PARAMETER_LIMIT", 2000)
+
+
+def chunked(items: list, size: int):
+    size = max(1, size)
+    for start in range(0, len(items), size):
+        yield items[start:start + size]
+
+
+class BulkRowSerializer(serializers.ModelSerializer):
+    """Flat serializer used to validate bulk rows without touching the database.
+
+    Relations are accepted as raw primary keys (validated later in bulk) and
+    map to the ``<name>_id`` attribute, and the ``id`` field is writable so
+    that rows can address existing records in ``update`` mode.  Per-row
+    uniqueness validators are dropped; the database constraints still apply.
+    """
+
+    id = serializers.IntegerField(required=False)
+
+    def build_relational_field(self, field_name, relation_info):
+        model_field = relation_info.model_field
+        kwargs = {"source": model_field.attname}
+        if model_field.null:
+            kwargs.update(required=False, allow_null=True)
+        return serializers.IntegerField, kwargs
+
+    def get_validators(self):
+        return []
+
+    def get_fields(self):
+        fields = super().get_fields()
+        for field in fields.values():
+            field.validators = [
+                validator for validator in field.validators
+                if not isinstance(validator, UniqueValidator)
+            ]
+        return fields
+
+
+def bulk_row_serializer_for(model):
+    """Return a :class:`BulkRowSerializer` subclass for ``model``."""
+    meta = type("Meta", (), {"model": model, "fields": "__all__"})
+    return type(f"{model.__name__}BulkRowSerializer", (BulkRowSerializer,), {"Meta": meta})
+
+
+class BulkWriter:
+    """Validates and writes one bulk payload for ``model``."""
+
+    def __init__(self, model, upsert_keys=("id",), context=None, create_only=(), after_create=None) -> None:
+        self.model = model
+        self.upsert_keys = tuple(upsert_keys)
+        # Fields only written when a row is created; ignored on matched rows.
+        self.create_only = set(create_only)
+        # Called with the created objects inside the write transaction.
+        self.after_create = after_create
+        self.row_serializer = bulk_row_serializer_for(model)(context=context or {})
+        self.errors: dict[int, dict] = {}
+        # Audit snapshots of the updated rows before the batch changed them.
+        self.previous: dict[int, dict] = {}
+        self.written: list[tuple] = []
+
+    def _attname(self, key: str) -> str:
+        return "id" if key in ("id", "pk") else self.model._meta.get_field(key).attname
+
+    def validate(self, rows: list) -> dict[int, dict]:
+        """Validate ``rows`` and return ``{index: validated_data}`` for the good ones."""
+        valid = {}
+        for index, row in enumerate(rows):
+            if not isinstance(row, dict):
+                self.errors[index] = {"non_field_errors": ["Expected an object."]}
+                continue
+            try:
+                valid[index] = self.row_serializer.run_validation(row)
+            except exceptions.ValidationError as exc:
+                self.errors[index] = exc.detail
+        self._check_foreign_keys(valid)
+        return valid
+
+    def _check_foreign_keys(self, valid: dict[int, dict]) -> None:
+        for field in self.model._meta.concrete_fields:
+            if not field.many_to_one and not field.one_to_one:
+                continue
+            ids = {data.get(field.attname) for data in valid.values()} - {None}
+            existing = set()
+            for chunk in chunked(sorted(ids), parameter_limit()):
+                existing.update(
+                    field.related_model._default_manager.filter(pk__in=chunk).values_list("pk", flat=True)
+                )
+            for index, data in list(valid.items()):
+                value = data.get(field.attname)
+                if value is not None and value not in existing:
+                    self.errors[index] = {field.name: [f"Invalid pk \"{value}\" - object does not exist."]}
+                    del valid[index]
+
+    def _find_existing(self, valid: dict[int, dict], keys: tuple[str, ...]) -> dict[tuple, object]:
+        attnames = [self._attname(key) for key in keys]
+        wanted = {tuple(data.get(name) for name in attnames) for data in valid.values()}
+        wanted = {key for key in wanted if None not in key}
+        found = {}
+        # Each candidate contributes one parameter per key column.
+        for chunk in chunked(sorted(wanted, key=str), parameter_limit() // len(attnames)):
+            filters = {f"{name}__in": {key[i] for key in chunk} for i, name in enumerate(attnames)}
+            for obj in self.model._default_manager.filter(**filters):
+                key = tuple(getattr(obj, name) for name in attnames)
+                if key in wanted:
+                    found[key] = obj
+        return found
+
+    def write(self, rows: list, mode: str) -> list[dict]:
+        """Validate and persist ``rows``; return one result entry per written row."""
+        self.row_serializer.partial = mode == "update"
+        valid = self.validate(rows)
+        keys = ("id",) if mode == "update" else self.upsert_keys
+        existing = self._find_existing(valid, keys) if mode != "create" else {}
+        attnames = [self._attname(key) for key in keys]
+        to_create, to_update = [], []
+        update_fields: set[str] = set()
+        seen: set[tuple] = set()
+        for index, data in valid.items():
+            key = tuple(data.get(name) for name in attnames)
+            if mode != "create" and None not in key:
+                if key in seen:
+                    self.errors[index] = {"non_field_errors": [f"Duplicate {', '.join(keys)} in this batch."]}
+                    continue
+                seen.add(key)
+            obj = existing.get(key)
+            if obj is None:
+                if mode == "update":
+                    self.errors[index] = {"id": ["No row with this id exists."]}
+                    continue
+                data = {name: value for name, value in data.items() if name != "id"}
+                to_create.append((index, self.model(**data)))
+                continue
+            self.previous[index] = audit.snapshot(obj)
+            for name, value in data.items():
+                if name != "id" and name not in self.create_only:
+                    setattr(obj, name, value)
+                    update_fields.add(name)
+            to_update.append((index, obj))
+
+        field_count = len(self.model._meta.concrete_fields)
+        sharding.assign_ids(self.model, [obj for _, obj in to_create])
+        with transaction.atomic(using=router.db_for_write(self.model)):
+            if to_create:
+                self.model._base_manager.bulk_create(
+                    [obj for _, obj in to_create], batch_size=max(1, parameter_limit() // field_count)
+                )
+                if self.after_create is not None:
+                    self.after_create([obj for _, obj in to_create])
+            if to_update and update_fields:
+                # ``bulk_update`` binds a (pk, value) pair per field per row plus the pk list.
+                per_row = 2 * len(update_fields) + 1
+                self.model._base_manager.bulk_update(
+                    [obj for _, obj in to_update], sorted(update_fields),
+                    batch_size=max(1, parameter_limit() // per_row),
+                )
+        self.written = [(index, obj, AuditEntry.CREATE) for index, obj in to_create]
+        self.written += [(index, obj, AuditEntry.UPDATE) for index, obj in to_update]
+        results = [{"index": index, "id": obj.pk, "status": "created"} for index, obj in to_create]
+        results += [{"index": index, "id": obj.pk, "status": "updated"} for index, obj in to_update]
+        return sorted(results, key=lambda entry: entry["index"])
+
+    def audit_changes(self) -> list[tuple]:
+        """``(pk, action, diff)`` of every row written, for ``audit.record``."""
+        changes = []
+        for index, obj, action in self.written:
+            fields = audit.diff(self.previous.get(index, {}), audit.snapshot(obj))
+            if fields:
+                changes.append((obj.pk, action, fields))
+        return changes
+
+
+class BulkWriteMixin:
+    """Adds ``POST <resource>/bulk/`` to a ``ModelViewSet``.
+
+    Set ``bulk_upsert_keys`` to the natural key used to match rows in
+    ``upsert`` mode.  The serializer's ``Meta.create_only_fields`` are only
+    written to new rows.
+    """
+
+    bulk_upsert_keys: tuple[str, ...] = ("id",)
+
+    def get_bulk_writer(self) -> BulkWriter:
+        create_only = getattr(self.get_serializer_class().Meta, "create_only_fields", ())
+        return BulkWriter(
+            self.get_queryset().model, self.bulk_upsert_keys, self.get_serializer_context(),
+            create_only=create_only, after_create=self.bulk_created,
+        )
+
+    def bulk_created(self, objects: list) -> None:
+        """Hook run with the rows a batch inserted, inside its transaction."""
+
+    def get_bulk_groups(self, rows: list, mode: str) -> tuple[dict, dict]:
+        """``({database: [row index, ...]}, {row index: errors})`` of a payload.
+
+        Each group is written in its own transaction on ``database`` (see
+        ``sharding.on_shard``); ``None`` is the routed default.
+        """
+        return {None: list(range(len(rows)))}, {}
+
+    @action(detail=False, methods=["post"], url_path="bulk")
+    def bulk(self, request, *args, **kwargs):
+        mode = request.query_params.get("mode", "create")
+        if mode not in MODES:
+            raise exceptions.ValidationError({"mode": [f"Must be one of: {', '.join(MODES)}."]})
+        rows = request.data
+        if not isinstance(rows, list):
+            raise exceptions.ValidationError({"non_field_errors": ["Expected a list of objects."]})
+        max_rows = getattr(settings, "BULK_MAX_ROWS", 5000)
+        if len(rows) > max_rows:
+            raise exceptions.ValidationError({"non_field_errors": [f"At most {max_rows} rows per request."]})
+        comment = audit.require_comment(request)
+        groups, failed = self.get_bulk_groups(rows, mode)
+        results = []
+        for database, indexes in groups.items():
+            with sharding.on_shard(database):
+                writer = self.get_bulk_writer()
+                try:
+                    written = writer.write([rows[index] for index in indexes], mode)
+                except DatabaseError as exc:
+                    if len(groups) == 1:
+                        # The whole transaction was rolled back; nothing was written.
+                        return Response({"detail": f"Bulk write failed: {exc}"}, status=status.HTTP_409_CONFLICT)
+                    # Only this shard's transaction was rolled back.
+                    failed.update({index: {"non_field_errors": [f"Bulk write failed: {exc}"]} for index in indexes})
+                    continue
+            audit.record(request, comment, writer.model, writer.audit_changes())
+            results += [{**entry, "index": indexes[entry["index"]]} for entry in written]
+            failed.update({indexes[index]: detail for index, detail in writer.errors.items()})
+        results.sort(key=lambda entry: entry["index"])
+        errors = [{"index": index, "errors": detail} for index, detail in sorted(failed.items())]
+        if errors and not results:
+            code = status.HTTP_400_BAD_REQUEST
+        elif errors:
+            code = status.HTTP_207_MULTI_STATUS
+        else:
+            code = status.HTTP_200_OK
+        return Response(
+            {
+                "created": sum(1 for entry in results if entry["status"] == "created"),
+                "updated": sum(1 for entry in results if entry["status"] == "updated"),
+                "results": results,
+                "errors": errors,
+            },
+            status=code,
+        )
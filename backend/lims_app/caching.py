@@ -0,0 +1,179 @@
+"""
+Response caching for read-heavy reference-data endpoints.
+
+SOPs, locations, warehouses, clients and equipment change rarely but are
+read constantly.  Viewsets that mix in :class:`CachedResponseMixin` keep
+their ``list`` and ``retrieve`` responses in the Django cache configured as
+``API_CACHE_ALIAS`` (a local-memory or file-based backend, so no external
+service is needed).
+
+Invalidation uses generation counters rather than key deletion: every model
+has a generation record in the cache that the signal handlers in
+``signals.py`` bump whenever a row is saved or deleted.  The cache key of a
+response includes the generations of all models the serializer renders
+(including nested ones), so a write makes every dependent entry
+unreachable at once and the stale entries simply age out.
+
+Because the key is known before any query runs, it doubles as a strong
+validator: responses carry an ``ETag`` derived from it plus a
+``Last-Modified`` taken from the newest generation, and a request whose
+``If-None-Match`` (or ``If-Modified-Since``) matches is answered with
+``304 Not Modified`` without touching the database.
+"""
+
+from __future__ import annotations
+
+import hashlib
+import time
+from functools import lru_cache
+
+from django.conf import settings
+from django.core.cache import caches
+from django.utils.http import http_date, parse_http_date_safe
+from rest_framework import serializers, status
+from rest_framework.response import Response
+
+from . import routers
+
+
+GENERATION_PREFIX = "lisms:gen:"
+RESPONSE_PREFIX = "lisms:resp:"
+
+
+def get_cache():
+    return caches[getattr(settings, "API_CACHE_ALIAS", "default")]
+
+
+def _generation_key(model) -> str:
+    return f"{GENERATION_PREFIX}{model._meta.label_lower}"
+
+
+def get_generation(model) -> tuple[int, float]:
+    """Return ``(version, modified_timestamp)`` for ``model``.
+
+    A missing record (first use, eviction or a cleared cache) is seeded from
+    the clock rather than from zero so that it can never collide with a
+    version already baked into older cache keys.
+    """
+    cache = get_cache()
+    record = cache.get(_generation_key(model))
+    if record is None:
+        now = time.time()
+        record = (int(now * 1000), now)
+        cache.add(_generation_key(model), record, timeout=None)
+        record = cache.get(_generation_key(model), record)
+    return record
+
+
+def bump_generation(model) -> None:
+    """Invalidate every cached response that depends on ``model``."""
+    version, _ = get_generation(model)
+    now = time.time()
+    get_cache().set(_generation_key(model), (max(version + 1, int(now * 1000)), now), timeout=None)
+
+
+@lru_cache(maxsize=None)
+def serializer_models(serializer_class) -> tuple:
+    """Return every model rendered by ``serializer_class``, nested ones included."""
+    found = []
+
+    def walk(serializer):
+        model = serializer.Meta.model
+        if model not in found:
+            found.append(model)
+        for field in serializer.fields.values():
+            child = field.child if isinstance(field, serializers.ListSerializer) else field
+            if isinstance(child, serializers.ModelSerializer):
+                walk(child)
+
+    walk(serializer_class())
+    return tuple(found)
+
+
+def permission_fingerprint(request) -> str:
+    """Identify what the caller is allowed to see.
+
+    Auth0 callers are grouped by the permissions and scopes in their token,
+    so users with the same grants share cache entries.  Session users are
+    keyed individually because their permissions live in the database.
+    """
+    auth = request.auth
+    if isinstance(auth, dict):
+        permissions = auth.get("permissions") or []
+        scope = auth.get("scope") or ""
+        return "jwt:" + ",".join(sorted(permissions)) + "|" + " ".join(sorted(scope.split()))
+    user = request.user
+    if user is not None and getattr(user, "is_authenticated", False):
+        return f"user:{user.pk}"
+    return "anonymous"
+
+
+class CachedResponseMixin:
+    """Caches ``list``/``retrieve`` responses with conditional GET support."""
+
+    cache_timeout = None  # falls back to ``settings.API_CACHE_TIMEOUT``
+
+    def get_cache_dependencies(self) -> tuple:
+        return serializer_models(self.get_serializer_class())
+
+    def get_cache_key(self, request) -> tuple[str, float]:
+        generations = [get_generation(model) for model in self.get_cache_dependencies()]
+        query = sorted((key, value) for key in request.query_params for value in request.query_params.getlist(key))
+        parts = [
+            type(self).__qualname__,
+            self.action,
+            # Pagination links are absolute, built from the requester's scheme and host.
+            request.build_absolute_uri(request.path),
+            repr(query),
+            request.accepted_renderer.format,
+            permission_fingerprint(request),
+            repr([version for version, _ in generations]),
+        ]
+        digest = hashlib.sha256("\x1f".join(parts).encode()).hexdigest()
+        return digest, max(modified for _, modified in generations)
+
+    def _not_modified(self, request, etag: str, last_modified: float) -> bool:
+        if_none_match = request.headers.get("If-None-Match")
+        if if_none_match is not None:
+            candidates = [tag.strip() for tag in if_none_match.split(",")]
+            return etag in candidates or f"W/{etag}" in candidates or "*" in candidates
+        since = parse_http_date_safe(request.headers.get("If-Modified-Since", ""))
+        return since is not None and int(last_modified) <= since
+
+    def _validators(self, response, etag: str, last_modified: float):
+        response["ETag"] = etag
+        response["Last-Modified"] = http_date(last_modified)
+        # Let browsers keep the body but revalidate before every reuse.
+        response["Cache-Control"] = "private, no-cache"
+        return response
+
+    def cached_response(self, request, handler, *args, **kwargs):
+        if not getattr(settings, "API_CACHE_ENABLED", True):
+            return handler(request, *args, **kwargs)
+        digest, last_modified = self.get_cache_key(request)
+        etag = f'"{digest[:32]}"'
+        if self._not_modified(request, etag, last_modified):
+            return self._validators(Response(status=status.HTTP_304_NOT_MODIFIED), etag, last_modified)
+        cache = get_cache()
+        key = f"{RESPONSE_PREFIX}{digest}"
+        data = cache.get(key)
+        if data is None:
+            # A replica that has not caught up with the write that bumped
+            # the generation would be cached under the new key.
+            with routers.use_primary():
+                response = handler(request, *args, **kwargs)
+            if response.status_code != status.HTTP_200_OK:
+                return response
+            timeout = self.cache_timeout
+            if timeout is None:
+                timeout = getattr(settings, "API_CACHE_TIMEOUT", 300)
+            cache.set(key, response.data, timeout=timeout)
+        else:
+            response = Response(data)
+        return self._validators(response, etag, last_modified)
+
+    def list(self, request, *args, **kwargs):
+        return self.cached_response(request, super().list, *args, **kwargs)
+
+    def retrieve(self, request, *args, **kwargs):
+        return self.cached_response(request, super().retrieve, *args, **kwargs)
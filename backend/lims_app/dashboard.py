@@ -0,0 +1,231 @@
+"""
+Materialised aggregates behind the dashboard endpoints.
+
+The dashboard shows the number of distinct clients served by each warehouse
+and the average number of days between SOP effective dates.  Computing
+those with ``Count(distinct=True)``/``Avg`` scans the whole
+``WarehouseClientLink`` and ``VersionChange`` tables on every page load, so
+the results are kept in summary tables instead:
+
+* ``WarehouseClientPair`` counts the links between each warehouse/client
+  pair, and ``WarehouseClientSummary`` holds the number of pairs per
+  warehouse, i.e. its distinct client count.
+* ``VersionChangeSummary`` holds the number of changes and the total days
+  between effective dates per SOP; the average is their quotient.
+
+The summaries are adjusted by the signal handlers in ``signals.py`` each
+time a link or version change is saved or deleted, so the dashboard views
+read O(warehouses) and O(SOPs) rows.  Writes that bypass model signals
+(``bulk_create``, ``QuerySet.update``, raw SQL) are not tracked; run
+``python manage.py rebuild_dashboard_summaries`` after such imports, or
+periodically, to rebuild the tables from scratch and verify them against
+the live aggregation.
+"""
+
+from __future__ import annotations
+
+from django.db import transaction
+from django.db.models import Count, F
+
+from .models import (
+    VersionChange,
+    VersionChangeSummary,
+    WarehouseClientLink,
+    WarehouseClientPair,
+    WarehouseClientSummary,
+)
+
+
+def link_key(instance) -> tuple:
+    return (instance.warehouse_id, instance.client_id)
+
+
+def version_change_key(instance) -> tuple:
+    try:
+        days = (instance.new_effective_date - instance.old_effective_date).days
+    except TypeError:
+        days = None
+    return (instance.sop_id, days)
+
+
+# ---------------------------------------------------------------------------
+# Dashboard queries (shared by the sync and async views)
+# ---------------------------------------------------------------------------
+
+def warehouse_clients_query():
+    return (
+        WarehouseClientSummary.objects
+        .filter(total_clients__gt=0)
+        .values("warehouse__warehouse_facility", "total_clients")
+        .order_by("-total_clients", "warehouse__warehouse_facility")
+    )
+
+
+def format_warehouse_clients(rows) -> list[dict]:
+    return [
+        {
+            "warehouse_facility": row["warehouse__warehouse_facility"],
+            "total_clients": row["total_clients"],
+        }
+        for row in rows
+    ]
+
+
+def version_changes_query():
+    return (
+        VersionChangeSummary.objects
+        .filter(change_count__gt=0)
+        .values("sop__sop_name", "change_count", "total_days")
+        .order_by("sop__sop_name")
+    )
+
+
+def format_version_changes(rows) -> list[dict]:
+    return [
+        {
+            "sop_name": row["sop__sop_name"],
+            "average_days_between_effective_dates": row["total_days"] / row["change_count"],
+        }
+        for row in rows
+    ]
+
+
+# ---------------------------------------------------------------------------
+# Incremental maintenance
+# ---------------------------------------------------------------------------
+
+def add_link(warehouse_id, client_id) -> None:
+    if warehouse_id is None or client_id is None:
+        return
+    with transaction.atomic():
+        pair, _ = WarehouseClientPair.objects.select_for_update().get_or_create(
+            warehouse_id=warehouse_id, client_id=client_id
+        )
+        pair.link_count += 1
+        pair.save(update_fields=["link_count"])
+        if pair.link_count == 1:
+            WarehouseClientSummary.objects.get_or_create(warehouse_id=warehouse_id)
+            WarehouseClientSummary.objects.filter(pk=warehouse_id).update(
+                total_clients=F("total_clients") + 1
+            )
+
+
+def remove_link(warehouse_id, client_id) -> None:
+    # Removal never creates rows: during a cascading delete of a warehouse
+    # or client the summary rows may already be gone.
+    with transaction.atomic():
+        pair = (
+            WarehouseClientPair.objects.select_for_update()
+            .filter(warehouse_id=warehouse_id, client_id=client_id)
+            .first()
+        )
+        if pair is None:
+            return
+        if pair.link_count > 1:
+            pair.link_count -= 1
+            pair.save(update_fields=["link_count"])
+            return
+        pair.delete()
+        WarehouseClientSummary.objects.filter(pk=warehouse_id, total_clients__gt=0).update(
+            total_clients=F("total_clients") - 1
+        )
+
+
+def add_version_change(sop_id, days) -> None:
+    if sop_id is None or days is None:
+        return
+    with transaction.atomic():
+        VersionChangeSummary.objects.get_or_create(sop_id=sop_id)
+        VersionChangeSummary.objects.filter(pk=sop_id).update(
+            change_count=F("change_count") + 1, total_days=F("total_days") + days
+        )
+
+
+def remove_version_change(sop_id, days) -> None:
+    if sop_id is None or days is None:
+        return
+    VersionChangeSummary.objects.filter(pk=sop_id, change_count__gt=0).update(
+        change_count=F("change_count") - 1, total_days=F("total_days") - days
+    )
+
+
+# ---------------------------------------------------------------------------
+# Full rebuild and verification
+# ---------------------------------------------------------------------------
+
+def live_warehouse_clients() -> dict:
+    """Distinct client count per warehouse computed from the link table."""
+    rows = (
+        WarehouseClientLink.objects.values("warehouse_id")
+        .annotate(total=Count("client", distinct=True))
+        .order_by()
+    )
+    return {row["warehouse_id"]: row["total"] for row in rows}
+
+
+def live_version_changes() -> dict:
+    """``(change_count, total_days)`` per SOP computed from the change table."""
+    totals: dict = {}
+    rows = VersionChange.objects.values_list("sop_id", "old_effective_date", "new_effective_date")
+    for sop_id, old, new in rows.iterator(chunk_size=2000):
+        count, days = totals.get(sop_id, (0, 0))
+        totals[sop_id] = (count + 1, days + (new - old).days)
+    return totals
+
+
+def rebuild_summaries() -> None:
+    """Recompute every summary table from the live data."""
+    pairs = (
+        WarehouseClientLink.objects.values("warehouse_id", "client_id")
+        .annotate(link_count=Count("id"))
+        .order_by()
+    )
+    with transaction.atomic():
+        WarehouseClientPair.objects.all().delete()
+        WarehouseClientSummary.objects.all().delete()
+        VersionChangeSummary.objects.all().delete()
+        WarehouseClientPair.objects.bulk_create(
+            (WarehouseClientPair(**row) for row in pairs.iterator()), batch_size=500
+        )
+        WarehouseClientSummary.objects.bulk_create(
+            [
+                WarehouseClientSummary(warehouse_id=warehouse_id, total_clients=total)
+                for warehouse_id, total in live_warehouse_clients().items()
+            ],
+            batch_size=500,
+        )
+        VersionChangeSummary.objects.bulk_create(
+            [
+                VersionChangeSummary(sop_id=sop_id, change_count=count, total_days=days)
+                for sop_id, (count, days) in live_version_changes().items()
+            ],
+            batch_size=500,
+        )
+
+
+def verify_summaries() -> list[str]:
+    """Compare the summary tables with the live aggregation; return mismatches."""
+    problems = []
+    stored = {
+        row.warehouse_id: row.total_clients
+        for row in WarehouseClientSummary.objects.filter(total_clients__gt=0)
+    }
+    live = live_warehouse_clients()
+    for warehouse_id in sorted(set(stored) | set(live)):
+        if stored.get(warehouse_id, 0) != live.get(warehouse_id, 0):
+            problems.append(
+                f"warehouse {warehouse_id}: summary has {stored.get(warehouse_id, 0)} clients, "
+                f"live count is {live.get(warehouse_id, 0)}"
+            )
+    stored = {
+        row.sop_id: (row.change_count, row.total_days)
+        for row in VersionChangeSummary.objects.filter(change_count__gt=0)
+    }
+    live = live_version_changes()
+    for sop_id in sorted(set(stored) | set(live)):
+        if stored.get(sop_id, (0, 0)) != live.get(sop_id, (0, 0)):
+            problems.append(
+                f"SOP {sop_id}: summary has (changes, days) {stored.get(sop_id, (0, 0))}, "
+                f"live values are {live.get(sop_id, (0, 0))}"
+            )
+    return problems
@@ -0,0 +1,246 @@
+"""
+"Due soon" views of reagent expiry and equipment service dates.
+
+QA asks what expires or comes due in the next N days.  Viewsets that mix
+in :class:`DueSoonMixin` answer that at ``GET <resource>/due/``::
+
+    GET /api/reagents/due/?within=30
+    GET /api/maintenance-logs/due/?from=2025-01-01&to=2025-03-31
+    GET /api/reagents/due/?overdue=true&within=0
+
+``within`` counts days from today (``DUE_SOON_DAYS`` by default);
+``from``/``to`` give an explicit inclusive window and ``overdue=true``
+starts the window at the earliest date on record.  Results are ordered by
+due date then ID, paged with ``?page_size=`` and the ``next`` cursor, and
+the response carries the total ``count`` in the window.
+
+The window is not found by querying the reagent or maintenance tables.
+Each worker process keeps a :class:`DueCalendar` per model: the sorted
+list of distinct due dates, and per date a bucket holding the sorted
+primary keys due that day.  A window is two binary searches followed by
+a walk over the k entries returned, O(log n + k), and a cursor resumes
+with one more binary search inside its date bucket.  Only the rows of the
+page are then loaded, by primary key, and rendered with the viewset's
+serializer (so ``?fields=`` and ``?expand=`` work as on the list).
+
+The calendar is loaded from the ``(due date, id)`` index on first use.
+Saves and deletes in this process update it in place when their
+transaction commits (see ``signals.py``).  They also bump the model's
+cache generation (see ``caching.py``), which tells other processes to
+reload theirs.  Writes
+that bypass model signals are picked up after the generation is bumped,
+as ``generate_data`` does.
+"""
+
+from __future__ import annotations
+
+import json
+import threading
+from base64 import urlsafe_b64decode, urlsafe_b64encode
+from bisect import bisect_left, bisect_right, insort
+from datetime import date, timedelta
+
+from django.conf import settings
+from django.utils import timezone
+from django.utils.dateparse import parse_date
+from rest_framework import exceptions
+from rest_framework.decorators import action
+from rest_framework.response import Response
+from rest_framework.utils.urls import replace_query_param
+
+from .caching import bump_generation, get_generation
+from .models import MaintenanceLog, Reagent
+
+
+# Models with a due-date calendar and the date field it is keyed on.
+DUE_DATE_FIELDS = {
+    Reagent: "expiration_date",
+    MaintenanceLog: "next_service_date",
+}
+
+MAX_WITHIN_DAYS = 3650
+
+
+class DueCalendar:
+    """Primary keys bucketed by due date, ordered by ``(date, pk)``."""
+
+    def __init__(self) -> None:
+        self.dates: list[date] = []
+        self.buckets: dict[date, list[int]] = {}
+        self.due: dict[int, date] = {}
+
+    @classmethod
+    def build(cls, rows) -> DueCalendar:
+        """Build from ``(pk, due date)`` pairs already sorted by ``(date, pk)``."""
+        calendar = cls()
+        for pk, due in rows:
+            if due is None:
+                continue
+            bucket = calendar.buckets.get(due)
+            if bucket is None:
+                bucket = calendar.buckets[due] = []
+                calendar.dates.append(due)
+            bucket.append(pk)
+            calendar.due[pk] = due
+        return calendar
+
+    def __len__(self) -> int:
+        return len(self.due)
+
+    def add(self, pk: int, due: date | None) -> None:
+        """Insert ``pk`` at ``due``, moving it if it was already present."""
+        self.discard(pk)
+        if due is None:
+            return
+        bucket = self.buckets.get(due)
+        if bucket is None:
+            bucket = self.buckets[due] = []
+            insort(self.dates, due)
+        insort(bucket, pk)
+        self.due[pk] = due
+
+    def discard(self, pk: int) -> None:
+        due = self.due.pop(pk, None)
+        if due is None:
+            return
+        bucket = self.buckets[due]
+        del bucket[bisect_left(bucket, pk)]
+        if not bucket:
+            del self.buckets[due]
+            del self.dates[bisect_left(self.dates, due)]
+
+    def window(self, start: date, end: date, after: tuple[date, int] | None = None,
+               limit: int | None = None) -> list[tuple[date, int]]:
+        """Return up to ``limit`` ``(date, pk)`` entries in ``[start, end]`` following ``after``."""
+        if after is not None and after[0] > start:
+            start = after[0]
+        entries: list[tuple[date, int]] = []
+        index = bisect_left(self.dates, start)
+        while index < len(self.dates) and self.dates[index] <= end:
+            due = self.dates[index]
+            bucket = self.buckets[due]
+            first = bisect_right(bucket, after[1]) if after is not None and after[0] == due else 0
+            stop = len(bucket) if limit is None else first + limit - len(entries)
+            entries.extend((due, pk) for pk in bucket[first:stop])
+            if limit is not None and len(entries) >= limit:
+                break
+            index += 1
+        return entries
+
+    def count(self, start: date, end: date) -> int:
+        """Number of entries in ``[start, end]`` (one step per distinct date)."""
+        first, last = bisect_left(self.dates, start), bisect_right(self.dates, end)
+        return sum(len(self.buckets[due]) for due in self.dates[first:last])
+
+
+class DueIndex:
+    """Process-wide calendars, versioned by the cache generation of their model."""
+
+    def __init__(self) -> None:
+        self._calendars: dict = {}
+        self._lock = threading.Lock()
+
+    def calendar(self, model) -> DueCalendar:
+        version, _ = get_generation(model)
+        entry = self._calendars.get(model)
+        if entry is not None and entry[0] == version:
+            return entry[1]
+        with self._lock:
+            entry = self._calendars.get(model)
+            if entry is None or entry[0] != version:
+                field = DUE_DATE_FIELDS[model]
+                rows = model._base_manager.order_by(field, "pk").values_list("pk", field).iterator()
+                entry = self._calendars[model] = (version, DueCalendar.build(rows))
+            return entry[1]
+
+    def update(self, model, pk: int, due: date | None) -> None:
+        """Record that ``pk`` now falls due on ``due`` (``None`` when deleted)."""
+        with self._lock:
+            before, _ = get_generation(model)
+            bump_generation(model)
+            after, _ = get_generation(model)
+            entry = self._calendars.get(model)
+            # A calendar that was already stale is left to be reloaded.
+            if entry is not None and entry[0] == before:
+                entry[1].add(pk, due)
+                self._calendars[model] = (after, entry[1])
+
+    def clear(self) -> None:
+        with self._lock:
+            self._calendars.clear()
+
+
+due_index = DueIndex()
+
+
+def encode_cursor(entry: tuple[date, int]) -> str:
+    return urlsafe_b64encode(json.dumps([entry[0].isoformat(), entry[1]]).encode()).decode()
+
+
+def decode_cursor(encoded: str) -> tuple[date, int]:
+    try:
+        due, pk = json.loads(urlsafe_b64decode(encoded.encode()))
+        parsed = parse_date(due)
+        if parsed is None or not isinstance(pk, int):
+            raise ValueError(encoded)
+        return parsed, pk
+    except (TypeError, ValueError, UnicodeError):
+        raise exceptions.NotFound("Invalid cursor")
+
+
+class DueSoonMixin:
+    """Adds ``GET <resource>/due/`` to a viewset whose model is in ``DUE_DATE_FIELDS``."""
+
+    def get_due_window(self, request) -> tuple[date, date]:
+        params = request.query_params
+        errors = {}
+        parsed = {}
+        for name in ("from", "to"):
+            if params.get(name):
+                parsed[name] = _parse_date(params[name])
+                if parsed[name] is None:
+                    errors[name] = ["Enter a date as YYYY-MM-DD."]
+        within = params.get("within")
+        days = getattr(settings, "DUE_SOON_DAYS", 30)
+        if within:
+            try:
+                days = int(within)
+            except ValueError:
+                days = -1
+            if not 0 <= days <= MAX_WITHIN_DAYS:
+                errors["within"] = [f"Must be an integer between 0 and {MAX_WITHIN_DAYS}."]
+        if errors:
+            raise exceptions.ValidationError(errors)
+        today = timezone.localdate()
+        start = parsed.get("from") or today
+        if params.get("overdue", "").lower() in {"1", "true", "yes"}:
+            start = date.min
+        end = parsed.get("to") or today + timedelta(days=days)
+        if end < start:
+            raise exceptions.ValidationError({"to": ["Must not be before the start of the window."]})
+        return start, end
+
+    @action(detail=False, methods=["get"], url_path="due")
+    def due(self, request, *args, **kwargs):
+        start, end = self.get_due_window(request)
+        cursor = request.query_params.get("cursor")
+        after = decode_cursor(cursor) if cursor else None
+        page_size = self.paginator.get_page_size(request)
+        calendar = due_index.calendar(self.get_queryset().model)
+        entries = calendar.window(start, end, after, page_size + 1)
+        next_link = None
+        if len(entries) > page_size:
+            entries = entries[:page_size]
+            next_link = replace_query_param(request.build_absolute_uri(), "cursor", encode_cursor(entries[-1]))
+        pks = [pk for _, pk in entries]
+        found = self.get_queryset().in_bulk(pks)
+        # A row deleted by another process since the calendar was loaded is skipped.
+        serializer = self.get_serializer([found[pk] for pk in pks if pk in found], many=True)
+        return Response({"count": calendar.count(start, end), "next": next_link, "results": serializer.data})
+
+
+def _parse_date(value: str) -> date | None:
+    try:
+        return parse_date(value.strip())
+    except ValueError:
+        return None
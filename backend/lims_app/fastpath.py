@@ -0,0 +1,246 @@
+"""
+Compiled read path for the list endpoints.
+
+Rendering a page through DRF costs a ``get_attribute`` and a
+``to_representation`` call per field per row, and a full model instance
+per row and nested object.  For the deeply nested serializers
+(``SampleTestLinkSerializer`` renders a sample and a test with their
+SOPs, locations, warehouses and user account) that machinery, rather than
+the database, dominates the time of a list request.
+
+:func:`compile_serializer` therefore turns a serializer class, once, into
+
+* a flat column plan: the ``values_list()`` lookups of every rendered
+  column, nested ones included (``sample__location``,
+  ``test__user_account__email``, ...), so the page is read as tuples from
+  one joined query; and
+* a function, generated as Python source and compiled, that assembles the
+  nested dicts of a row straight from the tuple.  Columns whose DRF field
+  does not render the database value unchanged (decimals, dates, choices)
+  go through that field's own ``to_representation``; nested SOPs,
+  locations and warehouses come from the reference-data tables (see
+  ``refdata.py``) as they do on the DRF path.
+
+The result is the same data DRF would produce, key order included, and
+:class:`CompiledJSONRenderer` encodes it with ``orjson`` when that is
+installed, which gives the same bytes as DRF's ``JSONRenderer`` for the
+strings, integers, booleans and nulls a compiled page consists of.
+
+Serializers the compiler does not understand (method fields, JSON or
+float fields, to-many relations, dotted sources, custom
+``to_representation``), narrowed requests (``?fields=``/``?expand=``/
+``?depth=``) and ``API_COMPILED_READS = False`` use the DRF path.
+``python manage.py benchmark_serializers`` compares the two paths.
+"""
+
+from __future__ import annotations
+
+import itertools
+from functools import lru_cache
+
+from django.conf import settings
+from django.core.exceptions import FieldDoesNotExist
+from rest_framework import renderers, serializers
+from rest_framework.utils.encoders import JSONEncoder
+from rest_framework.response import Response
+from rest_framework.settings import api_settings
+
+from .refdata import ReferenceDataSerializer, reference_tables
+
+try:
+    import orjson
+except ImportError:  # optional; DRF's encoder is used without it
+    orjson = None
+
+
+# Fields whose ``to_representation`` returns the database value unchanged.
+_UNCHANGED = (serializers.IntegerField.to_representation, serializers.CharField.to_representation)
+# Fields rendered with their own ``to_representation``.  Everything they
+# return is a string, an integer or a boolean, so orjson and the standard
+# library encode it identically (floats are not, which excludes FloatField).
+_CONVERTED = (
+    serializers.BooleanField,
+    serializers.ChoiceField,
+    serializers.DateField,
+    serializers.DateTimeField,
+    serializers.DecimalField,
+    serializers.IntegerField,
+    serializers.TimeField,
+)
+_SERIALIZER_METHODS = (serializers.Serializer.to_representation, ReferenceDataSerializer.to_representation)
+
+
+class NotCompilable(Exception):
+    """Raised while compiling a serializer the compiled path cannot render."""
+
+
+class CompiledSerializer:
+    """Column plan and row builder generated for one serializer class."""
+
+    def __init__(self, serializer_class) -> None:
+        self.serializer_class = serializer_class
+        self.columns: list[str] = []
+        self.references: dict = {}
+        self._names = itertools.count()
+        self._globals: dict = {}
+        expression = self._compile(serializer_class(), "")
+        arguments = ", ".join(f"T{index}" for index in range(len(self.references)))
+        source = f"def make({arguments}):\n    def build(row):\n        return {expression}\n    return build\n"
+        exec(compile(source, f"<compiled {serializer_class.__name__}>", "exec"), self._globals)
+        self.source = source
+
+    def _column(self, path: str) -> str:
+        if path not in self.columns:
+            self.columns.append(path)
+        return f"row[{self.columns.index(path)}]"
+
+    def _name(self, prefix: str, value) -> str:
+        name = f"{prefix}{next(self._names)}"
+        self._globals[name] = value
+        return name
+
+    def _compile(self, serializer, prefix: str) -> str:
+        if type(serializer).to_representation not in _SERIALIZER_METHODS:
+            raise NotCompilable(f"{type(serializer).__name__} overrides to_representation")
+        model = serializer.Meta.model
+        items = []
+        for field in serializer._readable_fields:
+            source = field.source
+            if source == "*" or "." in source:
+                raise NotCompilable(f"{field.field_name}: source {source!r}")
+            try:
+                model_field = model._meta.get_field(source)
+            except FieldDoesNotExist:
+                raise NotCompilable(f"{field.field_name}: no model field {source!r}")
+            if not model_field.concrete:
+                raise NotCompilable(f"{field.field_name}: {source!r} is not a column")
+            path = f"{prefix}{source}"
+            if model_field.many_to_many or isinstance(field, (serializers.ListSerializer, serializers.ManyRelatedField)):
+                raise NotCompilable(f"{field.field_name}: to-many relation")
+            if model_field.is_relation:
+                items.append((field.field_name, self._relation(field, model_field, path)))
+            else:
+                items.append((field.field_name, self._value(field, path)))
+        return "{" + ", ".join(f"{name!r}: {expression}" for name, expression in items) + "}"
+
+    def _relation(self, field, model_field, path: str) -> str:
+        if model_field.target_field != model_field.related_model._meta.pk:
+            raise NotCompilable(f"{field.field_name}: to_field relations are not supported")
+        column = self._column(path)
+        if isinstance(field, ReferenceDataSerializer) and field.resolved_from_cache():
+            table = self.references.setdefault(type(field), f"T{len(self.references)}")
+            fetch = self._name("F", lambda pk, field=field: _reference_row(field, pk))
+            return f"(None if (v := {column}) is None else ({table}[v] if v in {table} else {fetch}(v)))"
+        if isinstance(field, serializers.ModelSerializer):
+            nested = self._compile(field, f"{path}__")
+            return f"(None if {column} is None else {nested})"
+        if type(field) is serializers.PrimaryKeyRelatedField and field.pk_field is None:
+            return column
+        raise NotCompilable(f"{field.field_name}: {type(field).__name__}")
+
+    def _value(self, field, path: str) -> str:
+        column = self._column(path)
+        if type(field).to_representation in _UNCHANGED or _plain_big_integer(field):
+            return column
+        if isinstance(field, _CONVERTED):
+            convert = self._name("C", field.to_representation)
+            return f"(None if (v := {column}) is None else {convert}(v))"
+        raise NotCompilable(f"{field.field_name}: {type(field).__name__}")
+
+    def builder(self):
+        """Return ``build(row)`` bound to the current reference tables.
+
+        The nested SOPs, locations and warehouses it returns are the rows of
+        the shared tables, so the result must not be modified.
+        """
+        return self._globals["make"](*(reference_tables.table(cls) for cls in self.references))
+
+    def values(self, queryset, extra=()):
+        """``queryset`` as named tuples of the plan's columns followed by ``extra``."""
+        return queryset.values_list(*dict.fromkeys([*self.columns, *extra]), named=True)
+
+
+def _plain_big_integer(field) -> bool:
+    # DRF 3.16 renders ``BigAutoField``/``BigIntegerField`` as numbers
+    # unless ``COERCE_BIGINT_TO_STRING`` asks for strings.
+    big = getattr(serializers, "BigIntegerField", None)
+    return (
+        big is not None and type(field).to_representation is big.to_representation
+        and not getattr(field, "coerce_to_string", getattr(api_settings, "COERCE_BIGINT_TO_STRING", False))
+    )
+
+
+def _reference_row(serializer, pk):
+    # A row created after its table was loaded, as in ``ReferenceDataSerializer``.
+    return super(ReferenceDataSerializer, serializer).to_representation(
+        serializer.Meta.model._base_manager.get(pk=pk)
+    )
+
+
+@lru_cache(maxsize=None)
+def compile_serializer(serializer_class) -> CompiledSerializer | None:
+    """The :class:`CompiledSerializer` for ``serializer_class``, or ``None`` if it cannot be compiled."""
+    try:
+        return CompiledSerializer(serializer_class)
+    except NotCompilable:
+        return None
+
+
+def encode(data) -> bytes | None:
+    """A compiled page encoded as by DRF's compact ``JSONRenderer``, or ``None`` without orjson."""
+    if orjson is None:
+        return None
+    try:
+        ret = orjson.dumps(data, default=JSONEncoder().default, option=orjson.OPT_PASSTHROUGH_DATETIME)
+    except TypeError:
+        # Integers beyond 64 bits and lone surrogates.
+        return None
+    return ret.replace(b"\xe2\x80\xa8", b"\\u2028").replace(b"\xe2\x80\xa9", b"\\u2029")
+
+
+class CompiledJSONRenderer(renderers.JSONRenderer):
+    """``JSONRenderer`` that encodes compiled list responses with ``orjson``.
+
+    Other responses, pretty-printed ones and non-default JSON settings are
+    rendered by DRF as before.  ``Decimal`` and ``datetime`` values, which
+    a compiled page does not contain, are handed to DRF's encoder.
+    """
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        renderer_context = renderer_context or {}
+        ret = None
+        if (
+            data is not None
+            and getattr(renderer_context.get("response"), "compiled", False)
+            and self.compact and not self.ensure_ascii
+            and self.get_indent(accepted_media_type, renderer_context) is None
+        ):
+            ret = encode(data)
+        return super().render(data, accepted_media_type, renderer_context) if ret is None else ret
+
+
+class CompiledListMixin:
+    """Serves ``list`` through the compiled serializer when it can."""
+
+    def get_compiled_serializer(self) -> CompiledSerializer | None:
+        if not getattr(settings, "API_COMPILED_READS", True) or self.get_field_spec() is not None:
+            return None
+        return compile_serializer(self.get_serializer_class())
+
+    def list(self, request, *args, **kwargs):
+        compiled = self.get_compiled_serializer()
+        if compiled is None:
+            return super().list(request, *args, **kwargs)
+        # Cursor pagination reads the ordering columns of every row by name.
+        ordering = getattr(self, "ordering", None) or ()
+        if isinstance(ordering, str):
+            ordering = (ordering,)
+        extra = ["pk", *(name.lstrip("-") for name in (*ordering, *getattr(self, "ordering_fields", ())))]
+        queryset = self.filter_queryset(self.get_queryset()).prefetch_related(None)
+        queryset = compiled.values(queryset, extra)
+        page = self.paginate_queryset(queryset)
+        build = compiled.builder()
+        data = [build(row) for row in (queryset if page is None else page)]
+        response = Response(data) if page is None else self.get_paginated_response(data)
+        response.compiled = True
+        return response
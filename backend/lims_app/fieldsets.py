@@ -0,0 +1,110 @@
+"""
+Sparse fieldsets and expansion control for API responses.
+
+Read requests may shape the representation with three query parameters:
+
+``?fields=id,product_name,warehouse.warehouse_facility``
+    Only the listed fields are rendered.  Dotted names select fields of a
+    nested object and imply that the object is expanded.
+``?expand=sample,sample.warehouse``
+    Nested objects to render in full.  Expanding ``sample.warehouse``
+    also expands ``sample``.
+``?depth=2``
+    Expand every nested object up to the given depth.
+
+When any of the parameters is present, nested objects that are not
+expanded collapse to their primary key.  Without them the full nested
+representation is returned, as it always has been.  The view uses the
+same shape to decide which columns to load and which tables to join (see
+``querysets.optimize_queryset``), so narrower responses also mean less
+database I/O.
+"""
+
+from __future__ import annotations
+
+from rest_framework import exceptions, serializers
+
+
+MAX_DEPTH = 5
+
+
+def _split(raw: str | None) -> list[tuple[str, ...]]:
+    if not raw:
+        return []
+    return [tuple(part for part in item.strip().split(".") if part) for item in raw.split(",") if item.strip()]
+
+
+class FieldSpec:
+    """Parsed ``fields``/``expand``/``depth`` request parameters."""
+
+    def __init__(self, fields=None, expand=(), depth: int = 0) -> None:
+        self.fields = [path for path in (fields or []) if path] or None
+        self.depth = depth
+        self.expand: set[tuple[str, ...]] = set()
+        for path in list(expand) + [path[:-1] for path in (self.fields or [])]:
+            for length in range(1, len(path) + 1):
+                self.expand.add(path[:length])
+
+    @classmethod
+    def from_query_params(cls, params) -> FieldSpec | None:
+        """Build a spec from request query parameters, or ``None`` if absent."""
+        if not any(key in params for key in ("fields", "expand", "depth")):
+            return None
+        depth = params.get("depth") or "0"
+        try:
+            depth = int(depth)
+        except ValueError:
+            raise exceptions.ValidationError({"depth": ["A valid integer is required."]})
+        if not 0 <= depth <= MAX_DEPTH:
+            raise exceptions.ValidationError({"depth": [f"Must be between 0 and {MAX_DEPTH}."]})
+        return cls(_split(params.get("fields")), _split(params.get("expand")), depth)
+
+    def selected(self, path: tuple[str, ...]) -> set[str] | None:
+        """Names of the fields requested at ``path``, or ``None`` for all of them."""
+        if self.fields is None or (path and path in self.fields):
+            return None
+        depth = len(path)
+        names = {field[depth] for field in self.fields if len(field) > depth and field[:depth] == path}
+        # A nested object expanded without naming any of its fields (e.g.
+        # ``fields=sample&expand=sample``) is rendered whole.
+        return names or None
+
+    def is_expanded(self, path: tuple[str, ...]) -> bool:
+        return len(path) <= self.depth or path in self.expand
+
+
+def serializer_path(serializer) -> tuple[str, ...]:
+    """Return the chain of field names leading from the root to ``serializer``."""
+    names = []
+    node = serializer
+    while node is not None and node.parent is not None:
+        if not isinstance(node.parent, serializers.ListSerializer):
+            names.append(node.field_name)
+        node = node.parent
+    return tuple(reversed(names))
+
+
+class DynamicFieldsModelSerializer(serializers.ModelSerializer):
+    """``ModelSerializer`` that honours the ``field_spec`` in its context."""
+
+    def get_fields(self):
+        fields = super().get_fields()
+        spec = self.context.get("field_spec")
+        if spec is None:
+            return fields
+        path = serializer_path(self)
+        selected = spec.selected(path)
+        if selected is not None:
+            fields = {name: field for name, field in fields.items() if name in selected}
+        for name, field in list(fields.items()):
+            many = isinstance(field, serializers.ListSerializer)
+            child = field.child if many else field
+            if not isinstance(child, serializers.BaseSerializer):
+                continue
+            if spec.is_expanded(path + (name,)):
+                continue
+            kwargs = {"read_only": True, "many": many}
+            if field._kwargs.get("source"):
+                kwargs["source"] = field._kwargs["source"]
+            fields[name] = serializers.PrimaryKeyRelatedField(**kwargs)
+        return fields
@@ -0,0 +1,321 @@
+"""
+Streaming import of instrument result files.
+
+Instruments export their test results as CSV files (see ``resultfiles.py``
+for the format) that can run to millions of rows.  Such a file is
+imported with ``python manage.py ingest_results <file>`` or uploaded to
+``POST /api/sample-test-links/ingest/`` (multipart, field ``file``), and
+read as a stream, ``INGEST_CHUNK_ROWS`` rows at a time:
+
+1. each chunk is parsed and checked against the acceptance limits of its
+   tests on a pool of ``INGEST_WORKERS`` processes (0 checks on the
+   calling thread).  At most two chunks per worker are in flight, so
+   memory stays flat however large the file is;
+2. the accepted rows are resolved to samples through a map of every
+   sample ID (with the shard that holds it, see ``sharding.py``) and to
+   tests through the limits map the workers were given, both built once
+   per file; a row naming an unknown or retired sample or test is
+   rejected;
+3. the rows are written in file order with chunked ``bulk_create``
+   statements, one transaction per chunk (and shard).
+
+Rejected rows are reported with their line number and errors, and every
+import reports its sustained rows per second.  An import is tracked by an
+:class:`~lims_app.models.IngestRun` whose counters advance with each
+chunk.  If it fails, the same file can be resumed from the last chunk
+written with ``--resume <run>`` or ``?resume=<run>``; the run remembers a
+fingerprint of the file so that another file is refused.  Without shards
+the counters are updated in the transaction of the chunk, so a resumed
+import neither skips nor repeats rows.  With shards they are updated on
+the primary after the shards committed, and a crash between the two
+repeats that chunk when resumed.
+
+The endpoint audits every row it writes (see ``audit.py``) and so needs
+an ``X-Audit-Comment`` header; it answers 200 when every row was written,
+207 when some were rejected and 400 when all were, with the first
+``INGEST_MAX_REPORTED_REJECTS`` rejects.  A database error answers 409
+with the run to resume.
+"""
+
+from __future__ import annotations
+
+import collections
+import csv
+import hashlib
+import io
+import itertools
+import time
+from concurrent import futures
+from dataclasses import dataclass, field
+
+from django.conf import settings
+from django.db import DatabaseError, router, transaction
+from django.utils import timezone
+from rest_framework import exceptions, status
+from rest_framework.decorators import action
+from rest_framework.parsers import MultiPartParser
+from rest_framework.response import Response
+
+from . import audit, resultfiles, sharding
+from .bulk import parameter_limit
+from .models import AuditEntry, IngestRun, Sample, SampleTestLink, Test
+
+
+# Bytes of the start of a file hashed to recognise it when an import is resumed.
+FINGERPRINT_BYTES = 64 * 1024
+COLUMNS = ("sample_id", "test_id", "testing_analyst", "reviewing_analyst", "test_result", "deadline", "pass_or_fail")
+
+
+class IngestError(Exception):
+    """The file cannot be imported, or the run cannot be resumed with it."""
+
+
+@dataclass
+class IngestResult:
+    """Outcome of one import (or resumed part of one)."""
+
+    run: IngestRun
+    rows: int = 0
+    written: int = 0
+    rejected: int = 0
+    seconds: float = 0.0
+    rejects: list = field(default_factory=list)
+
+    @property
+    def rows_per_sec(self) -> float:
+        return round(self.rows / self.seconds, 1) if self.seconds else 0.0
+
+
+def fingerprint(binary) -> str:
+    """SHA-256 of the first ``FINGERPRINT_BYTES`` of a seekable binary file."""
+    position = binary.tell()
+    binary.seek(0)
+    digest = hashlib.sha256(binary.read(FINGERPRINT_BYTES)).hexdigest()
+    binary.seek(position)
+    return digest
+
+
+def start_run(binary, source: str, resume: int | None = None) -> IngestRun:
+    """A new run for ``binary``, or run ``resume`` after checking it read the same file."""
+    digest = fingerprint(binary)
+    if resume is None:
+        return IngestRun.objects.create(source=source[:255], fingerprint=digest, started_at=timezone.now())
+    run = IngestRun.objects.filter(pk=resume).first()
+    if run is None:
+        raise IngestError(f"No ingest run {resume}.")
+    if run.status == IngestRun.COMPLETE:
+        raise IngestError(f"Ingest run {run.pk} is already complete.")
+    if run.fingerprint != digest:
+        raise IngestError(f"The file is not the one ingest run {run.pk} read.")
+    return run
+
+
+def test_limits() -> dict:
+    """``{test_id: (min_acceptable_result, max_acceptable_result)}`` of every active test."""
+    rows = Test.objects.values_list("pk", "min_acceptable_result", "max_acceptable_result")
+    return {pk: (lower, upper) for pk, lower, upper in rows.iterator(chunk_size=parameter_limit())}
+
+
+def sample_map() -> dict:
+    """``{sample_id: alias}`` of every active sample; the alias is ``None`` without shards."""
+    samples = {}
+    for alias in sharding.databases_for(Sample):
+        ids = Sample.objects.db_manager(alias).values_list("pk", flat=True)
+        samples.update(dict.fromkeys(ids.iterator(chunk_size=parameter_limit()), alias))
+    return samples
+
+
+def read_chunks(reader, chunk_rows: int, skip: int = 0):
+    """Lists of ``(line, cells)`` after the first ``skip`` rows, skipping blank lines."""
+    rows = ((reader.line_num, cells) for cells in reader if any(cell.strip() for cell in cells))
+    rows = itertools.islice(rows, skip, None)
+    while chunk := list(itertools.islice(rows, chunk_rows)):
+        yield chunk
+
+
+class _InlinePool:
+    """Runs the checks on the calling thread (``INGEST_WORKERS = 0``)."""
+
+    def submit(self, function, *args):
+        future = futures.Future()
+        future.set_result(function(*args))
+        return future
+
+    def shutdown(self, wait=True, cancel_futures=False):
+        pass
+
+
+def _pool(workers: int, limits: dict):
+    time_zone = settings.TIME_ZONE if settings.USE_TZ else None
+    if workers <= 0:
+        resultfiles.init_worker(limits, time_zone)
+        return _InlinePool()
+    return futures.ProcessPoolExecutor(
+        max_workers=workers, initializer=resultfiles.init_worker, initargs=(limits, time_zone)
+    )
+
+
+def ingest(run: IngestRun, text, *, workers: int | None = None, chunk_rows: int | None = None,
+           on_chunk=None) -> IngestResult:
+    """Import the CSV in the text stream ``text`` into ``run``.
+
+    ``on_chunk(result, written, rejects)`` is called after each chunk is
+    written; ``written`` are the new rows and ``rejects`` the
+    ``(line, errors)`` of the rejected ones.  The rejects are only kept on
+    the result when there is no ``on_chunk``.  Raises ``IngestError`` for a
+    file without the required columns; the run is marked failed on any
+    error.
+    """
+    workers = getattr(settings, "INGEST_WORKERS", 2) if workers is None else workers
+    chunk_rows = max(1, chunk_rows or getattr(settings, "INGEST_CHUNK_ROWS", 2000))
+    IngestRun.objects.filter(pk=run.pk).update(status=IngestRun.RUNNING, updated_at=timezone.now())
+    try:
+        result = _ingest(run, text, workers, chunk_rows, on_chunk)
+    except Exception as exc:
+        IngestRun.objects.filter(pk=run.pk).update(
+            status=IngestRun.FAILED, error=str(exc) or type(exc).__name__, updated_at=timezone.now()
+        )
+        run.refresh_from_db()
+        raise
+    now = timezone.now()
+    IngestRun.objects.filter(pk=run.pk).update(status=IngestRun.COMPLETE, error="", finished_at=now, updated_at=now)
+    run.refresh_from_db()
+    return result
+
+
+def _ingest(run: IngestRun, text, workers: int, chunk_rows: int, on_chunk) -> IngestResult:
+    result = IngestResult(run)
+    started = time.perf_counter()
+    reader = csv.reader(text)
+    header = next(reader, [])
+    try:
+        columns = resultfiles.column_positions(header)
+    except ValueError as exc:
+        raise IngestError(str(exc)) from exc
+    # Rows before the checkpoint were written or rejected already.
+    chunks = read_chunks(reader, chunk_rows, skip=run.rows_read)
+    limits = test_limits()
+    samples = sample_map()
+
+    def finish(size, future):
+        accepted, rejects = future.result()
+        written = _write(run, size, accepted, rejects, samples)
+        result.rows += size
+        result.written += len(written)
+        result.rejected += len(rejects)
+        result.seconds = time.perf_counter() - started
+        if on_chunk is None:
+            result.rejects += rejects
+        else:
+            on_chunk(result, written, rejects)
+
+    pool = _pool(workers, limits)
+    pending = collections.deque()
+    try:
+        for chunk in chunks:
+            pending.append((len(chunk), pool.submit(resultfiles.check_chunk, chunk, columns)))
+            if len(pending) >= max(1, workers) * 2:
+                finish(*pending.popleft())
+        while pending:
+            finish(*pending.popleft())
+    finally:
+        pool.shutdown(wait=True, cancel_futures=True)
+    result.seconds = time.perf_counter() - started
+    return result
+
+
+def _write(run: IngestRun, size: int, accepted: list, rejects: list, samples: dict) -> list:
+    """Write the ``accepted`` rows of one chunk and advance the run; return the new rows."""
+    groups = collections.defaultdict(list)
+    for line, values in accepted:
+        if values[0] not in samples:
+            rejects.append((line, {"sample": [f"Invalid pk \"{values[0]}\" - object does not exist."]}))
+            continue
+        groups[samples[values[0]]].append(SampleTestLink(**dict(zip(COLUMNS, values))))
+    rejects.sort(key=lambda reject: reject[0])
+    batch_size = max(1, parameter_limit() // len(SampleTestLink._meta.concrete_fields))
+    written = []
+    for alias, rows in groups.items():
+        with sharding.on_shard(alias):
+            sharding.assign_ids(SampleTestLink, rows)
+            database = router.db_for_write(SampleTestLink)
+            with transaction.atomic(using=database):
+                SampleTestLink._base_manager.db_manager(database).bulk_create(rows, batch_size=batch_size)
+                if alias is None:
+                    # Same database and transaction as the rows: exactly-once on resume.
+                    _advance(run, size, len(rows), len(rejects))
+        written += rows
+    if None not in groups:
+        _advance(run, size, len(written), len(rejects))
+    return written
+
+
+def _advance(run: IngestRun, size: int, written: int, rejected: int) -> None:
+    run.rows_read += size
+    run.rows_written += written
+    run.rows_rejected += rejected
+    run.updated_at = timezone.now()
+    run.save(update_fields=["rows_read", "rows_written", "rows_rejected", "updated_at"])
+
+
+class IngestMixin:
+    """Adds ``POST <resource>/ingest/`` for instrument result files."""
+
+    @action(detail=False, methods=["post"], url_path="ingest", parser_classes=[MultiPartParser])
+    def ingest(self, request, *args, **kwargs):
+        upload = request.FILES.get("file")
+        if upload is None:
+            raise exceptions.ValidationError({"file": ["No file was submitted."]})
+        comment = audit.require_comment(request)
+        resume = request.query_params.get("resume")
+        if resume is not None and not resume.isdigit():
+            raise exceptions.ValidationError({"resume": ["A valid ingest run ID is required."]})
+        binary = upload.file
+        try:
+            run = start_run(binary, upload.name or "upload", int(resume) if resume else None)
+        except IngestError as exc:
+            raise exceptions.ValidationError({"resume": [str(exc)]}) from exc
+        binary.seek(0)
+        text = io.TextIOWrapper(binary, encoding="utf-8-sig", newline="")
+        rejects = []
+        limit = getattr(settings, "INGEST_MAX_REPORTED_REJECTS", 1000)
+
+        def on_chunk(result, written, chunk_rejects):
+            changes = [(row.pk, AuditEntry.CREATE, audit.diff({}, audit.snapshot(row))) for row in written]
+            audit.record(request, comment, SampleTestLink, changes)
+            rejects.extend(chunk_rejects[:max(0, limit - len(rejects))])
+
+        try:
+            result = ingest(run, text, on_chunk=on_chunk)
+        except IngestError as exc:
+            raise exceptions.ValidationError({"file": [str(exc)]}) from exc
+        except UnicodeDecodeError:
+            raise exceptions.ValidationError({"file": ["The file is not UTF-8 encoded text."]})
+        except DatabaseError as exc:
+            return Response(
+                {"detail": f"Ingest failed: {exc}; resume with ?resume={run.pk}.", "run": run.pk,
+                 "rows_read": run.rows_read},
+                status=status.HTTP_409_CONFLICT,
+            )
+        finally:
+            text.detach()
+        if result.rejected and not result.written:
+            code = status.HTTP_400_BAD_REQUEST
+        elif result.rejected:
+            code = status.HTTP_207_MULTI_STATUS
+        else:
+            code = status.HTTP_200_OK
+        return Response(
+            {
+                "run": run.pk,
+                "status": run.status,
+                "rows": result.rows,
+                "written": result.written,
+                "rejected": result.rejected,
+                "seconds": round(result.seconds, 3),
+                "rows_per_sec": result.rows_per_sec,
+                "rejects": [{"line": line, "errors": errors} for line, errors in rejects],
+                "rejects_truncated": result.rejected > len(rejects),
+            },
+            status=code,
+        )
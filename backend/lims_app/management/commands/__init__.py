@@ -0,0 +1,4 @@
+"""
+Custom ``manage.py`` commands.  Each module in this package defines a
+``Command`` class discovered by Django's management framework.
+"""
@@ -0,0 +1,119 @@
+"""
+Benchmark the vectorised results analytics against the per-row loop.
+
+Runs ``analytics.analyse_arrays`` (NumPy) and ``analytics.analyse_rows``
+(plain Python) on the same results, checks that they agree and prints
+JSON with the latency percentiles of each and the speed-up.  The results
+come from the configured database (optionally narrowed with ``--test``)
+or, with ``--synthetic-rows``, are generated in memory so that millions
+of rows can be measured without loading them first.  Reading from the
+database is timed separately as ``load``.
+
+Usage::
+
+    python manage.py benchmark_analytics --iterations 5
+    python manage.py benchmark_analytics --synthetic-rows 5000000 --tests 200
+"""
+
+from __future__ import annotations
+
+import json
+import math
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from lims_app import analytics
+from lims_app.benchmarks import Timings, git_revision
+from lims_app.models import SampleTestLink
+
+
+class Command(BaseCommand):
+    help = "Compare the NumPy results analytics with a per-row Python loop and print JSON."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--iterations", type=int, default=5, help="Measured runs of each implementation.")
+        parser.add_argument("--test", type=int, action="append", default=None, help="Only this test (repeatable).")
+        parser.add_argument("--synthetic-rows", type=int, default=None, help="Generate this many results in memory.")
+        parser.add_argument("--tests", type=int, default=100, help="Number of tests for --synthetic-rows.")
+        parser.add_argument("--seed", type=int, default=0, help="Seed for --synthetic-rows.")
+        parser.add_argument("--skip-naive", action="store_true", help="Only run the vectorised implementation.")
+        parser.add_argument("--output", default=None, help="Write the JSON report to this file.")
+
+    def handle(self, *args, **options):
+        if analytics.np is None:
+            raise CommandError("benchmark_analytics needs NumPy: pip install numpy")
+        np = analytics.np
+        load = Timings()
+        if options["synthetic_rows"]:
+            arrays, limits = self.synthetic(options["synthetic_rows"], options["tests"], options["seed"])
+        else:
+            queryset = SampleTestLink.objects.all()
+            if options["test"]:
+                queryset = queryset.filter(test__in=options["test"])
+            with load.measure():
+                arrays = analytics.load_arrays(queryset)
+            limits = analytics.test_limits(np.unique(arrays["test"]).tolist())
+        rows = list(zip(
+            arrays["test"].tolist(), arrays["id"].tolist(), arrays["value"].tolist(), arrays["passed"].tolist()
+        ))
+
+        vectorised, naive = Timings(), Timings()
+        for _ in range(options["iterations"]):
+            with vectorised.measure():
+                fast = analytics.analyse_arrays(arrays, limits)
+            if not options["skip_naive"]:
+                with naive.measure():
+                    slow = analytics.analyse_rows(rows, limits)
+        report = {
+            "revision": git_revision(),
+            "timestamp": timezone.now().isoformat(),
+            "source": "synthetic" if options["synthetic_rows"] else "database",
+            "rows": len(rows),
+            "tests": len(fast) if options["iterations"] else None,
+            "vectorised": vectorised.summary(),
+        }
+        if load.seconds:
+            report["load"] = load.summary()
+        if not options["skip_naive"] and options["iterations"]:
+            report["naive"] = naive.summary()
+            report["speedup"] = round(report["naive"]["mean_ms"] / report["vectorised"]["mean_ms"], 1)
+            report["identical"] = same(fast, slow)
+        text = json.dumps(report, indent=2)
+        if options["output"]:
+            with open(options["output"], "w", encoding="utf-8") as handle:
+                handle.write(text + "\n")
+            self.stderr.write(f"Wrote the report to {options['output']}")
+        else:
+            self.stdout.write(text)
+
+    def synthetic(self, total: int, tests: int, seed: int):
+        """Normally distributed results with occasional shifts, sorted by test."""
+        np = analytics.np
+        rng = np.random.default_rng(seed)
+        test_ids = np.sort(rng.integers(1, tests + 1, size=total))
+        centre = rng.uniform(10, 100, size=tests + 1)
+        spread = centre * rng.uniform(0.01, 0.05, size=tests + 1)
+        values = rng.normal(centre[test_ids], spread[test_ids])
+        shifted = rng.random(total) < 0.01
+        values[shifted] += 2.5 * spread[test_ids][shifted]
+        lower, upper = centre - 3 * spread, centre + 3 * spread
+        arrays = {
+            "test": test_ids,
+            "id": np.arange(1, total + 1, dtype=np.int64),
+            "value": values,
+            "passed": (values >= lower[test_ids]) & (values <= upper[test_ids]),
+        }
+        limits = {test_id: (None, float(lower[test_id]), float(upper[test_id])) for test_id in range(1, tests + 1)}
+        return arrays, limits
+
+
+def same(left, right) -> bool:
+    """Whether two analyses agree, allowing for floating-point summation order."""
+    if isinstance(left, dict) and isinstance(right, dict):
+        return left.keys() == right.keys() and all(same(left[key], right[key]) for key in left)
+    if isinstance(left, list) and isinstance(right, list):
+        return len(left) == len(right) and all(same(a, b) for a, b in zip(left, right))
+    if isinstance(left, float) and isinstance(right, float):
+        return math.isclose(left, right, rel_tol=1e-9, abs_tol=1e-9)
+    return left == right
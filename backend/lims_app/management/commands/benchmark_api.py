@@ -0,0 +1,183 @@
+"""
+Benchmark every API endpoint against the configured database.
+
+Drives, in-process through the full middleware and DRF stack:
+
+* the list endpoint of every router-registered resource, following the
+  ``next`` cursor from page to page;
+* the detail endpoint, for primary keys drawn from the table;
+* every dashboard endpoint;
+* writes: a same-value ``PATCH`` on each resource and, for resources with a
+  ``bulk/`` action, a bulk create of rows copied from existing ones.  Each
+  write runs in a transaction that is rolled back, so the data set stays
+  identical between runs.
+
+The result is printed (or written with ``--output``) as JSON with p50/p95/
+p99 latency, throughput and query counts per endpoint, plus the git
+revision and table sizes, so runs on two commits can be diffed.  Populate
+the database first, e.g. with ``generate_data`` on SQLite.
+
+Usage::
+
+    python manage.py generate_data --scale 10
+    python manage.py benchmark_api --iterations 50 --output before.json
+"""
+
+from __future__ import annotations
+
+import json
+import random
+from contextlib import nullcontext
+from urllib.parse import urlencode
+
+from django.contrib.auth.models import User
+from django.core.exceptions import FieldDoesNotExist
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from django.test.utils import override_settings
+from django.urls import URLPattern, reverse
+from django.utils import timezone
+from rest_framework import serializers
+from rest_framework.test import APIClient
+
+from lims_app.benchmarks import Timings, git_revision
+from lims_app.bulk import BulkWriteMixin, bulk_row_serializer_for
+from lims_app.urls import router, urlpatterns
+
+
+class Command(BaseCommand):
+    help = "Measure latency, throughput and query counts of the API endpoints and print JSON."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--iterations", type=int, default=20, help="Measured requests per endpoint.")
+        parser.add_argument("--warmup", type=int, default=2, help="Unmeasured requests per endpoint.")
+        parser.add_argument("--page-size", type=int, default=None, help="page_size for list requests.")
+        parser.add_argument("--bulk-rows", type=int, default=100, help="Rows per bulk create request.")
+        parser.add_argument("--only", default=None, help="Only endpoints whose name contains this text.")
+        parser.add_argument("--skip-writes", action="store_true", help="Do not benchmark write endpoints.")
+        parser.add_argument("--no-response-cache", action="store_true", help="Disable the API response cache.")
+        parser.add_argument("--seed", type=int, default=0, help="Seed for choosing detail primary keys.")
+        parser.add_argument("--output", default=None, help="Write the JSON report to this file.")
+
+    def handle(self, *args, **options):
+        self.options = options
+        self.rng = random.Random(options["seed"])
+        self.client = APIClient()
+        self.client.force_authenticate(User(username="benchmark"))
+        self.client.credentials(HTTP_X_AUDIT_COMMENT="benchmark_api")
+        with override_settings(API_CACHE_ENABLED=not options["no_response_cache"]):
+            endpoints = self.run_all()
+        report = {
+            "revision": git_revision(),
+            "database": connection.vendor,
+            "timestamp": timezone.now().isoformat(),
+            "iterations": options["iterations"],
+            "rows": {
+                viewset.queryset.model._meta.model_name: viewset.queryset.model._base_manager.count()
+                for _, viewset, _ in router.registry
+            },
+            "endpoints": endpoints,
+        }
+        text = json.dumps(report, indent=2)
+        if options["output"]:
+            with open(options["output"], "w", encoding="utf-8") as handle:
+                handle.write(text + "\n")
+            self.stderr.write(f"Wrote {len(endpoints)} endpoint results to {options['output']}")
+        else:
+            self.stdout.write(text)
+
+    # -- endpoint discovery ------------------------------------------------
+
+    def run_all(self) -> list[dict]:
+        results = []
+        for prefix, viewset, basename in router.registry:
+            model = viewset.queryset.model
+            results.append(self.bench(f"{basename}-list", "GET", self.list_requests(prefix)))
+            pks = list(model._base_manager.order_by("pk").values_list("pk", flat=True)[:1000])
+            if pks:
+                results.append(self.bench(f"{basename}-detail", "GET", self.detail_requests(prefix, pks)))
+                if not self.options["skip_writes"]:
+                    payload = self.patch_payload(viewset, model, pks[0])
+                    if payload is not None:
+                        url = f"/api/{prefix}/{pks[0]}/"
+                        results.append(self.bench(
+                            f"{basename}-partial-update", "PATCH",
+                            self.repeat(lambda: self.client.patch(url, payload, format="json")), write=True,
+                        ))
+                    if issubclass(viewset, BulkWriteMixin):
+                        rows = self.bulk_rows(model, pks)
+                        url = f"/api/{prefix}/bulk/?mode=create"
+                        results.append(self.bench(
+                            f"{basename}-bulk-create", "POST",
+                            self.repeat(lambda: self.client.post(url, rows, format="json")), write=True,
+                        ))
+        for pattern in urlpatterns:
+            if isinstance(pattern, URLPattern) and (pattern.name or "").startswith("dashboard-"):
+                url = reverse(pattern.name)
+                results.append(self.bench(pattern.name, "GET", self.repeat(lambda url=url: self.client.get(url))))
+        return [result for result in results if result is not None]
+
+    def repeat(self, send):
+        while True:
+            yield send
+
+    # Request generators yield a callable per request; ``bench`` sends the
+    # response back in so that list requests can follow the ``next`` link.
+
+    def list_requests(self, prefix):
+        first = f"/api/{prefix}/"
+        if self.options["page_size"]:
+            first += f"?{urlencode({'page_size': self.options['page_size']})}"
+        url = first
+        while True:
+            response = yield lambda url=url: self.client.get(url)
+            next_url = response.data.get("next") if response.status_code == 200 else None
+            url = next_url or first
+
+    def detail_requests(self, prefix, pks):
+        while True:
+            pk = self.rng.choice(pks)
+            yield lambda pk=pk: self.client.get(f"/api/{prefix}/{pk}/")
+
+    def patch_payload(self, viewset, model, pk) -> dict | None:
+        """Pick a writable scalar field and send back its current value."""
+        if "patch" not in viewset.http_method_names:
+            return None
+        instance = model._base_manager.get(pk=pk)
+        serializer = viewset.serializer_class(instance)
+        for name, field in serializer.fields.items():
+            if field.read_only or isinstance(field, (serializers.BaseSerializer, serializers.RelatedField)):
+                continue
+            try:
+                model_field = model._meta.get_field(field.source)
+            except FieldDoesNotExist:
+                continue
+            if model_field.unique or model_field.primary_key:
+                continue
+            return {name: serializer.data[name]}
+        return None
+
+    def bulk_rows(self, model, pks) -> list[dict]:
+        sample = model._base_manager.filter(pk__in=pks[: self.options["bulk_rows"]])
+        rows = bulk_row_serializer_for(model)(sample, many=True).data
+        return [{key: value for key, value in row.items() if key != "id"} for row in rows]
+
+    # -- measurement -------------------------------------------------------
+
+    def bench(self, name: str, method: str, requests, write: bool = False) -> dict | None:
+        if self.options["only"] and self.options["only"] not in name:
+            return None
+        timings = Timings()
+        send = next(requests)
+        for iteration in range(self.options["warmup"] + self.options["iterations"]):
+            measured = iteration >= self.options["warmup"]
+            with transaction.atomic() if write else nullcontext():
+                with timings.measure() if measured else nullcontext():
+                    response = send()
+                if write:
+                    transaction.set_rollback(True)
+            if measured and response.status_code >= 400:
+                timings.errors += 1
+            send = requests.send(response)
+        self.stderr.write(f"{name:<40} done")
+        return {"endpoint": name, "method": method, **timings.summary()}
@@ -0,0 +1,209 @@
+"""
+Compare the async (ASGI) read endpoints with the WSGI path under load.
+
+Starts the project under uvicorn twice, once as the WSGI application
+(``--interface wsgi``) and once as the ASGI application, and drives each
+from a pool of concurrent clients over HTTP:
+
+* ``wsgi``: the synchronous endpoints served through WSGI;
+* ``asgi-sync``: the same synchronous endpoints served through ASGI;
+* ``asgi-async``: the async endpoints of ``async_views.py``.
+
+Each endpoint is requested ``--requests`` times at every ``--concurrency``
+level.  Requests authenticate with a session cookie created for a
+``benchmark`` user.  The report is JSON with p50/p95/p99/mean latency and
+throughput (requests over wall time) per server, endpoint and concurrency,
+so runs on two commits can be diffed.  Requires ``uvicorn``, which is not a
+dependency of the application itself.
+
+Usage::
+
+    pip install uvicorn
+    python manage.py benchmark_async --concurrency 1,16,64 --requests 400
+"""
+
+from __future__ import annotations
+
+import json
+import os
+import socket
+import subprocess
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from urllib.error import HTTPError, URLError
+from urllib.request import Request, urlopen
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test import Client
+from django.utils import timezone
+
+from lims_app.benchmarks import Timings, git_revision
+
+try:
+    import uvicorn  # noqa: F401
+except ImportError:  # pragma: no cover
+    uvicorn = None  # type: ignore
+
+
+# (name, synchronous path, async path)
+ENDPOINTS = (
+    ("samples", "/api/samples/", "/api/async/samples/"),
+    ("sample-test-links", "/api/sample-test-links/", "/api/async/sample-test-links/"),
+    ("dashboard-warehouse-clients", "/api/dashboard/warehouse-clients/", "/api/async/dashboard/warehouse-clients/"),
+    ("dashboard-version-changes", "/api/dashboard/version-changes/", "/api/async/dashboard/version-changes/"),
+)
+
+# (target name, uvicorn application, extra uvicorn arguments, use the async paths)
+TARGETS = (
+    ("wsgi", "lims_project.wsgi:application", ["--interface", "wsgi"], False),
+    ("asgi-sync", "lims_project.asgi:application", [], False),
+    ("asgi-async", "lims_project.asgi:application", [], True),
+)
+
+
+class Command(BaseCommand):
+    help = "Benchmark the async read endpoints against the WSGI path under uvicorn and print JSON."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--concurrency", default="1,8,32", help="Comma-separated client counts.")
+        parser.add_argument("--requests", type=int, default=200, help="Measured requests per endpoint and level.")
+        parser.add_argument("--warmup", type=int, default=10, help="Unmeasured requests per endpoint.")
+        parser.add_argument("--page-size", type=int, default=None, help="page_size for list requests.")
+        parser.add_argument("--port", type=int, default=8765, help="Port the servers listen on.")
+        parser.add_argument("--timeout", type=float, default=30.0, help="Per-request timeout in seconds.")
+        parser.add_argument("--only", default=None, help="Only target/endpoint pairs containing this text, e.g. asgi-async/samples.")
+        parser.add_argument("--output", default=None, help="Write the JSON report to this file.")
+
+    def handle(self, *args, **options):
+        if uvicorn is None:
+            raise CommandError("benchmark_async needs uvicorn: pip install uvicorn")
+        try:
+            levels = [int(level) for level in options["concurrency"].split(",") if level.strip()]
+        except ValueError:
+            raise CommandError("--concurrency must be a comma-separated list of integers.")
+        if not levels or min(levels) < 1:
+            raise CommandError("--concurrency levels must be positive.")
+        self.options = options
+        user, created = User.objects.get_or_create(username="benchmark")
+        client = Client()
+        client.force_login(user)
+        self.cookie = f"{settings.SESSION_COOKIE_NAME}={client.cookies[settings.SESSION_COOKIE_NAME].value}"
+        results = []
+        try:
+            for target, application, extra, use_async in TARGETS:
+                endpoints = [
+                    endpoint for endpoint in ENDPOINTS
+                    if not options["only"] or options["only"] in f"{target}/{endpoint[0]}"
+                ]
+                if not endpoints:
+                    continue
+                with self.server(application, extra):
+                    for name, sync_path, async_path in endpoints:
+                        url = self.url(async_path if use_async else sync_path, name)
+                        self.run_requests(url, options["warmup"], 1)
+                        for level in levels:
+                            results.append({
+                                "target": target, "endpoint": name, "concurrency": level,
+                                **self.run_requests(url, options["requests"], level),
+                            })
+                            self.stderr.write(f"{target:<11} {name:<30} c={level:<4} done")
+        finally:
+            client.logout()
+            if created:
+                user.delete()
+        report = {
+            "revision": git_revision(),
+            "database": connection.vendor,
+            "timestamp": timezone.now().isoformat(),
+            "requests": options["requests"],
+            "results": results,
+        }
+        text = json.dumps(report, indent=2)
+        if options["output"]:
+            with open(options["output"], "w", encoding="utf-8") as handle:
+                handle.write(text + "\n")
+            self.stderr.write(f"Wrote {len(results)} results to {options['output']}")
+        else:
+            self.stdout.write(text)
+
+    def url(self, path: str, name: str) -> str:
+        url = f"http://127.0.0.1:{self.options['port']}{path}"
+        if self.options["page_size"] and not name.startswith("dashboard-"):
+            url += f"?page_size={self.options['page_size']}"
+        return url
+
+    # -- server ------------------------------------------------------------
+
+    def server(self, application: str, extra: list[str]):
+        command = [
+            sys.executable, "-m", "uvicorn", application, *extra,
+            "--host", "127.0.0.1", "--port", str(self.options["port"]),
+            "--no-access-log", "--log-level", "warning",
+        ]
+        return _Server(command, self.options["port"], cwd=settings.BASE_DIR)
+
+    # -- load --------------------------------------------------------------
+
+    def fetch(self, url: str) -> tuple[float, bool]:
+        request = Request(url, headers={"Cookie": self.cookie, "Accept": "application/json"})
+        start = time.perf_counter()
+        try:
+            with urlopen(request, timeout=self.options["timeout"]) as response:
+                response.read()
+                ok = response.status < 400
+        except (HTTPError, URLError, OSError):
+            ok = False
+        return time.perf_counter() - start, ok
+
+    def run_requests(self, url: str, count: int, concurrency: int) -> dict:
+        timings = Timings()
+        start = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=concurrency) as pool:
+            for seconds, ok in pool.map(lambda _: self.fetch(url), range(count)):
+                timings.seconds.append(seconds)
+                if not ok:
+                    timings.errors += 1
+        wall = time.perf_counter() - start
+        summary = timings.summary()
+        # Queries run in the server process and are not seen here; requests
+        # overlap, so throughput is measured over wall time.
+        del summary["queries_mean"], summary["queries_max"]
+        summary["throughput_rps"] = round(count / wall, 1) if wall else 0.0
+        return summary
+
+
+class _Server:
+    """Context manager running a uvicorn subprocess until its port accepts connections."""
+
+    def __init__(self, command: list[str], port: int, cwd, startup_timeout: float = 30.0) -> None:
+        self.command = command
+        self.port = port
+        self.cwd = cwd
+        self.startup_timeout = startup_timeout
+        self.process = None
+
+    def __enter__(self):
+        self.process = subprocess.Popen(self.command, cwd=self.cwd, env=os.environ.copy())
+        deadline = time.monotonic() + self.startup_timeout
+        while time.monotonic() < deadline:
+            if self.process.poll() is not None:
+                raise CommandError(f"Server exited with status {self.process.returncode}: {' '.join(self.command)}")
+            try:
+                with socket.create_connection(("127.0.0.1", self.port), timeout=0.5):
+                    return self
+            except OSError:
+                time.sleep(0.1)
+        self.__exit__(None, None, None)
+        raise CommandError(f"Server did not start listening on port {self.port}.")
+
+    def __exit__(self, *exc_info) -> None:
+        self.process.terminate()
+        try:
+            self.process.wait(timeout=10)
+        except subprocess.TimeoutExpired:
+            self.process.kill()
+            self.process.wait()
@@ -0,0 +1,128 @@
+"""
+Benchmark JWT authentication with and without the key and token caches.
+
+The command generates a throwaway RSA key pair, serves its public half
+from a local stand-in for Auth0's ``/.well-known/jwks.json`` endpoint and
+signs a token with the private half.  It then authenticates the same
+request repeatedly, first with a key store that refetches the key set on
+every call (the previous behaviour), then with a caching store, and finally
+with the verified-token cache enabled on top, and reports the requests per
+second achieved by each.
+
+Usage::
+
+    python manage.py benchmark_jwks --requests 500
+"""
+
+from __future__ import annotations
+
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.test import RequestFactory
+
+from lims_app.authentication import Auth0JWTAuthentication, JWKSKeyStore, VerifiedTokenCache
+
+try:
+    from cryptography.hazmat.primitives import serialization
+    from cryptography.hazmat.primitives.asymmetric import rsa
+    from jose import jwk, jwt  # type: ignore
+except Exception:  # pragma: no cover
+    jwt = None  # type: ignore
+
+
+BENCHMARK_KID = "lisms-benchmark-key"
+
+
+def build_signing_material() -> tuple[str, dict]:
+    """Return a PEM private key and the matching JWKS document."""
+    private_key = rsa.generate_private_key(public_exponent=65537, key_size=2048)
+    private_pem = private_key.private_bytes(
+        serialization.Encoding.PEM,
+        serialization.PrivateFormat.PKCS8,
+        serialization.NoEncryption(),
+    ).decode()
+    public_pem = private_key.public_key().public_bytes(
+        serialization.Encoding.PEM,
+        serialization.PublicFormat.SubjectPublicKeyInfo,
+    ).decode()
+    public_jwk = jwk.construct(public_pem, "RS256").to_dict()
+    public_jwk.update({"kid": BENCHMARK_KID, "use": "sig"})
+    return private_pem, {"keys": [public_jwk]}
+
+
+def build_token(private_pem: str, lifetime: int = 3600) -> str:
+    """Sign a token that ``Auth0JWTAuthentication`` will accept."""
+    now = int(time.time())
+    claims = {
+        "sub": "benchmark|user",
+        "aud": settings.AUTH0_API_AUDIENCE,
+        "iss": f"https://{settings.AUTH0_DOMAIN}/",
+        "iat": now,
+        "exp": now + lifetime,
+    }
+    return jwt.encode(claims, private_pem, algorithm="RS256", headers={"kid": BENCHMARK_KID})
+
+
+def serve_jwks(jwks: dict) -> ThreadingHTTPServer:
+    """Start a background HTTP server that answers every GET with ``jwks``."""
+    body = json.dumps(jwks).encode()
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):  # noqa: N802
+            self.send_response(200)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):  # silence per-request logging
+            pass
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+class Command(BaseCommand):
+    help = "Compare JWT authentication throughput with and without the JWKS and token caches."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--requests", type=int, default=200, help="Authentications per run.")
+
+    def handle(self, *args, **options):
+        if jwt is None:
+            raise CommandError("python-jose[cryptography] is required to run this benchmark.")
+        count = options["requests"]
+        private_pem, jwks = build_signing_material()
+        token = build_token(private_pem)
+        server = serve_jwks(jwks)
+        url = f"http://127.0.0.1:{server.server_address[1]}/.well-known/jwks.json"
+        request = RequestFactory().get("/api/samples/", HTTP_AUTHORIZATION=f"Bearer {token}")
+        try:
+            results = {
+                "uncached": self._run(JWKSKeyStore(url=url, ttl=0), VerifiedTokenCache(0), request, count),
+                "keys": self._run(JWKSKeyStore(url=url), VerifiedTokenCache(0), request, count),
+                "tokens": self._run(JWKSKeyStore(url=url), VerifiedTokenCache(), request, count),
+            }
+        finally:
+            server.shutdown()
+            server.server_close()
+        for label, rate in results.items():
+            speedup = rate / results["uncached"]
+            self.stdout.write(f"{label:>9}: {rate:10.1f} req/s ({speedup:.1f}x)")
+
+    @staticmethod
+    def _run(store: JWKSKeyStore, cache: VerifiedTokenCache, request, count: int) -> float:
+        authenticator = Auth0JWTAuthentication()
+        authenticator.key_store = store
+        authenticator.token_cache = cache
+        authenticator.authenticate(request)  # warm up
+        start = time.perf_counter()
+        for _ in range(count):
+            authenticator.authenticate(request)
+        return count / (time.perf_counter() - start)
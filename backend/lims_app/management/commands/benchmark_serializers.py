@@ -0,0 +1,102 @@
+"""
+Benchmark the compiled read path against the DRF serializers.
+
+For every router-registered resource whose serializer compiles (see
+``fastpath.py``), renders the first ``--rows`` rows, in primary-key order,
+to JSON bytes both ways:
+
+* ``drf``: the joined queryset of the list endpoint, the serializer with
+  ``many=True`` and DRF's ``JSONRenderer``;
+* ``compiled``: the ``values_list()`` query of the compiled column plan,
+  the generated row builder and ``fastpath.encode`` (DRF's renderer when
+  orjson is not installed).
+
+Each measurement includes the query.  The report is printed (or written
+with ``--output``) as JSON with the latency summary of each path, its
+rows per second, the speed-up and whether the two outputs are
+byte-identical.
+
+Usage::
+
+    python manage.py benchmark_serializers --rows 5000 --iterations 10
+"""
+
+from __future__ import annotations
+
+import json
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.utils import timezone
+from rest_framework.renderers import JSONRenderer
+
+from lims_app import fastpath
+from lims_app.benchmarks import Timings, git_revision
+from lims_app.querysets import optimize_queryset
+from lims_app.urls import router
+
+
+class Command(BaseCommand):
+    help = "Compare rows/sec of the compiled read path with the DRF serializers and print JSON."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--rows", type=int, default=2000, help="Rows rendered per measurement.")
+        parser.add_argument("--iterations", type=int, default=5, help="Measured renders per path and resource.")
+        parser.add_argument("--only", default=None, help="Only resources whose name contains this text.")
+        parser.add_argument("--output", default=None, help="Write the JSON report to this file.")
+
+    def handle(self, *args, **options):
+        resources = {}
+        for prefix, viewset, _ in router.registry:
+            if options["only"] and options["only"] not in prefix:
+                continue
+            compiled = fastpath.compile_serializer(viewset.serializer_class)
+            if compiled is None:
+                self.stderr.write(f"Skipping {prefix}: {viewset.serializer_class.__name__} does not compile.")
+                continue
+            resources[prefix] = self.run(viewset, compiled, options["rows"], options["iterations"])
+        if not resources:
+            raise CommandError("No resources to benchmark.")
+        report = {
+            "revision": git_revision(),
+            "database": connection.vendor,
+            "timestamp": timezone.now().isoformat(),
+            "orjson": fastpath.orjson is not None,
+            "resources": resources,
+        }
+        text = json.dumps(report, indent=2)
+        if options["output"]:
+            with open(options["output"], "w", encoding="utf-8") as handle:
+                handle.write(text + "\n")
+            self.stderr.write(f"Wrote the report to {options['output']}")
+        else:
+            self.stdout.write(text)
+
+    def run(self, viewset, compiled, rows: int, iterations: int) -> dict:
+        serializer_class = viewset.serializer_class
+        queryset = viewset.queryset.order_by("pk")
+
+        def drf():
+            objects = list(optimize_queryset(queryset, serializer_class)[:rows])
+            return JSONRenderer().render(serializer_class(objects, many=True).data)
+
+        def fast():
+            build = compiled.builder()
+            data = [build(row) for row in compiled.values(queryset)[:rows]]
+            return fastpath.encode(data) or JSONRenderer().render(data)
+
+        # Load the reference-data tables outside the measurements.
+        expected, actual = drf(), fast()
+        timings = {"drf": Timings(), "compiled": Timings()}
+        for _ in range(iterations):
+            for name, render in (("drf", drf), ("compiled", fast)):
+                with timings[name].measure():
+                    render()
+        count = len(json.loads(expected))
+        result = {"rows": count, "identical": expected == actual}
+        for name, timing in timings.items():
+            total = sum(timing.seconds)
+            result[name] = {**timing.summary(), "rows_per_sec": round(count * len(timing.seconds) / total) if total else 0}
+        drf_rate, compiled_rate = result["drf"]["rows_per_sec"], result["compiled"]["rows_per_sec"]
+        result["speedup"] = round(compiled_rate / drf_rate, 2) if drf_rate else None
+        return result
@@ -0,0 +1,118 @@
+"""
+Compare single-shard with fan-out list requests on the sample shards.
+
+Drives the sharded list endpoints in-process through the full middleware
+and DRF stack, ``--iterations`` times each, following the ``next`` cursor
+for ``--pages`` pages:
+
+* ``fan_out``: the unfiltered list, gathered from every shard and merged
+  (see ``sharding.py``);
+* ``single_shard``: the same list narrowed to one shard, samples by
+  ``?warehouse=`` (the warehouse with the most samples unless
+  ``--warehouse`` is given) and test results by ``?sample=`` of a sample
+  of that warehouse.
+
+The report is printed (or written with ``--output``) as JSON with p50/
+p95/p99 latency and throughput per endpoint and mode, plus the git
+revision and shard count, so runs on two commits or shard layouts can be
+diffed.  Query counts are left out: the shard queries run on other
+connections, mostly on worker threads.  Set up the shards first with
+``shard_data --sync --move``.
+
+Usage::
+
+    DB_SHARDS=shard1.sqlite3,shard2.sqlite3,shard3.sqlite3 \\
+        python manage.py benchmark_shards --iterations 50 --output shards.json
+"""
+
+from __future__ import annotations
+
+import json
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.db.models import Count
+from django.utils import timezone
+from rest_framework.test import APIClient
+
+from lims_app import sharding
+from lims_app.benchmarks import Timings, git_revision
+from lims_app.models import Sample
+
+
+class Command(BaseCommand):
+    help = "Benchmark single-shard against fan-out list requests on the sample shards and print JSON."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--iterations", type=int, default=20, help="Measured scrolls per endpoint and mode.")
+        parser.add_argument("--pages", type=int, default=5, help="Pages followed per scroll.")
+        parser.add_argument("--page-size", type=int, default=50, help="page_size of the list requests.")
+        parser.add_argument("--warehouse", type=int, default=None, help="Warehouse of the single-shard requests.")
+        parser.add_argument("--output", default=None, help="Write the JSON report to this file.")
+
+    def handle(self, *args, **options):
+        if not sharding.enabled():
+            raise CommandError("No shards configured (DB_SHARDS).")
+        warehouse = options["warehouse"] or self.busiest_warehouse()
+        shard = sharding.shard_for_warehouse(warehouse)
+        samples = Sample._base_manager.using(shard).filter(warehouse_id=warehouse).order_by("pk")
+        sample = samples.values_list("pk", flat=True).first()
+        if sample is None:
+            raise CommandError(f"Warehouse {warehouse} has no samples on {shard}; run shard_data --move.")
+        self.client = APIClient()
+        self.client.force_authenticate(User(username="benchmark"))
+        endpoints = {
+            "samples": ("/api/samples/", f"warehouse={warehouse}"),
+            "sample-test-links": ("/api/sample-test-links/", f"sample={sample}"),
+        }
+        results = {}
+        for name, (path, narrowed) in endpoints.items():
+            results[name] = {
+                "fan_out": self.run(path, "", options),
+                "single_shard": {**self.run(path, narrowed, options), "filter": narrowed},
+            }
+        report = {
+            "revision": git_revision(),
+            "timestamp": timezone.now().isoformat(),
+            "shards": len(sharding.shards()),
+            "single_shard": shard,
+            "page_size": options["page_size"],
+            "endpoints": results,
+        }
+        text = json.dumps(report, indent=2)
+        if options["output"]:
+            with open(options["output"], "w", encoding="utf-8") as handle:
+                handle.write(text + "\n")
+            self.stderr.write(f"Wrote the report to {options['output']}")
+        else:
+            self.stdout.write(text)
+
+    def busiest_warehouse(self) -> int:
+        counts = {}
+        for alias in sharding.shards():
+            for row in Sample._base_manager.using(alias).values("warehouse_id").annotate(count=Count("pk")).order_by():
+                counts[row["warehouse_id"]] = counts.get(row["warehouse_id"], 0) + row["count"]
+        if not counts:
+            raise CommandError("The shards hold no samples; run shard_data --sync --move.")
+        return max(counts, key=lambda pk: (counts[pk], -pk))
+
+    def run(self, path: str, query: str, options) -> dict:
+        timings = Timings()
+        rows = 0
+        start = f"{path}?page_size={options['page_size']}" + (f"&{query}" if query else "")
+        self.client.get(start)  # warm-up: connections and reference-data tables
+        for _ in range(options["iterations"]):
+            url = start
+            for _ in range(options["pages"]):
+                with timings.measure():
+                    response = self.client.get(url)
+                if response.status_code != 200:
+                    timings.errors += 1
+                    break
+                data = response.json()
+                rows += len(data["results"])
+                url = data["next"]
+                if not url:
+                    break
+        summary = {key: value for key, value in timings.summary().items() if not key.startswith("queries")}
+        return {**summary, "rows": rows}
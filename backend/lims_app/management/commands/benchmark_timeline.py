@@ -0,0 +1,137 @@
+"""
+Benchmark the sample timeline endpoints at deep fan-out.
+
+Takes the ``--samples`` samples with the most test results and, with
+``--fan-out N``, first gives each of them N more results on randomly
+chosen tests, inside a transaction that is rolled back at the end so the
+data set stays unchanged.  Then measures:
+
+* ``single``: ``GET /api/samples/<pk>/timeline/`` for each sample, through
+  the full middleware and DRF stack;
+* ``batched``: ``GET /api/samples/timeline/?ids=`` for all of them at once;
+* ``unprefetched``: the same serializer over a plain queryset, so that
+  every relation is loaded lazily, i.e. the timeline without its prefetch
+  plan.  Its output is checked against the prefetched one (lazily loaded
+  relations have no ordering, so lists are compared sorted by ID).
+
+The report is printed (or written with ``--output``) as JSON with the
+latency percentiles and query counts of each.
+
+Usage::
+
+    python manage.py benchmark_timeline --samples 50 --fan-out 200
+"""
+
+from __future__ import annotations
+
+import json
+import random
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.db.models import Count
+from django.test.utils import override_settings
+from django.utils import timezone
+from rest_framework.renderers import JSONRenderer
+from rest_framework.test import APIClient
+
+from lims_app import timeline
+from lims_app.benchmarks import Timings, git_revision
+from lims_app.models import Sample, SampleTestLink, Test
+from lims_app.serializers import SampleTimelineSerializer
+
+
+class Command(BaseCommand):
+    help = "Benchmark the sample timeline endpoints on the most fanned-out samples and print JSON."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--samples", type=int, default=50, help="Samples per batched request.")
+        parser.add_argument("--fan-out", type=int, default=0, help="Extra test results per sample for the run.")
+        parser.add_argument("--iterations", type=int, default=10, help="Measured runs of each variant.")
+        parser.add_argument("--seed", type=int, default=0, help="Seed for the --fan-out rows.")
+        parser.add_argument("--output", default=None, help="Write the JSON report to this file.")
+
+    def handle(self, *args, **options):
+        count = min(options["samples"], timeline.max_samples())
+        ids = list(
+            Sample.objects.annotate(results=Count("sampletestlink"))
+            .order_by("-results", "pk").values_list("pk", flat=True)[:count]
+        )
+        if not ids:
+            raise CommandError("No samples to benchmark; run generate_data first.")
+        self.client = APIClient()
+        self.client.force_authenticate(User(username="benchmark"))
+        with override_settings(API_CACHE_ENABLED=False), transaction.atomic():
+            if options["fan_out"]:
+                self.fan_out(ids, options["fan_out"], options["seed"])
+            report = self.run(ids, options["iterations"])
+            transaction.set_rollback(True)
+        text = json.dumps(report, indent=2)
+        if options["output"]:
+            with open(options["output"], "w", encoding="utf-8") as handle:
+                handle.write(text + "\n")
+            self.stderr.write(f"Wrote the report to {options['output']}")
+        else:
+            self.stdout.write(text)
+
+    def fan_out(self, ids, per_sample: int, seed: int) -> None:
+        rng = random.Random(seed)
+        tests = list(Test.objects.values_list("pk", flat=True))
+        if not tests:
+            raise CommandError("--fan-out needs at least one test.")
+        now = timezone.now()
+        SampleTestLink.objects.bulk_create(
+            [
+                SampleTestLink(
+                    sample_id=pk, test_id=rng.choice(tests), testing_analyst="benchmark",
+                    reviewing_analyst="benchmark", test_result=rng.randint(1, 100), deadline=now,
+                    pass_or_fail=True,
+                )
+                for pk in ids
+                for _ in range(per_sample)
+            ],
+            batch_size=500,
+        )
+
+    def run(self, ids, iterations: int) -> dict:
+        single, batched, unprefetched = Timings(), Timings(), Timings()
+        query = ",".join(map(str, ids))
+        self.client.get(f"/api/samples/timeline/?ids={query}")  # load the reference data once
+        for _ in range(iterations):
+            for pk in ids:
+                with single.measure():
+                    response = self.client.get(f"/api/samples/{pk}/timeline/")
+                single.errors += response.status_code != 200
+            with batched.measure():
+                response = self.client.get(f"/api/samples/timeline/?ids={query}")
+            batched.errors += response.status_code != 200
+            with unprefetched.measure():
+                lazy = JSONRenderer().render(
+                    SampleTimelineSerializer(Sample.objects.filter(pk__in=ids).order_by("pk"), many=True).data
+                )
+        eager = JSONRenderer().render(
+            SampleTimelineSerializer(timeline.timeline_queryset().filter(pk__in=ids).order_by("pk"), many=True).data
+        )
+        return {
+            "revision": git_revision(),
+            "timestamp": timezone.now().isoformat(),
+            "samples": len(ids),
+            "test_results": SampleTestLink.objects.filter(sample__in=ids).count(),
+            "single": single.summary(),
+            "batched": batched.summary(),
+            "unprefetched": unprefetched.summary(),
+            "identical": canonical(json.loads(lazy)) == canonical(json.loads(eager)) if iterations else None,
+        }
+
+
+def canonical(data):
+    """``data`` with every list of objects sorted by ID."""
+    if isinstance(data, dict):
+        return {key: canonical(value) for key, value in data.items()}
+    if isinstance(data, list):
+        items = [canonical(item) for item in data]
+        if all(isinstance(item, dict) and "id" in item for item in items):
+            items.sort(key=lambda item: item["id"])
+        return items
+    return data
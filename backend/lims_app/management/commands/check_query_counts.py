@@ -0,0 +1,81 @@
+"""
+Verify that every list endpoint runs in a constant number of queries.
+
+Each router-registered viewset is asked for a one-row page and for a
+larger page against the configured database.  If serializing more rows
+costs more queries the endpoint has an N+1 problem and the command exits
+with an error, which makes it suitable for CI or a pre-deployment check
+against a populated database.  The response cache is disabled for the
+run, and each endpoint is requested once before measuring so that the
+one-off load of the reference-data tables (see ``refdata.py``) is not
+counted.  Sample timelines (see ``timeline.py``) are checked the same way,
+for one sample and for a batch of ``--page-size`` samples.
+
+Usage::
+
+    python manage.py check_query_counts --page-size 50
+"""
+
+from __future__ import annotations
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test.utils import CaptureQueriesContext, override_settings
+from rest_framework.test import APIRequestFactory, force_authenticate
+
+from lims_app.timeline import TimelineMixin, max_samples
+from lims_app.urls import router
+
+
+class Command(BaseCommand):
+    help = "Check that list endpoints issue the same number of queries for small and large pages."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--page-size", type=int, default=50, help="Rows in the larger page.")
+
+    @override_settings(API_CACHE_ENABLED=False)
+    def handle(self, *args, **options):
+        page_size = options["page_size"]
+        factory = APIRequestFactory()
+        user = User(username="query-count-check")
+        failures = []
+        for prefix, viewset, _basename in router.registry:
+            view = viewset.as_view({"get": "list"})
+            counts = []
+            for size in (1, 1, page_size):
+                request = factory.get(f"/api/{prefix}/", {"page_size": size})
+                force_authenticate(request, user=user)
+                with CaptureQueriesContext(connection) as ctx:
+                    response = view(request)
+                    response.render()
+                counts.append((len(ctx.captured_queries), len(response.data["results"])))
+            _warm_up, (small, _), (large, rows) = counts
+            status = "ok" if small == large else "N+1"
+            self.stdout.write(f"{prefix:<24} {small:>3} / {large:>3} queries ({rows} rows) {status}")
+            if small != large:
+                failures.append(prefix)
+            if issubclass(viewset, TimelineMixin) and not self.check_timeline(factory, user, prefix, viewset, page_size):
+                failures.append(f"{prefix}/timeline")
+        if failures:
+            raise CommandError(f"Query count grows with page size on: {', '.join(failures)}")
+
+    def check_timeline(self, factory, user, prefix, viewset, page_size) -> bool:
+        view = viewset.as_view({"get": "timelines"})
+        pks = list(viewset.queryset.model._base_manager.order_by("pk").values_list("pk", flat=True)[:page_size])
+        pks = pks[:max_samples()]
+        if not pks:
+            return True
+        counts = []
+        for ids in (pks[:1], pks[:1], pks):
+            request = factory.get(f"/api/{prefix}/timeline/", {"ids": ",".join(map(str, ids))})
+            force_authenticate(request, user=user)
+            with CaptureQueriesContext(connection) as ctx:
+                response = view(request)
+                response.render()
+            counts.append(len(ctx.captured_queries))
+        _warm_up, small, large = counts
+        status = "ok" if small == large else "N+1"
+        label = f"{prefix}/timeline"
+        self.stdout.write(f"{label:<24} {small:>3} / {large:>3} queries ({len(pks)} samples) {status}")
+        return small == large
@@ -0,0 +1,39 @@
+"""
+Check the read replicas the API routes reads to.
+
+Probes every alias in ``DATABASE_REPLICAS`` the way the router does (see
+``routers.py``), against the heartbeat last written on the primary, and
+prints whether each is reachable and how far behind it is.  Then writes
+the next heartbeat.  Exits with an error when a replica is configured but
+none would be used, e.g. for a monitoring check.
+
+Usage::
+
+    DB_REPLICAS=replica-a,replica-b python manage.py check_replicas
+"""
+
+from __future__ import annotations
+
+from django.core.management.base import BaseCommand, CommandError
+
+from lims_app import routers
+
+
+class Command(BaseCommand):
+    help = "Probe the read replicas for reachability and lag."
+
+    def handle(self, *args, **options):
+        if not routers.replicas():
+            self.stdout.write("No read replicas configured (DB_REPLICAS); every query uses the primary.")
+            return
+        statuses = routers.monitor.check()
+        for alias in routers.replicas():
+            status = statuses[alias]
+            lag = "unknown" if status.lag is None else f"{status.lag:.1f} s"
+            if status.healthy:
+                self.stdout.write(f"{alias}: healthy, lag {lag}")
+            else:
+                self.stderr.write(f"{alias}: skipped, {status.error}")
+        if not any(status.healthy for status in statuses.values()):
+            raise CommandError("No healthy replica; reads fall back to the primary.")
+        self.stdout.write(self.style.SUCCESS("Reads are served by the healthy replicas."))
@@ -0,0 +1,71 @@
+"""
+Fill the database with reproducible synthetic data.
+
+Generates rows for every model with realistic foreign-key fan-out (see
+``lims_app/synthetic.py``), for load tests and for ``benchmark_api``.
+Counts default to a small laboratory and can be scaled together or set
+per model by lower-case model name.
+
+Usage::
+
+    python manage.py generate_data --scale 10
+    python manage.py generate_data --count sample=1000000 --count sampletestlink=5000000 \\
+        --count reagent=50000 --seed 7 --anchor today
+"""
+
+from __future__ import annotations
+
+import datetime
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from django.utils import timezone
+
+from lims_app.synthetic import ANCHOR, DEFAULT_COUNTS, generate
+
+
+class Command(BaseCommand):
+    help = "Generate reproducible synthetic data across all models using bulk inserts."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--scale", type=float, default=1.0, help="Multiply every default count.")
+        parser.add_argument(
+            "--count",
+            action="append",
+            default=[],
+            metavar="MODEL=N",
+            help=f"Rows for one model (repeatable). Models: {', '.join(DEFAULT_COUNTS)}.",
+        )
+        parser.add_argument("--seed", type=int, default=0, help="Random seed; the same seed yields the same data.")
+        parser.add_argument(
+            "--anchor",
+            default=ANCHOR.date().isoformat(),
+            help="Date the generated history ends at (YYYY-MM-DD or 'today').",
+        )
+        parser.add_argument("--chunk-size", type=int, default=10_000, help="Rows built in memory per insert batch.")
+
+    def handle(self, *args, **options):
+        counts = {key: round(value * options["scale"]) for key, value in DEFAULT_COUNTS.items()}
+        for item in options["count"]:
+            key, _, value = item.partition("=")
+            key = key.strip().lower()
+            if key not in DEFAULT_COUNTS or not value.strip().isdigit():
+                raise CommandError(f"Invalid --count {item!r}; expected MODEL=N with MODEL one of {', '.join(DEFAULT_COUNTS)}.")
+            counts[key] = int(value)
+        if options["anchor"] == "today":
+            anchor = timezone.now().replace(microsecond=0)
+        else:
+            try:
+                day = datetime.date.fromisoformat(options["anchor"])
+            except ValueError:
+                raise CommandError("--anchor must be YYYY-MM-DD or 'today'.")
+            anchor = datetime.datetime(day.year, day.month, day.day, tzinfo=datetime.timezone.utc)
+        started = time.perf_counter()
+        try:
+            written = generate(counts, seed=options["seed"], chunk_size=options["chunk_size"], anchor=anchor, log=self.stdout.write)
+        except ValueError as exc:
+            raise CommandError(str(exc))
+        elapsed = time.perf_counter() - started
+        total = sum(written.values())
+        self.stdout.write(self.style.SUCCESS(f"Wrote {total} rows in {elapsed:.1f} s ({total / max(elapsed, 1e-9):.0f} rows/s)."))
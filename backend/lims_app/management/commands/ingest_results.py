@@ -0,0 +1,89 @@
+"""
+Import an instrument result file into the test results.
+
+Streams the CSV file in chunks through the checks and bulk inserts of
+``lims_app/ingest.py``, printing the rows read, written and rejected and
+the rows per second after every ``--progress`` rows and at the end.
+Rejected rows are appended to ``--rejects`` (``<file>.rejects.csv`` by
+default) with their line number and errors as JSON.  When an import fails
+it can be continued from its last chunk with ``--resume <run>``, the run
+ID printed when it started.  Rows imported here are not audited; the
+trail covers writes made through the API.
+
+Usage::
+
+    python manage.py ingest_results results.csv --workers 4
+    python manage.py ingest_results results.csv --resume 12
+"""
+
+from __future__ import annotations
+
+import csv
+import io
+import json
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import DatabaseError
+
+from lims_app import ingest
+
+
+class Command(BaseCommand):
+    help = "Stream an instrument result file into the test results, reporting rejects and rows/sec."
+
+    def add_arguments(self, parser):
+        parser.add_argument("path", help="CSV file of results (see lims_app/resultfiles.py).")
+        parser.add_argument("--resume", type=int, default=None, help="Continue the failed import run with this ID.")
+        parser.add_argument("--workers", type=int, default=None, help="Checking processes (default INGEST_WORKERS).")
+        parser.add_argument("--chunk-rows", type=int, default=None, help="Rows per chunk (default INGEST_CHUNK_ROWS).")
+        parser.add_argument("--rejects", default=None, help="File the rejected rows are appended to.")
+        parser.add_argument("--progress", type=int, default=100000, help="Rows between progress lines.")
+
+    def handle(self, *args, **options):
+        path = options["path"]
+        try:
+            binary = open(path, "rb")
+        except OSError as exc:
+            raise CommandError(f"Cannot read {path}: {exc}") from exc
+        with binary, open(options["rejects"] or f"{path}.rejects.csv", "a", newline="", encoding="utf-8") as rejects:
+            try:
+                run = ingest.start_run(binary, path, options["resume"])
+            except ingest.IngestError as exc:
+                raise CommandError(str(exc)) from exc
+            action = f"Resuming ingest run {run.pk} after {run.rows_read} rows" if options["resume"] else f"Ingest run {run.pk}"
+            self.stdout.write(f"{action}: {path}")
+            writer = csv.writer(rejects)
+            if rejects.tell() == 0:
+                writer.writerow(["line", "errors"])
+            reported = [0]
+
+            def on_chunk(result, written, chunk_rejects):
+                writer.writerows([line, json.dumps(errors)] for line, errors in chunk_rejects)
+                if result.rows - reported[0] >= options["progress"]:
+                    reported[0] = result.rows
+                    self.stdout.write(self.summary(result))
+
+            text = io.TextIOWrapper(binary, encoding="utf-8-sig", newline="")
+            try:
+                result = ingest.ingest(
+                    run, text, workers=options["workers"], chunk_rows=options["chunk_rows"], on_chunk=on_chunk
+                )
+            except ingest.IngestError as exc:
+                raise CommandError(str(exc)) from exc
+            except (DatabaseError, UnicodeDecodeError) as exc:
+                raise CommandError(
+                    f"Ingest run {run.pk} failed after {run.rows_read} rows: {exc}\n"
+                    f"Continue it with --resume {run.pk}."
+                ) from exc
+        self.stdout.write(self.summary(result))
+        if result.rejected:
+            self.stderr.write(f"{result.rejected} rejected rows appended to {rejects.name}.")
+        self.stdout.write(self.style.SUCCESS(
+            f"Ingest run {run.pk} complete: {run.rows_written} rows written, {run.rows_rejected} rejected in total."
+        ))
+
+    def summary(self, result) -> str:
+        return (
+            f"{result.rows} rows read, {result.written} written, {result.rejected} rejected "
+            f"in {result.seconds:.1f}s ({result.rows_per_sec} rows/s)"
+        )
@@ -0,0 +1,66 @@
+"""
+Purge SOPs, samples and tests retired before a cut-off.
+
+Records deleted through the API are only retired (see
+``lims_app/retire.py``).  This command deletes those retired at least
+``--older-than`` days ago (0: all of them), with everything that cascades
+from them, using the set-based statements of ``lims_app/purge.py``:
+``PURGE_BATCH_SIZE`` rows per statement (``--batch-size``), children
+before parents, without loading any row into Python.  Samples go first,
+then tests, then SOPs.  ``--dry-run`` prints the planned statements and
+the rows each would affect on the primary instead.  An interrupted run
+leaves no orphaned rows and is finished by running it again.  Purges made
+here are not audited; the retirement of each record was.
+
+Usage::
+
+    python manage.py purge_retired --older-than 90
+    python manage.py purge_retired --model sample --dry-run
+"""
+
+from __future__ import annotations
+
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from lims_app import purge, sharding
+from lims_app.models import SOP, Sample, Test
+
+
+MODELS = {"sample": Sample, "test": Test, "sop": SOP}
+
+
+class Command(BaseCommand):
+    help = "Delete retired SOPs, samples and tests with everything below them, set-wise and in batches."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--model", choices=sorted(MODELS), action="append", help="Only purge these (repeatable).")
+        parser.add_argument("--older-than", type=int, default=0, help="Days since the records were retired.")
+        parser.add_argument("--batch-size", type=int, default=None, help="Rows per statement (default PURGE_BATCH_SIZE).")
+        parser.add_argument("--dry-run", action="store_true", help="Print the statements and row counts only.")
+
+    def handle(self, *args, **options):
+        cutoff = timezone.now() - timedelta(days=max(0, options["older_than"]))
+        for name, model in MODELS.items():
+            if options["model"] and name not in options["model"]:
+                continue
+            retired = model._base_manager.filter(retired_at__isnull=False, retired_at__lte=cutoff)
+            if options["dry_run"]:
+                self.explain(model, retired)
+                continue
+            counts = purge.purge(retired, options["batch_size"])
+            deleted = counts["deleted"].get(model._meta.label_lower, 0)
+            self.stdout.write(self.style.SUCCESS(f"Purged {deleted} retired {model.__name__} rows."))
+            for label, count in sorted(counts["deleted"].items()):
+                if label != model._meta.label_lower:
+                    self.stdout.write(f"  {label}: {count} deleted")
+            for label, count in sorted(counts["updated"].items()):
+                self.stdout.write(f"  {label}: {count} set to NULL")
+
+    def explain(self, model, retired) -> None:
+        self.stdout.write(f"-- {model.__name__}: {retired.count()} retired rows")
+        for step in purge.plan(retired):
+            rows = step.rows.using(sharding.PRIMARY).count()
+            self.stdout.write(f"-- {rows} rows\n{step.describe(sharding.PRIMARY)};")
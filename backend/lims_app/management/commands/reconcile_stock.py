@@ -0,0 +1,58 @@
+"""
+Reconcile the stock balances with the stock ledger.
+
+The balances in ``ReagentStock`` and ``SampleStock`` (and
+``Sample.quantity``) are maintained by ``stock.record`` as movements are
+posted.  Writes that bypass it (raw SQL, imports straight into the
+tables) leave them out of step with the ledger, so this command sums the
+ledger per reagent lot and sample and reports every balance that
+differs.  With sample shards each database is checked against its own
+ledger, and problems on a shard name it.  ``--rebuild`` first recomputes the balances from
+the ledger; ``--backfill`` first writes opening entries for samples and
+test usage recorded before the ledger existed.
+
+Usage::
+
+    python manage.py reconcile_stock              # verify only
+    python manage.py reconcile_stock --rebuild    # rebuild + verify
+    python manage.py reconcile_stock --backfill   # opening entries + rebuild + verify
+"""
+
+from __future__ import annotations
+
+from django.core.management.base import BaseCommand, CommandError
+
+from lims_app import stock
+
+
+class Command(BaseCommand):
+    help = "Check the stock balances against the ledger, optionally rebuilding them."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--rebuild",
+            action="store_true",
+            help="Recompute the balances from the ledger before checking them.",
+        )
+        parser.add_argument(
+            "--backfill",
+            action="store_true",
+            help="Write opening ledger entries for existing stock, then rebuild.",
+        )
+
+    def handle(self, *args, **options):
+        if options["backfill"]:
+            written = stock.backfill_opening_entries()
+            self.stdout.write(
+                f"Wrote opening entries for {written['samples']} samples "
+                f"and {written['test_reagent_links']} test reagent usages."
+            )
+        elif options["rebuild"]:
+            stock.rebuild_balances()
+            self.stdout.write("Rebuilt stock balances.")
+        problems = stock.verify_balances()
+        for problem in problems:
+            self.stderr.write(problem)
+        if problems:
+            raise CommandError(f"{len(problems)} stock balance(s) do not match the ledger.")
+        self.stdout.write(self.style.SUCCESS("Stock balances match the ledger."))
@@ -0,0 +1,97 @@
+"""
+Set up and check the sample shards.
+
+``--sync`` copies the shared tables (SOPs, user accounts, locations,
+warehouses and tests) from the primary to every shard in
+``SAMPLE_SHARDS``; writes made through the ORM afterwards are copied as
+they commit (see ``signals.py``), bulk loads such as ``generate_data``
+are not.  ``--move`` moves the samples still on the primary, with their
+in-process/stability/finished-product records, user sample actions, test
+results, stock movements and stock balance, to the shard of their
+warehouse, ``--chunk-size`` samples per transaction.  Rows keep their
+IDs, and a chunk that was copied but not yet deleted from the primary is
+skipped on the shard when the command is run again.
+
+Without options, or after them, prints the row count of every sharded
+and shared table per database and the samples stored on the wrong shard.
+The schema is created on each shard with ``migrate --run-syncdb
+--database <alias>``.
+
+Usage::
+
+    DB_SHARDS=shard-a,shard-b python manage.py shard_data --sync --move
+"""
+
+from __future__ import annotations
+
+from collections import Counter, defaultdict
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+from lims_app import sharding
+from lims_app.bulk import parameter_limit
+from lims_app.models import Sample, Warehouse
+
+
+class Command(BaseCommand):
+    help = "Copy the shared tables to the sample shards, move sample data there and report row counts."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--sync", action="store_true", help="Copy the shared tables to every shard.")
+        parser.add_argument("--move", action="store_true", help="Move the sample data on the primary to its shards.")
+        parser.add_argument("--chunk-size", type=int, default=500, help="Samples moved per transaction.")
+
+    def handle(self, *args, **options):
+        if not sharding.enabled():
+            raise CommandError("No shards configured (DB_SHARDS); sample data stays on the primary.")
+        if options["sync"]:
+            for model in sharding.REFERENCE_MODELS:
+                count = sharding.copy_reference_rows(model)
+                self.stdout.write(f"Copied {count} {model.__name__} rows to {len(sharding.shards())} shards.")
+        if options["move"]:
+            moved = self.move(max(1, options["chunk_size"]))
+            for model in sharding.SHARDED_MODELS:
+                self.stdout.write(f"Moved {moved[model]} {model.__name__} rows.")
+        self.report()
+
+    def move(self, chunk_size: int) -> Counter:
+        moved = Counter()
+        primary = Sample._base_manager.using(sharding.PRIMARY)
+        while True:
+            chunk = list(primary.order_by("pk").values_list("pk", "warehouse_id")[:chunk_size])
+            if not chunk:
+                return moved
+            by_shard = defaultdict(list)
+            for pk, warehouse_id in chunk:
+                by_shard[sharding.shard_for_warehouse(warehouse_id)].append(pk)
+            for alias, pks in by_shard.items():
+                with transaction.atomic(using=alias):
+                    for model in sharding.SHARDED_MODELS:
+                        lookup = "pk__in" if model is Sample else "sample_id__in"
+                        rows = list(model._base_manager.using(sharding.PRIMARY).filter(**{lookup: pks}))
+                        model._base_manager.using(alias).bulk_create(
+                            rows,
+                            batch_size=max(1, parameter_limit() // len(model._meta.concrete_fields)),
+                            ignore_conflicts=True,
+                        )
+                        moved[model] += len(rows)
+                # The delete cascades to the rows copied with the samples.
+                with transaction.atomic(using=sharding.PRIMARY):
+                    primary.filter(pk__in=pks).delete()
+
+    def report(self) -> None:
+        databases = [sharding.PRIMARY, *sharding.shards()]
+        width = max(len(model.__name__) for model in (*sharding.SHARDED_MODELS, *sharding.REFERENCE_MODELS))
+        self.stdout.write(" ".join([" " * width, *(f"{alias:>10}" for alias in databases)]))
+        for model in (*sharding.SHARDED_MODELS, *sharding.REFERENCE_MODELS):
+            counts = [model._base_manager.using(alias).count() for alias in databases]
+            self.stdout.write(" ".join([f"{model.__name__:<{width}}", *(f"{count:>10}" for count in counts)]))
+            if model in sharding.REFERENCE_MODELS and any(count != counts[0] for count in counts[1:]):
+                self.stderr.write(f"{model.__name__} differs between the primary and a shard; run --sync.")
+        warehouses = Warehouse._base_manager.using(sharding.PRIMARY).values_list("pk", flat=True)
+        for alias in sharding.shards():
+            placed = [pk for pk in warehouses if sharding.shard_for_warehouse(pk) == alias]
+            misplaced = Sample._base_manager.using(alias).exclude(warehouse_id__in=placed).count()
+            if misplaced:
+                self.stderr.write(f"{alias}: {misplaced} samples belong on another shard.")
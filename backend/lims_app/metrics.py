@@ -0,0 +1,206 @@
+"""
+In-process request metrics and their Prometheus exposition.
+
+``middleware.RequestMetricsMiddleware`` records one sample per request into
+the :data:`registry`, keyed by resolved view name and HTTP method.  Each
+endpoint keeps five :class:`Histogram` instances: wall time, time spent in
+the database, number of queries, number of duplicate queries and response
+size.
+
+The histograms use HDR-style log-linear buckets: every power of two is
+split into ``2**SUB_BUCKET_BITS`` equal sub-buckets, so any recorded value
+is known to within about 1% while memory stays bounded (a few hundred
+buckets at most) and recording is O(1).  Percentiles are read straight from
+the buckets.
+
+``GET /metrics`` renders the registry in the Prometheus text format.  The
+numbers are per worker process; Prometheus sums them across scrape
+targets.  Only the addresses in ``METRICS_ALLOWED_IPS`` may read it.
+"""
+
+from __future__ import annotations
+
+import threading
+
+from django.conf import settings
+from django.http import Http404, HttpResponse
+
+
+SUB_BUCKET_BITS = 7
+SUB_BUCKET_COUNT = 1 << SUB_BUCKET_BITS
+
+# Exported ``le`` boundaries per histogram, in the exported unit.
+DURATION_BOUNDS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+QUERY_BOUNDS = (0, 1, 2, 5, 10, 20, 50, 100, 200, 500, 1000)
+BYTE_BOUNDS = (1_000, 10_000, 100_000, 1_000_000, 10_000_000, 100_000_000)
+QUANTILES = (0.5, 0.9, 0.95, 0.99)
+
+
+def bucket_index(value: int) -> int:
+    """Return the bucket holding non-negative integer ``value``."""
+    if value < SUB_BUCKET_COUNT:
+        return value
+    shift = value.bit_length() - SUB_BUCKET_BITS
+    return (shift << SUB_BUCKET_BITS) | (value >> shift)
+
+
+def bucket_upper(index: int) -> int:
+    """Return the largest value that falls in bucket ``index``."""
+    shift, sub = index >> SUB_BUCKET_BITS, index & (SUB_BUCKET_COUNT - 1)
+    if shift == 0:
+        return sub
+    return ((sub + 1) << shift) - 1
+
+
+class Histogram:
+    """Log-linear histogram of non-negative integers."""
+
+    def __init__(self) -> None:
+        self.counts: dict[int, int] = {}
+        self.count = 0
+        self.total = 0
+        self.max = 0
+        self._lock = threading.Lock()
+
+    def record(self, value: int) -> None:
+        value = max(0, int(value))
+        index = bucket_index(value)
+        with self._lock:
+            self.counts[index] = self.counts.get(index, 0) + 1
+            self.count += 1
+            self.total += value
+            if value > self.max:
+                self.max = value
+
+    def _sorted(self) -> list[tuple[int, int]]:
+        with self._lock:
+            return sorted(self.counts.items())
+
+    def percentile(self, quantile: float) -> int:
+        """Return the upper bound of the bucket holding the ``quantile`` value."""
+        if not self.count:
+            return 0
+        rank = max(1, round(quantile * self.count))
+        seen = 0
+        for index, count in self._sorted():
+            seen += count
+            if seen >= rank:
+                return min(bucket_upper(index), self.max)
+        return self.max
+
+    def cumulative(self, bounds) -> list[tuple[float, int]]:
+        """Return ``(bound, count of values <= bound)`` for each bound (in recorded units)."""
+        items = self._sorted()
+        result = []
+        position, seen = 0, 0
+        for bound in bounds:
+            while position < len(items) and bucket_upper(items[position][0]) <= bound:
+                seen += items[position][1]
+                position += 1
+            result.append((bound, seen))
+        return result
+
+
+class EndpointMetrics:
+    """Histograms for one (view, method) pair."""
+
+    def __init__(self) -> None:
+        self.wall_us = Histogram()
+        self.db_us = Histogram()
+        self.queries = Histogram()
+        self.duplicates = Histogram()
+        self.response_bytes = Histogram()
+
+    def record(self, wall_us, db_us, queries, duplicates, response_bytes) -> None:
+        self.wall_us.record(wall_us)
+        self.db_us.record(db_us)
+        self.queries.record(queries)
+        self.duplicates.record(duplicates)
+        self.response_bytes.record(response_bytes)
+
+
+class MetricsRegistry:
+    def __init__(self) -> None:
+        self._endpoints: dict[tuple[str, str], EndpointMetrics] = {}
+        self._lock = threading.Lock()
+
+    def endpoint(self, view: str, method: str) -> EndpointMetrics:
+        key = (view, method)
+        metrics = self._endpoints.get(key)
+        if metrics is None:
+            with self._lock:
+                metrics = self._endpoints.setdefault(key, EndpointMetrics())
+        return metrics
+
+    def items(self) -> list[tuple[tuple[str, str], EndpointMetrics]]:
+        with self._lock:
+            return sorted(self._endpoints.items())
+
+    def clear(self) -> None:
+        with self._lock:
+            self._endpoints.clear()
+
+
+registry = MetricsRegistry()
+
+
+# ---------------------------------------------------------------------------
+# Prometheus text exposition
+# ---------------------------------------------------------------------------
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _labels(view: str, method: str, **extra) -> str:
+    pairs = [("view", view), ("method", method)] + list(extra.items())
+    return "{" + ",".join(f'{name}="{_escape(str(value))}"' for name, value in pairs) + "}"
+
+
+def _number(value: float) -> str:
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+# (metric name, help text, attribute, exported bounds, divisor from recorded units)
+HISTOGRAMS = (
+    ("lisms_request_duration_seconds", "Wall time per request.", "wall_us", DURATION_BOUNDS, 1_000_000),
+    ("lisms_request_db_seconds", "Time spent executing SQL per request.", "db_us", DURATION_BOUNDS, 1_000_000),
+    ("lisms_request_queries", "SQL queries per request.", "queries", QUERY_BOUNDS, 1),
+    ("lisms_request_duplicate_queries", "Repeated identical SQL queries per request.", "duplicates", QUERY_BOUNDS, 1),
+    ("lisms_response_bytes", "Response body size.", "response_bytes", BYTE_BOUNDS, 1),
+)
+
+
+def render_prometheus(source: MetricsRegistry = registry) -> str:
+    endpoints = source.items()
+    lines = []
+    for name, help_text, attribute, bounds, divisor in HISTOGRAMS:
+        lines.append(f"# HELP {name} {help_text}")
+        lines.append(f"# TYPE {name} histogram")
+        for (view, method), metrics in endpoints:
+            histogram = getattr(metrics, attribute)
+            recorded_bounds = [bound * divisor for bound in bounds]
+            for (_, seen), bound in zip(histogram.cumulative(recorded_bounds), bounds):
+                lines.append(f"{name}_bucket{_labels(view, method, le=_number(bound))} {seen}")
+            lines.append(f"{name}_bucket{_labels(view, method, le='+Inf')} {histogram.count}")
+            lines.append(f"{name}_sum{_labels(view, method)} {_number(histogram.total / divisor)}")
+            lines.append(f"{name}_count{_labels(view, method)} {histogram.count}")
+    name = "lisms_request_latency_seconds"
+    lines.append(f"# HELP {name} Wall time percentiles per request.")
+    lines.append(f"# TYPE {name} summary")
+    for (view, method), metrics in endpoints:
+        histogram = metrics.wall_us
+        for quantile in QUANTILES:
+            value = histogram.percentile(quantile) / 1_000_000
+            lines.append(f"{name}{_labels(view, method, quantile=quantile)} {_number(value)}")
+        lines.append(f"{name}_sum{_labels(view, method)} {_number(histogram.total / 1_000_000)}")
+        lines.append(f"{name}_count{_labels(view, method)} {histogram.count}")
+    return "\n".join(lines) + "\n"
+
+
+def metrics_view(request):
+    """Serve the registry to local scrapers; other clients get a 404."""
+    allowed = getattr(settings, "METRICS_ALLOWED_IPS", ("127.0.0.1", "::1"))
+    if request.META.get("REMOTE_ADDR") not in allowed:
+        raise Http404
+    return HttpResponse(render_prometheus(), content_type="text/plain; version=0.0.4; charset=utf-8")
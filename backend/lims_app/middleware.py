@@ -0,0 +1,201 @@
+"""
+Request instrumentation middleware.
+
+:class:`RequestMetricsMiddleware` sees each SQL statement without
+``DEBUG=True`` through an ``execute_wrapper`` installed on every database
+connection.  The wrapper reports to the recorder of the current request,
+found through a context variable, which also follows the async ORM into
+the worker threads it runs queries on.  Per request it measures wall
+time, time spent in SQL, the number of queries, the number of duplicate
+queries (the same SQL with the same parameters run more than once, the
+signature of an N+1 loop) and the size of the response body, and records
+them in ``metrics.registry`` under the resolved view name and method.
+
+Requests slower than ``METRICS_SLOW_REQUEST_MS`` or issuing more than
+``METRICS_SLOW_REQUEST_QUERIES`` queries are written to the
+``lims_app.slow_requests`` logger together with the SQL they ran.  Both
+thresholds are off unless set.  Streaming responses are measured until
+their last chunk has been sent.  The middleware supports both WSGI and
+ASGI requests.
+"""
+
+from __future__ import annotations
+
+import logging
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.db import connections
+from django.db.backends.signals import connection_created
+from django.dispatch import receiver
+
+from .metrics import registry
+
+
+logger = logging.getLogger("lims_app.slow_requests")
+
+# At most this many statements are kept per request for the slow log.
+MAX_LOGGED_QUERIES = 200
+
+_current_recorder: ContextVar = ContextVar("lims_query_recorder", default=None)
+
+
+def record_query(execute, sql, params, many, context):
+    """Persistent ``execute_wrapper`` forwarding to the active recorder."""
+    recorder = _current_recorder.get()
+    if recorder is None:
+        return execute(sql, params, many, context)
+    return recorder(execute, sql, params, many, context)
+
+
+def install_wrapper(connection) -> None:
+    if record_query not in connection.execute_wrappers:
+        connection.execute_wrappers.append(record_query)
+
+
+@receiver(connection_created)
+def _connection_created(sender, connection, **kwargs):
+    install_wrapper(connection)
+
+
+class QueryRecorder:
+    """``execute_wrapper`` callable that tallies the statements it sees."""
+
+    def __init__(self, keep_sql: bool = False) -> None:
+        self.keep_sql = keep_sql
+        self.count = 0
+        self.duplicates = 0
+        self.db_seconds = 0.0
+        self.statements: list[tuple[str, float]] = []
+        self._seen: set[int] = set()
+        # Requests may run queries on several threads (see ``widgets.py``).
+        self._lock = threading.Lock()
+
+    def __call__(self, execute, sql, params, many, context):
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            elapsed = time.perf_counter() - start
+            fingerprint = hash((sql, repr(params)))
+            with self._lock:
+                self.count += 1
+                self.db_seconds += elapsed
+                if fingerprint in self._seen:
+                    self.duplicates += 1
+                else:
+                    self._seen.add(fingerprint)
+                if self.keep_sql and len(self.statements) < MAX_LOGGED_QUERIES:
+                    self.statements.append((sql, elapsed))
+
+    @contextmanager
+    def capture(self):
+        for connection in connections.all():
+            install_wrapper(connection)
+        token = _current_recorder.set(self)
+        try:
+            yield self
+        finally:
+            try:
+                _current_recorder.reset(token)
+            except ValueError:
+                # A streaming body may be consumed in another context.
+                _current_recorder.set(None)
+
+
+class RequestMetricsMiddleware:
+    """Records per-view latency, query and size metrics (see module docstring)."""
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response) -> None:
+        self.get_response = get_response
+        self.enabled = getattr(settings, "METRICS_ENABLED", True)
+        self.slow_ms = getattr(settings, "METRICS_SLOW_REQUEST_MS", None)
+        self.slow_queries = getattr(settings, "METRICS_SLOW_REQUEST_QUERIES", None)
+        self.is_async = iscoroutinefunction(get_response)
+        if self.is_async:
+            markcoroutinefunction(self)
+
+    def _recorder(self) -> QueryRecorder:
+        return QueryRecorder(keep_sql=self.slow_ms is not None or self.slow_queries is not None)
+
+    def __call__(self, request):
+        if self.is_async:
+            return self.__acall__(request)
+        if not self.enabled:
+            return self.get_response(request)
+        recorder = self._recorder()
+        start = time.perf_counter()
+        with recorder.capture():
+            response = self.get_response(request)
+        return self._complete(request, response, recorder, start)
+
+    async def __acall__(self, request):
+        if not self.enabled:
+            return await self.get_response(request)
+        recorder = self._recorder()
+        start = time.perf_counter()
+        with recorder.capture():
+            response = await self.get_response(request)
+        return self._complete(request, response, recorder, start)
+
+    def _complete(self, request, response, recorder, start):
+        if not response.streaming:
+            self._finish(request, response, recorder, start, len(response.content))
+        elif response.is_async:
+            content = response.streaming_content
+            response.streaming_content = self._astream(request, response, content, recorder, start)
+        else:
+            content = response.streaming_content
+            response.streaming_content = self._stream(request, response, content, recorder, start)
+        return response
+
+    def _stream(self, request, response, content, recorder, start):
+        size = 0
+        try:
+            with recorder.capture():
+                for chunk in content:
+                    size += len(chunk)
+                    yield chunk
+        finally:
+            self._finish(request, response, recorder, start, size)
+
+    async def _astream(self, request, response, content, recorder, start):
+        size = 0
+        try:
+            with recorder.capture():
+                async for chunk in content:
+                    size += len(chunk)
+                    yield chunk
+        finally:
+            self._finish(request, response, recorder, start, size)
+
+    def _finish(self, request, response, recorder, start, size) -> None:
+        elapsed = time.perf_counter() - start
+        match = getattr(request, "resolver_match", None)
+        view = (match.view_name or match.route) if match is not None else "unresolved"
+        registry.endpoint(view, request.method).record(
+            elapsed * 1_000_000, recorder.db_seconds * 1_000_000, recorder.count, recorder.duplicates, size
+        )
+        slow = self.slow_ms is not None and elapsed * 1000 >= self.slow_ms
+        heavy = self.slow_queries is not None and recorder.count > self.slow_queries
+        if slow or heavy:
+            self._log_slow(request, response, recorder, elapsed, view)
+
+    def _log_slow(self, request, response, recorder, elapsed, view) -> None:
+        lines = [
+            f"{request.method} {request.get_full_path()} ({view}) -> {response.status_code}: "
+            f"{elapsed * 1000:.1f} ms, {recorder.count} queries ({recorder.duplicates} duplicates), "
+            f"{recorder.db_seconds * 1000:.1f} ms in SQL"
+        ]
+        for sql, seconds in recorder.statements:
+            lines.append(f"  [{seconds * 1000:.2f} ms] {sql}")
+        if recorder.count > len(recorder.statements):
+            lines.append(f"  ... {recorder.count - len(recorder.statements)} more")
+        logger.warning("\n".join(lines))
@@ -8,11 +8,31 @@ identifiers use auto‑incrementing ``BigAutoField`` primary keys for
 simplicity.  If you need to preserve the original decimal primary keys
 (e.g. for integration with an existing database), adjust the field
 definitions accordingly.
+
+SOPs, samples and tests are retired rather than deleted through the API
+(see ``retire.py``): ``retired_at`` is set and their default manager,
+``objects``, no longer returns them.  Rows that reference a retired record
+keep pointing at it, and ``_base_manager`` (used for related-object
+access) still finds it.  The indexes those managers' queries use are
+partial indexes on the active rows.
 """
 
 from __future__ import annotations
 
+from django.core.validators import MinValueValidator
 from django.db import models
+from django.db.models import Q
+
+
+# Condition of the partial indexes on the active rows of a retirable model.
+ACTIVE = Q(retired_at__isnull=True)
+
+
+class ActiveManager(models.Manager):
+    """Default manager of a retirable model: only rows that are not retired."""
+
+    def get_queryset(self):
+        return super().get_queryset().filter(retired_at__isnull=True)
 
 
 class UserAccount(models.Model):
@@ -56,9 +76,21 @@ class Administrator(models.Model):
 class SOP(models.Model):
     """Standard Operating Procedure metadata."""
 
-    sop_name = models.CharField(max_length=16, unique=True)
+    sop_name = models.CharField(max_length=16)
     version_number = models.DecimalField(max_digits=3, decimal_places=1)
     effective_date = models.DateField()
+    retired_at = models.DateTimeField(null=True, blank=True, editable=False)
+
+    objects = ActiveManager()
+
+    class Meta:
+        constraints = [
+            # A retired SOP's name may be reused by a new one.
+            models.UniqueConstraint(fields=["sop_name"], condition=ACTIVE, name="SOPActiveNameUniq"),
+        ]
+        indexes = [
+            models.Index(fields=["id"], condition=ACTIVE, name="SOPActiveIdx"),
+        ]
 
     def __str__(self) -> str:
         return f"{self.sop_name} v{self.version_number}"
@@ -153,6 +185,15 @@ class MaintenanceLog(models.Model):
     service_interval = models.CharField(max_length=64)
     next_service_date = models.DateField()
 
+    class Meta:
+        indexes = [
+            models.Index(fields=["service_date", "id"], name="MaintenanceLogServiceDateIdx"),
+            # ``MaintenanceLogNextServiceDateIdx`` in the MSSQL script; Django
+            # caps index names at 30 characters.  ``id`` is included so the
+            # due-date calendar (see ``duedates.py``) loads from the index.
+            models.Index(fields=["next_service_date", "id"], name="MaintenanceLogNextSvcDateIdx"),
+        ]
+
     def __str__(self) -> str:
         return f"{self.equipment.equipment_name} serviced on {self.service_date}"
 
@@ -165,7 +206,8 @@ class Sample(models.Model):
     sop = models.ForeignKey(SOP, on_delete=models.CASCADE)
     product_name = models.CharField(max_length=64)
     product_stage = models.CharField(max_length=64)
-    quantity = models.DecimalField(max_digits=6, decimal_places=0)
+    # Mirrors the stock balance; changed only through the ledger (see ``stock.py``).
+    quantity = models.DecimalField(max_digits=6, decimal_places=0, validators=[MinValueValidator(0)])
     time_received = models.DateTimeField()
     sample_type = models.CharField(max_length=1, choices=(
         ("I", "In Process"),
@@ -173,6 +215,20 @@ class Sample(models.Model):
         ("F", "Finished Product"),
     ))
     storage_conditions = models.CharField(max_length=5)
+    retired_at = models.DateTimeField(null=True, blank=True, editable=False)
+
+    objects = ActiveManager()
+
+    class Meta:
+        indexes = [
+            models.Index(fields=["time_received", "id"], condition=ACTIVE, name="SampleTimeReceivedIdx"),
+            models.Index(fields=["sample_type", "time_received"], condition=ACTIVE, name="SampleSampleTypeIdx"),
+            models.Index(fields=["product_stage", "time_received"], condition=ACTIVE, name="SampleProductStageIdx"),
+            models.Index(fields=["warehouse", "time_received"], condition=ACTIVE, name="SampleWarehouseTimeIdx"),
+            models.Index(fields=["location", "time_received"], condition=ACTIVE, name="SampleLocationTimeIdx"),
+            # Retired samples, for ``purge_retired``.
+            models.Index(fields=["retired_at"], condition=~ACTIVE, name="SampleRetiredIdx"),
+        ]
 
     def __str__(self) -> str:
         return f"Sample {self.id}: {self.product_name}"
@@ -227,6 +283,14 @@ class Test(models.Model):
     sop = models.ForeignKey(SOP, on_delete=models.CASCADE)
     min_acceptable_result = models.DecimalField(max_digits=16, decimal_places=6, null=True, blank=True)
     max_acceptable_result = models.DecimalField(max_digits=16, decimal_places=6, null=True, blank=True)
+    retired_at = models.DateTimeField(null=True, blank=True, editable=False)
+
+    objects = ActiveManager()
+
+    class Meta:
+        indexes = [
+            models.Index(fields=["id"], condition=ACTIVE, name="TestActiveIdx"),
+        ]
 
     def __str__(self) -> str:
         return f"Test {self.id} ({self.sop.sop_name})"
@@ -243,6 +307,15 @@ class SampleTestLink(models.Model):
     deadline = models.DateTimeField()
     pass_or_fail = models.BooleanField()
 
+    class Meta:
+        indexes = [
+            models.Index(fields=["deadline", "id"], name="SampleTestLinkDeadlineIdx"),
+            models.Index(fields=["pass_or_fail", "deadline"], name="SampleTestLinkPassFailIdx"),
+            models.Index(fields=["testing_analyst", "deadline"], name="SampleTestLinkAnalystIdx"),
+            # Per-test time series read by ``analytics.py``.
+            models.Index(fields=["test", "deadline", "id"], name="SampleTestLinkTestDeadlineIdx"),
+        ]
+
     def __str__(self) -> str:
         return f"Result for sample {self.sample_id} / test {self.test_id}"
 
@@ -268,6 +341,13 @@ class Reagent(models.Model):
     manufacturing_date = models.DateField()
     expiration_date = models.DateField()
 
+    class Meta:
+        indexes = [
+            # ``id`` is included so the due-date calendar (see
+            # ``duedates.py``) loads from the index.
+            models.Index(fields=["expiration_date", "id"], name="ReagentExpirationDateIdx"),
+        ]
+
     def __str__(self) -> str:
         return self.reagent_name
 
@@ -288,7 +368,7 @@ class TestReagentLink(models.Model):
 
     test = models.ForeignKey(Test, on_delete=models.CASCADE)
     reagent = models.ForeignKey(Reagent, on_delete=models.CASCADE)
-    volume_used = models.DecimalField(max_digits=16, decimal_places=6)
+    volume_used = models.DecimalField(max_digits=16, decimal_places=6, validators=[MinValueValidator(0)])
 
     def __str__(self) -> str:
         return f"{self.volume_used} of {self.reagent.reagent_name} in test {self.test_id}"
@@ -305,4 +385,206 @@ class VersionChange(models.Model):
     change_date = models.DateField()
 
     def __str__(self) -> str:
-        return f"{self.sop.sop_name} changed {self.old_version_number}→{self.new_version_number}"
\ No newline at end of file
+        return f"{self.sop.sop_name} changed {self.old_version_number}→{self.new_version_number}"
+
+
+class WarehouseClientPair(models.Model):
+    """Number of shipment links between one warehouse and one client.
+
+    Maintained incrementally from ``WarehouseClientLink`` signals (see
+    ``dashboard.py``) so that the distinct-client count per warehouse can be
+    kept up to date without rescanning the link table.
+    """
+
+    warehouse = models.ForeignKey(Warehouse, on_delete=models.CASCADE)
+    client = models.ForeignKey(Client, on_delete=models.CASCADE)
+    link_count = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        unique_together = ("warehouse", "client")
+
+    def __str__(self) -> str:
+        return f"{self.warehouse} → {self.client} ×{self.link_count}"
+
+
+class WarehouseClientSummary(models.Model):
+    """Materialised count of distinct clients served by each warehouse."""
+
+    warehouse = models.OneToOneField(Warehouse, on_delete=models.CASCADE, primary_key=True, related_name="client_summary")
+    total_clients = models.PositiveIntegerField(default=0)
+
+    def __str__(self) -> str:
+        return f"{self.warehouse}: {self.total_clients} clients"
+
+
+class VersionChangeSummary(models.Model):
+    """Materialised number of version changes and total days between effective dates per SOP."""
+
+    sop = models.OneToOneField(SOP, on_delete=models.CASCADE, primary_key=True, related_name="version_change_summary")
+    change_count = models.PositiveIntegerField(default=0)
+    total_days = models.BigIntegerField(default=0)
+
+    @property
+    def average_days_between_effective_dates(self) -> float | None:
+        if not self.change_count:
+            return None
+        return self.total_days / self.change_count
+
+    def __str__(self) -> str:
+        return f"{self.sop.sop_name}: {self.change_count} changes"
+
+
+class StockMovement(models.Model):
+    """One entry of the append-only stock ledger (see ``stock.py``).
+
+    Each movement changes the stock of exactly one reagent lot or one
+    sample by a signed ``quantity``: receipts are positive, consumption,
+    aliquots and shipments negative.  Movements are never updated or
+    deleted; a correction is another movement.
+    """
+
+    RECEIPT = "receipt"
+    CONSUMPTION = "consumption"
+    ALIQUOT = "aliquot"
+    SHIPMENT = "shipment"
+    ADJUSTMENT = "adjustment"
+    KIND_CHOICES = (
+        (RECEIPT, "Receipt"),
+        (CONSUMPTION, "Consumption"),
+        (ALIQUOT, "Aliquot"),
+        (SHIPMENT, "Shipment"),
+        (ADJUSTMENT, "Adjustment"),
+    )
+
+    reagent = models.ForeignKey(Reagent, on_delete=models.CASCADE, null=True, blank=True)
+    sample = models.ForeignKey(Sample, on_delete=models.CASCADE, null=True, blank=True)
+    kind = models.CharField(max_length=16, choices=KIND_CHOICES)
+    quantity = models.DecimalField(max_digits=16, decimal_places=6)
+    # The test usage a consumption entry was posted for, if any.
+    test_reagent_link = models.ForeignKey(TestReagentLink, on_delete=models.SET_NULL, null=True, blank=True)
+    reference = models.CharField(max_length=255, blank=True, default="")
+    recorded_at = models.DateTimeField()
+
+    class Meta:
+        indexes = [
+            models.Index(fields=["reagent", "id"], name="StockMovementReagentIdx"),
+            models.Index(fields=["sample", "id"], name="StockMovementSampleIdx"),
+        ]
+
+    def __str__(self) -> str:
+        item = f"reagent {self.reagent_id}" if self.reagent_id else f"sample {self.sample_id}"
+        return f"{self.kind} of {self.quantity} for {item}"
+
+
+class ReagentStock(models.Model):
+    """Running balance of one reagent lot, maintained with the stock ledger."""
+
+    reagent = models.OneToOneField(Reagent, on_delete=models.CASCADE, primary_key=True, related_name="stock")
+    quantity = models.DecimalField(max_digits=16, decimal_places=6, default=0)
+    movement_count = models.PositiveIntegerField(default=0)
+    updated_at = models.DateTimeField(null=True, blank=True)
+
+    def __str__(self) -> str:
+        return f"{self.reagent}: {self.quantity}"
+
+
+class SampleStock(models.Model):
+    """Running balance of one sample, maintained with the stock ledger."""
+
+    sample = models.OneToOneField(Sample, on_delete=models.CASCADE, primary_key=True, related_name="stock")
+    quantity = models.DecimalField(max_digits=16, decimal_places=6, default=0)
+    movement_count = models.PositiveIntegerField(default=0)
+    updated_at = models.DateTimeField(null=True, blank=True)
+
+    def __str__(self) -> str:
+        return f"Sample {self.sample_id}: {self.quantity}"
+
+
+class AuditEntry(models.Model):
+    """One audited change made through the API (see ``audit.py``).
+
+    ``changes`` maps each changed field to its ``[old, new]`` values; a
+    created row has ``None`` as every old value and a deleted row ``None``
+    as every new value.
+    """
+
+    CREATE = "create"
+    UPDATE = "update"
+    DELETE = "delete"
+    ACTION_CHOICES = (
+        (CREATE, "Create"),
+        (UPDATE, "Update"),
+        (DELETE, "Delete"),
+    )
+
+    model = models.CharField(max_length=64)
+    object_id = models.CharField(max_length=64)
+    action = models.CharField(max_length=8, choices=ACTION_CHOICES)
+    actor = models.CharField(max_length=255)
+    comment = models.TextField()
+    changes = models.JSONField(default=dict)
+    recorded_at = models.DateTimeField()
+
+    class Meta:
+        indexes = [
+            models.Index(fields=["model", "object_id", "id"], name="AuditEntryObjectIdx"),
+            models.Index(fields=["recorded_at", "id"], name="AuditEntryRecordedAtIdx"),
+        ]
+
+    def __str__(self) -> str:
+        return f"{self.action} {self.model} {self.object_id} by {self.actor}"
+
+
+class ReplicaHeartbeat(models.Model):
+    """Single row rewritten on the primary to measure replica lag (see ``routers.py``)."""
+
+    beat_at = models.DateTimeField()
+
+    def __str__(self) -> str:
+        return f"heartbeat at {self.beat_at.isoformat()}"
+
+
+class ShardSequence(models.Model):
+    """Next free primary key of one sharded model (see ``sharding.py``).
+
+    Kept on the primary so that rows created on different shards never
+    share an ID.
+    """
+
+    name = models.CharField(max_length=64, primary_key=True)
+    next_value = models.BigIntegerField()
+
+    def __str__(self) -> str:
+        return f"{self.name}: next {self.next_value}"
+
+
+class IngestRun(models.Model):
+    """Progress of one import of an instrument result file (see ``ingest.py``).
+
+    ``rows_read`` counts the data rows written or rejected so far; a resumed
+    import skips them.  ``fingerprint`` is a hash of the start of the file,
+    checked when the import is resumed.
+    """
+
+    RUNNING = "running"
+    FAILED = "failed"
+    COMPLETE = "complete"
+    STATUS_CHOICES = (
+        (RUNNING, "Running"),
+        (FAILED, "Failed"),
+        (COMPLETE, "Complete"),
+    )
+
+    source = models.CharField(max_length=255)
+    fingerprint = models.CharField(max_length=64)
+    status = models.CharField(max_length=8, choices=STATUS_CHOICES, default=RUNNING)
+    rows_read = models.PositiveBigIntegerField(default=0)
+    rows_written = models.PositiveBigIntegerField(default=0)
+    rows_rejected = models.PositiveBigIntegerField(default=0)
+    error = models.TextField(blank=True, default="")
+    started_at = models.DateTimeField()
+    updated_at = models.DateTimeField(null=True, blank=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+    def __str__(self) -> str:
+        return f"{self.source}: {self.status}, {self.rows_read} rows read"
@@ -0,0 +1,143 @@
+"""
+Pagination classes for the LISMS API.
+
+List endpoints are paginated with keyset ("cursor") pagination rather than
+page numbers.  Each page is fetched with a ``WHERE <ordering column> > ?``
+predicate against an indexed column, so the cost of fetching a page stays
+flat no matter how deep into a large table the client has scrolled, and
+rows inserted while a client is paging do not shift the page boundaries.
+The async list views use :class:`AsyncKeysetPagination`, which applies the
+same scheme to every ordering column.
+"""
+
+from __future__ import annotations
+
+import json
+from base64 import b64decode, b64encode
+
+from django.conf import settings
+from django.core.exceptions import ValidationError as DjangoValidationError
+from django.db.models import Q
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import CursorPagination
+from rest_framework.settings import api_settings
+from rest_framework.utils.urls import replace_query_param
+
+
+class LimsCursorPagination(CursorPagination):
+    """Cursor pagination driven by the ``ordering`` attribute of each view.
+
+    Views declare a stable ordering on an indexed column (``id``,
+    ``time_received``, ``deadline``, ``service_date``) and may append the
+    primary key as a tie-breaker.  Clients can request a smaller or larger
+    page with ``?page_size=`` up to ``API_MAX_PAGE_SIZE``.
+    """
+
+    ordering = "pk"
+    page_size_query_param = "page_size"
+    max_page_size = getattr(settings, "API_MAX_PAGE_SIZE", 500)
+
+    def get_ordering(self, request, queryset, view):
+        ordering_filters = [
+            backend for backend in getattr(view, "filter_backends", [])
+            if hasattr(backend, "get_ordering")
+        ]
+        view_ordering = getattr(view, "ordering", None)
+        if ordering_filters or not view_ordering:
+            return super().get_ordering(request, queryset, view)
+        if isinstance(view_ordering, str):
+            return (view_ordering,)
+        return tuple(view_ordering)
+
+
+class AsyncKeysetPagination:
+    """Keyset pagination for the async list views (see ``async_views.py``).
+
+    Serves the same ``{"next", "previous", "results"}`` pages as
+    :class:`LimsCursorPagination`, but as a plain class whose page is read
+    with ``QuerySet.aiterator()``.  The opaque cursor holds the ordering
+    values of the boundary row, so every page is one indexed range scan:
+    with ``ordering = ("-time_received", "-id")`` the next page is
+    ``WHERE time_received < ? OR (time_received = ? AND id < ?)``.  The
+    ordering must end in a unique column; the primary key is appended when
+    it does not.
+    """
+
+    cursor_query_param = "cursor"
+    page_size_query_param = "page_size"
+    max_page_size = getattr(settings, "API_MAX_PAGE_SIZE", 500)
+
+    def __init__(self, model, ordering) -> None:
+        self.model = model
+        pk_name = model._meta.pk.attname
+        ordering = [(name.replace("pk", pk_name, 1) if name.lstrip("-") == "pk" else name) for name in ordering]
+        if not any(name.lstrip("-") == pk_name for name in ordering):
+            ordering.append(("-" if ordering and ordering[0].startswith("-") else "") + pk_name)
+        self.ordering = [(name.lstrip("-"), name.startswith("-")) for name in ordering]
+
+    def get_page_size(self, request) -> int:
+        raw = request.GET.get(self.page_size_query_param)
+        try:
+            size = int(raw) if raw else api_settings.PAGE_SIZE
+        except ValueError:
+            size = api_settings.PAGE_SIZE
+        return max(1, min(size, self.max_page_size))
+
+    def decode_cursor(self, request) -> tuple[list | None, bool]:
+        encoded = request.GET.get(self.cursor_query_param)
+        if not encoded:
+            return None, False
+        try:
+            data = json.loads(b64decode(encoded.encode("ascii")).decode("utf-8"))
+            positions = [
+                self.model._meta.get_field(name).to_python(value)
+                for (name, _), value in zip(self.ordering, data["p"], strict=True)
+            ]
+            return positions, bool(data.get("r"))
+        except (TypeError, ValueError, KeyError, UnicodeError, DjangoValidationError):
+            raise NotFound(CursorPagination.invalid_cursor_message)
+
+    def encode_cursor(self, request, row, reverse: bool) -> str:
+        positions = [getattr(row, name) for name, _ in self.ordering]
+        data = {"p": [value.isoformat() if hasattr(value, "isoformat") else value for value in positions]}
+        if reverse:
+            data["r"] = 1
+        encoded = b64encode(json.dumps(data, separators=(",", ":")).encode("utf-8")).decode("ascii")
+        return replace_query_param(request.build_absolute_uri(), self.cursor_query_param, encoded)
+
+    def _after(self, positions, reverse: bool) -> Q:
+        """Rows strictly after ``positions`` in the (possibly reversed) ordering."""
+        condition = Q(pk__in=[])
+        equal = Q()
+        for (name, descending), value in zip(self.ordering, positions):
+            lookup = "lt" if descending != reverse else "gt"
+            condition |= equal & Q(**{f"{name}__{lookup}": value})
+            equal &= Q(**{name: value})
+        return condition
+
+    async def paginate(self, queryset, request) -> tuple[list, str | None, str | None]:
+        """Return the rows of the requested page and the next/previous links."""
+        page_size = self.get_page_size(request)
+        positions, reverse = self.decode_cursor(request)
+        ordering = [("-" if descending != reverse else "") + name for name, descending in self.ordering]
+        queryset = queryset.order_by(*ordering)
+        if positions is not None:
+            queryset = queryset.filter(self._after(positions, reverse))
+        rows = [row async for row in queryset[: page_size + 1].aiterator(chunk_size=page_size + 1)]
+        has_more = len(rows) > page_size
+        rows = rows[:page_size]
+        if reverse:
+            rows.reverse()
+        return rows, *self.get_links(request, rows, has_more, positions, reverse)
+
+    def get_links(self, request, rows, has_more: bool, positions, reverse: bool) -> tuple[str | None, str | None]:
+        """The next/previous links of a page of ``rows`` read after ``positions``."""
+        next_link = previous_link = None
+        if rows:
+            # A page reached backwards always has rows after it; one reached
+            # forwards has rows before it unless it is the first page.
+            if has_more or reverse:
+                next_link = self.encode_cursor(request, rows[-1], reverse=False)
+            if has_more if reverse else positions is not None:
+                previous_link = self.encode_cursor(request, rows[0], reverse=True)
+        return next_link, previous_link
@@ -0,0 +1,187 @@
+"""
+Set-based purges of records and everything that cascades from them.
+
+Every foreign key in ``models.py`` is ``on_delete=CASCADE``, and Django
+honours that in Python: before ``delete()`` removes a row, its collector
+loads every dependent row, and their dependents, into memory (the delete
+signals of the app rule out its fast path).  For one SOP that means its
+warehouses, equipment, maintenance logs, samples, tests, reagents and
+version changes with all their results, actions and ledger entries.
+
+:func:`plan` walks the relations of a model once and returns the steps of
+a purge as ``pk`` querysets, children before parents.  Each table's rows
+are selected as the rows whose foreign key is ``IN`` the selection of a
+parent, so the statements run entirely in the database::
+
+    DELETE FROM lims_app_sampletestlink WHERE id IN (
+        SELECT id FROM lims_app_sampletestlink
+        WHERE sample_id IN (SELECT id FROM lims_app_sample WHERE sop_id IN (...))
+           OR test_id IN (SELECT id FROM lims_app_test WHERE sop_id IN (...))
+        LIMIT 4000)
+
+A ``SET_NULL`` relation becomes ``UPDATE ... SET <fk> = NULL`` before its
+parent is deleted.  :func:`purge` repeats each step ``PURGE_BATCH_SIZE``
+rows at a time until it affects fewer rows, one statement per transaction
+so that locks and the log stay small.  Because parents go after their
+children, a purge that stops part-way leaves no row behind whose parent
+is gone, and running it again finishes it.
+
+Signals are not sent, so :func:`purge` does the work of the handlers in
+``signals.py`` itself: it bumps the cache generation of every model it
+touched (which also reloads the due-date calendars, see ``duedates.py``)
+and returns the reagent consumption posted by deleted test usages to
+stock, as deleting them one by one does.  It does that in the transaction
+that unlinks the consumption from the usages, since after that a rerun
+could no longer tell what they consumed.  With sample shards (see
+``sharding.py``) the steps run on every shard, which hold copies of the
+shared tables, before the primary.  The dashboard summaries are keyed by
+warehouse and SOP, so purging SOPs, samples or tests removes exactly the
+summary rows of the records purged.
+"""
+
+from __future__ import annotations
+
+from collections import Counter, defaultdict
+from dataclasses import dataclass
+from functools import reduce
+from operator import or_
+
+from django.conf import settings
+from django.db import models, transaction
+from django.db.models import Q
+from django.db.models.deletion import get_candidate_relations_to_delete
+
+from . import sharding, stock
+from .caching import bump_generation
+from .models import StockMovement, TestReagentLink
+
+
+@dataclass
+class Step:
+    """Delete the rows of ``model`` in ``rows``, or set their ``field`` to NULL."""
+
+    model: type
+    rows: models.QuerySet
+    field: str | None = None
+
+    def describe(self, using=None) -> str:
+        meta = self.model._meta
+        if self.field:
+            action = f"UPDATE {meta.db_table} SET {meta.get_field(self.field).column} = NULL"
+        else:
+            action = f"DELETE FROM {meta.db_table}"
+        return f"{action} WHERE {meta.pk.column} IN ({self.rows.using(using).query})"
+
+
+def plan(queryset) -> list[Step]:
+    """The steps that purge the rows of ``queryset`` and everything cascading from them."""
+    root = queryset.model
+    parents = defaultdict(list)  # child model -> [(parent model, foreign key name)]
+    nulled = defaultdict(list)  # parent model -> [(child model, foreign key name)]
+    found, pending = {root}, [root]
+    while pending:
+        model = pending.pop()
+        for relation in get_candidate_relations_to_delete(model._meta):
+            child, field = relation.related_model, relation.field
+            on_delete = field.remote_field.on_delete
+            if on_delete is models.DO_NOTHING:
+                continue
+            if on_delete is models.SET_NULL:
+                nulled[model].append((child, field.name))
+                continue
+            if on_delete is not models.CASCADE:
+                raise ValueError(f"{child.__name__}.{field.name} ({on_delete.__name__}) cannot be purged set-wise.")
+            parents[child].append((model, field.name))
+            if child not in found:
+                found.add(child)
+                pending.append(child)
+
+    selected = {}
+    for model in _parents_first(root, found, parents):
+        if model is root:
+            selected[model] = queryset.values("pk")
+        else:
+            condition = reduce(or_, (Q(**{f"{name}__in": selected[parent]}) for parent, name in parents[model]))
+            selected[model] = model._base_manager.filter(condition).values("pk")
+    steps = []
+    for model in reversed(list(selected)):
+        for child, name in nulled[model]:
+            rows = child._base_manager.filter(**{f"{name}__in": selected[model]}).values("pk")
+            steps.append(Step(child, rows, name))
+        steps.append(Step(model, selected[model]))
+    return steps
+
+
+def _parents_first(root, found: set, parents: dict) -> list:
+    waiting = {model: {parent for parent, _ in parents[model]} for model in found}
+    order, ready = [], [root]
+    while ready:
+        model = ready.pop()
+        order.append(model)
+        for child in sorted(found, key=lambda other: other._meta.label):
+            if model in waiting[child]:
+                waiting[child].discard(model)
+                if not waiting[child]:
+                    ready.append(child)
+    if len(order) != len(found):
+        raise ValueError(f"The relations below {root.__name__} form a cycle.")
+    return order
+
+
+def batch_size() -> int:
+    return max(1, getattr(settings, "PURGE_BATCH_SIZE", 4000))
+
+
+def databases() -> list[str]:
+    """The shards, then the primary."""
+    return [*sharding.shards(), sharding.PRIMARY]
+
+
+def run_step(step: Step, using: str, size: int) -> int:
+    """Apply ``step`` on database ``using``, ``size`` rows per statement; return the rows affected."""
+    manager = step.model._base_manager.db_manager(using)
+    total = 0
+    while True:
+        batch = manager.filter(pk__in=step.rows[:size])
+        if step.field:
+            count = batch.update(**{step.field: None})
+        else:
+            # The collector's own fast path: one DELETE, no instances, no signals.
+            count = batch._raw_delete(using)
+        total += count
+        if count < size:
+            return total
+
+
+def unlink_consumption(step: Step, links, using: str, size: int) -> int:
+    """Run ``step``, which unlinks the movements of the test usages ``links``, and return their consumption to stock."""
+    with transaction.atomic(using=using), transaction.atomic(using=sharding.PRIMARY):
+        posted = stock.posted_for_links(links, using=using)
+        count = run_step(step, using, size)
+        for (test_id, reagent_id), total in posted.items():
+            stock.release_test_reagent_link(test_id, {reagent_id: total})
+    return count
+
+
+def purge(queryset, size: int | None = None) -> dict:
+    """Purge the rows of ``queryset`` with their dependents on every database.
+
+    Returns ``{"deleted": {label: rows}, "updated": {label: rows}}``.
+    """
+    steps = plan(queryset)
+    size = size or batch_size()
+    links = next((step.rows for step in steps if step.model is TestReagentLink and not step.field), None)
+    deleted, updated = Counter(), Counter()
+    for using in databases():
+        for step in steps:
+            if step.model is StockMovement and step.field == "test_reagent_link":
+                count = unlink_consumption(step, links, using, size)
+            else:
+                count = run_step(step, using, size)
+            # The shards' copies of the shared tables were counted on the primary.
+            if using == sharding.PRIMARY or step.model in sharding.SHARDED_MODELS:
+                (updated if step.field else deleted)[step.model._meta.label_lower] += count
+    for model in {step.model for step in steps}:
+        bump_generation(model)
+    # Unary plus drops the tables no row was affected in.
+    return {"deleted": dict(+deleted), "updated": dict(+updated)}
@@ -0,0 +1,114 @@
+"""
+Queryset helpers shared by the API views.
+
+Nested serializers are the main source of N+1 queries in the API: every
+nested ``ModelSerializer`` walks a relation on each row, and unless the
+relation was joined up front Django issues one query per row per level.
+Rather than hand-maintaining ``select_related`` lists on every viewset
+(which drift out of date as serializers change), the helpers here walk a
+serializer's field tree and derive the joins and prefetches it needs.
+When a request narrows the representation (see ``fieldsets.py``) the same
+walk also yields the columns to load with ``.only()``.  Nested SOPs,
+locations and warehouses served from the reference-data cache (see
+``refdata.py``) are not joined at all.
+"""
+
+from __future__ import annotations
+
+from functools import lru_cache
+
+from django.core.exceptions import FieldDoesNotExist
+from rest_framework import serializers
+
+from .refdata import ReferenceDataSerializer
+
+
+class QueryPlan:
+    """Joins, prefetches and columns needed to render a serializer."""
+
+    def __init__(self) -> None:
+        self.select: list[str] = []
+        self.prefetch: list[str] = []
+        self.columns: list[str] = []
+        # Cleared when a field is found whose column cannot be determined
+        # (``source="*"``, dotted sources, method fields on to-many paths).
+        self.can_defer = True
+
+    def apply(self, queryset, defer: bool = False):
+        if self.select:
+            queryset = queryset.select_related(*self.select)
+        if self.prefetch:
+            queryset = queryset.prefetch_related(*self.prefetch)
+        if defer and self.can_defer and self.columns:
+            queryset = queryset.only(*self.columns)
+        return queryset
+
+
+def _walk(serializer, prefix: str, plan: QueryPlan, to_many: bool = False) -> None:
+    model = serializer.Meta.model
+    for name, field in serializer.fields.items():
+        many = isinstance(field, serializers.ListSerializer)
+        child = field.child if many else field
+        source = field.source or name
+        if source == "*" or "." in source:
+            plan.can_defer = False
+            continue
+        try:
+            model_field = model._meta.get_field(source)
+        except FieldDoesNotExist:
+            plan.can_defer = False
+            continue
+        path = f"{prefix}{source}"
+        if isinstance(child, ReferenceDataSerializer) and child.resolved_from_cache():
+            # Rendered from the reference table; only the key column is read.
+            if not to_many:
+                plan.columns.append(path)
+            continue
+        if not isinstance(child, serializers.ModelSerializer):
+            if model_field.concrete and not to_many:
+                plan.columns.append(path)
+            elif not model_field.concrete:
+                plan.can_defer = False
+            continue
+        if many or to_many or model_field.one_to_many or model_field.many_to_many:
+            # Relations below a prefetch are resolved by the prefetch query
+            # itself, so they are followed as prefetch lookups too.  Their
+            # columns cannot be restricted from the outer queryset.
+            plan.prefetch.append(path)
+            _walk(child, f"{path}__", plan, to_many=True)
+        else:
+            plan.select.append(path)
+            if model_field.concrete:
+                plan.columns.append(path)
+            _walk(child, f"{path}__", plan)
+
+
+def plan_queryset(serializer) -> QueryPlan:
+    """Build the :class:`QueryPlan` for a (possibly narrowed) serializer instance."""
+    plan = QueryPlan()
+    _walk(serializer, "", plan)
+    return plan
+
+
+@lru_cache(maxsize=None)
+def related_paths(serializer_class) -> tuple[tuple[str, ...], tuple[str, ...]]:
+    """Return the ``select_related`` and ``prefetch_related`` lookups for a serializer.
+
+    Forward foreign keys and one-to-one relations rendered by nested
+    serializers become ``select_related`` paths (followed recursively, so
+    ``SampleTestLinkSerializer`` yields ``sample__location``,
+    ``test__user_account`` and so on); to-many relations become
+    ``prefetch_related`` lookups.  The result is cached per class.
+    """
+    plan = plan_queryset(serializer_class())
+    return tuple(plan.select), tuple(plan.prefetch)
+
+
+def optimize_queryset(queryset, serializer_class):
+    """Apply the joins and prefetches ``serializer_class`` needs to ``queryset``."""
+    select, prefetch = related_paths(serializer_class)
+    if select:
+        queryset = queryset.select_related(*select)
+    if prefetch:
+        queryset = queryset.prefetch_related(*prefetch)
+    return queryset
@@ -0,0 +1,128 @@
+"""
+Process-level cache of small reference-data tables.
+
+Nearly every model points at an ``SOP`` and many also at a ``Location`` or
+``Warehouse``.  Rendering a page of samples or equipment therefore joins
+those tables and serializes the same few dozen SOP rows over and over.
+Serializers deriving from :class:`ReferenceDataSerializer` avoid that when
+they are nested: the parent row contributes only its foreign key, and the
+nested representation is taken from an in-process table holding the
+already-serialized dict of every row of the referenced model.
+
+Each table is stamped with the model's cache generation (see
+``caching.py``), which the signal handlers bump on every save or delete.
+A serializer tree checks the generation once per model when it first needs
+the table and reloads it if another request or worker process changed the
+model in the meantime.  Narrowed representations (``?fields=sop.sop_name``)
+bypass the cache and are rendered from a join as before.
+"""
+
+from __future__ import annotations
+
+import threading
+
+from django.core.exceptions import FieldDoesNotExist
+from rest_framework import serializers
+
+from . import routers
+from .caching import get_generation
+from .fieldsets import DynamicFieldsModelSerializer, serializer_path
+
+
+class ReferenceTables:
+    """Serialized rows of reference models, keyed by primary key."""
+
+    def __init__(self) -> None:
+        self._tables: dict = {}
+        self._lock = threading.Lock()
+
+    def table(self, serializer_class) -> dict:
+        """Return ``{pk: representation}`` for ``serializer_class``'s model."""
+        model = serializer_class.Meta.model
+        version, _ = get_generation(model)
+        entry = self._tables.get(serializer_class)
+        if entry is not None and entry[0] == version:
+            return entry[1]
+        with self._lock:
+            entry = self._tables.get(serializer_class)
+            if entry is not None and entry[0] == version:
+                return entry[1]
+            # Kept until the next write; a lagging replica could be behind it.
+            with routers.use_primary():
+                objects = list(model._base_manager.order_by("pk"))
+            rows = serializer_class(objects, many=True).data
+            table = {obj.pk: row for obj, row in zip(objects, rows)}
+            self._tables[serializer_class] = (version, table)
+            return table
+
+    def clear(self) -> None:
+        with self._lock:
+            self._tables.clear()
+
+
+reference_tables = ReferenceTables()
+
+
+class ReferenceDataSerializer(DynamicFieldsModelSerializer):
+    """Model serializer whose nested uses are served from :data:`reference_tables`."""
+
+    def resolved_from_cache(self) -> bool:
+        """Whether this (nested) instance renders from the reference table."""
+        if self.parent is None or self.source in ("*", None) or "." in self.source:
+            return False
+        parent = self.parent
+        if isinstance(parent, serializers.ListSerializer):
+            return False
+        try:
+            model_field = parent.Meta.model._meta.get_field(self.source)
+        except FieldDoesNotExist:
+            return False
+        if not (model_field.many_to_one or model_field.one_to_one) or not model_field.concrete:
+            return False
+        spec = self.context.get("field_spec")
+        return spec is None or spec.selected(serializer_path(self)) is None
+
+    def _cache_enabled(self) -> bool:
+        if "_resolved_from_cache" not in self.__dict__:
+            self._resolved_from_cache = self.resolved_from_cache()
+        return self._resolved_from_cache
+
+    def get_attribute(self, instance):
+        if not self._cache_enabled():
+            return super().get_attribute(instance)
+        # Read the foreign key column so that the related row is never loaded.
+        return getattr(instance, self.parent.Meta.model._meta.get_field(self.source).attname)
+
+    def to_representation(self, instance):
+        if not self._cache_enabled():
+            return super().to_representation(instance)
+        tables = self.root.__dict__.setdefault("_reference_tables", {})
+        table = tables.get(type(self))
+        if table is None:
+            table = tables[type(self)] = reference_tables.table(type(self))
+        row = table.get(instance)
+        if row is None:
+            # Created after the table was loaded and not yet signalled here.
+            row = super().to_representation(self.Meta.model._base_manager.get(pk=instance))
+        return dict(row)
+
+
+def preload_reference_tables(serializer) -> None:
+    """Load every reference table ``serializer`` will read while rendering.
+
+    The async views call this through ``sync_to_async`` so that rendering
+    the rows afterwards does not touch the database.
+    """
+    tables = serializer.root.__dict__.setdefault("_reference_tables", {})
+    pending = [serializer]
+    while pending:
+        node = pending.pop()
+        if isinstance(node, serializers.ListSerializer):
+            node = node.child
+        if isinstance(node, ReferenceDataSerializer) and node._cache_enabled():
+            if type(node) not in tables:
+                tables[type(node)] = reference_tables.table(type(node))
+        elif isinstance(node, serializers.Serializer):
+            pending.extend(
+                field for field in node.fields.values() if isinstance(field, serializers.BaseSerializer)
+            )
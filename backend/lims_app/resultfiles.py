@@ -0,0 +1,161 @@
+"""
+Parsing and specification checks of instrument result rows.
+
+The CPU-bound half of a result file import (see ``ingest.py``): turning
+CSV cells into typed values and checking each result against the
+acceptance limits of its test.  Nothing here touches the database or
+Django's settings, so :func:`check_chunk` runs in the worker processes of
+a ``ProcessPoolExecutor`` whatever their start method; the limits and
+the time zone of a file are handed to each worker once, by
+:func:`init_worker`.
+
+A file is CSV with a header row naming at least :data:`REQUIRED_COLUMNS`
+(in any order, other columns are ignored)::
+
+    sample,test,test_result,deadline,testing_analyst,reviewing_analyst,pass_or_fail
+    1042,7,4.215,2025-03-01T12:00:00Z,A. Smith,B. Jones,
+
+``pass_or_fail`` may be left out or blank, in which case it is set from
+the test's limits; a given value that contradicts the limits rejects the
+row, as does a blank one for a test without limits.
+"""
+
+from __future__ import annotations
+
+from datetime import datetime
+from decimal import Decimal, InvalidOperation
+from zoneinfo import ZoneInfo
+
+from django.utils.dateparse import parse_datetime
+
+
+REQUIRED_COLUMNS = ("sample", "test", "test_result", "deadline", "testing_analyst", "reviewing_analyst")
+OPTIONAL_COLUMNS = ("pass_or_fail",)
+# ``SampleTestLink.test_result`` is ``DecimalField(max_digits=16, decimal_places=6)``
+# and the analyst columns are ``CharField(max_length=64)``.
+MAX_DIGITS = 16
+DECIMAL_PLACES = 6
+MAX_NAME_LENGTH = 64
+TRUE_VALUES = {"1", "t", "true", "yes", "y", "pass", "p"}
+FALSE_VALUES = {"0", "f", "false", "no", "n", "fail"}
+
+# Per-worker state set by ``init_worker``.
+_limits: dict = {}
+_zone = None
+
+
+def column_positions(header: list[str]) -> dict[str, int]:
+    """``{column: index}`` of the known columns; raise ``ValueError`` if a required one is missing."""
+    names = [name.strip().lower() for name in header]
+    missing = [name for name in REQUIRED_COLUMNS if name not in names]
+    if missing:
+        raise ValueError(f"Missing column(s): {', '.join(missing)}.")
+    return {name: names.index(name) for name in (*REQUIRED_COLUMNS, *OPTIONAL_COLUMNS) if name in names}
+
+
+def init_worker(limits: dict, time_zone: str | None) -> None:
+    """Install ``{test_id: (lower, upper)}`` and the default time zone of the file being read."""
+    global _limits, _zone
+    _limits = limits
+    _zone = ZoneInfo(time_zone) if time_zone else None
+
+
+def _integer(value: str):
+    try:
+        return int(value)
+    except ValueError:
+        return None
+
+
+def _decimal(value: str) -> tuple[Decimal | None, str | None]:
+    try:
+        number = Decimal(value)
+    except InvalidOperation:
+        return None, "A valid number is required."
+    if not number.is_finite():
+        return None, "A valid number is required."
+    sign, digits, exponent = number.as_tuple()
+    decimals = max(0, -exponent)
+    whole = max(0, len(digits) + exponent)
+    if decimals > DECIMAL_PLACES:
+        return None, f"Ensure that there are no more than {DECIMAL_PLACES} decimal places."
+    if whole > MAX_DIGITS - DECIMAL_PLACES:
+        return None, f"Ensure that there are no more than {MAX_DIGITS - DECIMAL_PLACES} digits before the decimal point."
+    return number, None
+
+
+def _datetime(value: str) -> datetime | None:
+    try:
+        parsed = parse_datetime(value)
+    except ValueError:
+        return None
+    if parsed is not None and parsed.tzinfo is None and _zone is not None:
+        parsed = parsed.replace(tzinfo=_zone)
+    return parsed
+
+
+def check_row(cells: list[str], columns: dict[str, int]) -> tuple[tuple | None, dict]:
+    """``(values, {})`` for a good row, ``(None, errors)`` for a rejected one.
+
+    ``values`` is ``(sample_id, test_id, testing_analyst, reviewing_analyst,
+    test_result, deadline, pass_or_fail)``.
+    """
+    def cell(name: str) -> str:
+        index = columns.get(name)
+        return cells[index].strip() if index is not None and index < len(cells) else ""
+
+    errors = {}
+    sample_id, test_id = _integer(cell("sample")), _integer(cell("test"))
+    if sample_id is None:
+        errors["sample"] = ["A valid sample ID is required."]
+    if test_id is None:
+        errors["test"] = ["A valid test ID is required."]
+    elif test_id not in _limits:
+        errors["test"] = [f"Invalid pk \"{test_id}\" - object does not exist."]
+    analysts = {}
+    for name in ("testing_analyst", "reviewing_analyst"):
+        analysts[name] = cell(name)
+        if not analysts[name]:
+            errors[name] = ["This field may not be blank."]
+        elif len(analysts[name]) > MAX_NAME_LENGTH:
+            errors[name] = [f"Ensure this field has no more than {MAX_NAME_LENGTH} characters."]
+    result, problem = _decimal(cell("test_result"))
+    if problem:
+        errors["test_result"] = [problem]
+    deadline = _datetime(cell("deadline"))
+    if deadline is None:
+        errors["deadline"] = ["A valid date and time is required."]
+    raw_flag = cell("pass_or_fail").lower()
+    flag = True if raw_flag in TRUE_VALUES else False if raw_flag in FALSE_VALUES else None
+    if raw_flag and flag is None:
+        errors["pass_or_fail"] = [f"'{raw_flag}' is not a valid boolean."]
+    if errors:
+        return None, errors
+
+    lower, upper = _limits[test_id]
+    if lower is None and upper is None:
+        if flag is None:
+            return None, {"pass_or_fail": ["The test has no acceptance limits; give pass_or_fail."]}
+    else:
+        within = (lower is None or result >= lower) and (upper is None or result <= upper)
+        if flag is not None and flag != within:
+            verdict = "within" if within else "outside"
+            return None, {"pass_or_fail": [f"The result is {verdict} the limits of test {test_id}."]}
+        flag = within
+    return (sample_id, test_id, analysts["testing_analyst"], analysts["reviewing_analyst"], result, deadline, flag), {}
+
+
+def check_chunk(rows: list[tuple[int, list[str]]], columns: dict[str, int]) -> tuple[list, list]:
+    """Check ``(line number, cells)`` rows; return ``(accepted, rejected)``.
+
+    ``accepted`` holds ``(line, values)`` as returned by :func:`check_row`,
+    ``rejected`` holds ``(line, errors)``.
+    """
+    accepted, rejected = [], []
+    for line, cells in rows:
+        values, errors = check_row(cells, columns)
+        if values is None:
+            rejected.append((line, errors))
+        else:
+            accepted.append((line, values))
+    return accepted, rejected
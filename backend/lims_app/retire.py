@@ -0,0 +1,106 @@
+"""
+Retiring (soft-deleting) and purging SOPs, samples and tests.
+
+Deleting one of these records the Django way cascades through Python to
+every row below it (see ``purge.py``), so the viewsets that mix in
+:class:`RetireMixin` retire the record instead::
+
+    DELETE /api/sops/3/                # retire: sets retired_at, one UPDATE
+    POST   /api/sops/3/restore/        # undo it
+    DELETE /api/sops/3/?purge=true     # delete it and everything below it
+
+Retiring writes one row whatever hangs off the record.  The default
+managers of the retirable models skip retired rows (see ``models.py``), so
+a retired record drops out of its list, detail, export and timeline
+endpoints and can no longer be referenced by new or changed rows, while
+the rows already pointing at it keep it: a sample of a retired SOP still
+renders the SOP, with its ``retired_at``.  Those queries are served by
+partial indexes on the active rows.  Restoring an SOP fails with 409 when
+an active SOP has taken its name in the meantime.
+
+``?purge=true`` first retires the record, so that it is hidden while the
+purge runs, then deletes it and its dependents with the set-based
+statements of ``purge.py`` and answers with the rows deleted per table.
+If the purge fails part-way it answers 409 and the same request finishes
+it.  ``python manage.py purge_retired`` purges records retired before a
+cut-off in the same way.  Retiring, restoring and purging are audited.
+"""
+
+from __future__ import annotations
+
+from django.db import DatabaseError, IntegrityError, router, transaction
+from django.utils import timezone
+from rest_framework import exceptions, status
+from rest_framework.decorators import action
+from rest_framework.generics import get_object_or_404
+from rest_framework.response import Response
+
+from . import audit, purge
+from .models import AuditEntry
+
+
+TRUE_VALUES = {"1", "true", "yes"}
+
+
+def set_retired(instance, retired: bool) -> dict:
+    """Retire or restore ``instance``; return the audit diff of the change."""
+    before = audit.snapshot(instance)
+    instance.retired_at = timezone.now() if retired else None
+    with transaction.atomic(using=router.db_for_write(type(instance), instance=instance)):
+        instance.save(update_fields=["retired_at"])
+    return audit.diff(before, audit.snapshot(instance))
+
+
+class RetireMixin:
+    """Turns ``DELETE`` into retiring, with ``?purge=true`` and ``<pk>/restore/``."""
+
+    def get_any_object(self):
+        """The object of the request, retired or not."""
+        model = self.get_queryset().model
+        lookup = self.lookup_url_kwarg or self.lookup_field
+        instance = get_object_or_404(model._base_manager.all(), **{self.lookup_field: self.kwargs[lookup]})
+        self.check_object_permissions(self.request, instance)
+        return instance
+
+    def destroy(self, request, *args, **kwargs):
+        if request.query_params.get("purge", "").lower() in TRUE_VALUES:
+            return self.purge(request)
+        return super().destroy(request, *args, **kwargs)
+
+    def perform_destroy(self, instance):
+        comment = audit.require_comment(self.request)
+        changes = set_retired(instance, True)
+        audit.record(self.request, comment, type(instance), [(instance.pk, AuditEntry.UPDATE, changes)])
+
+    def purge(self, request):
+        comment = audit.require_comment(request)
+        instance = self.get_any_object()
+        model, pk, before = type(instance), instance.pk, audit.snapshot(instance)
+        if instance.retired_at is None:
+            set_retired(instance, True)
+        try:
+            counts = purge.purge(model._base_manager.filter(pk=pk))
+        except DatabaseError as exc:
+            return Response(
+                {"detail": f"Purge failed: {exc}; the record is retired, repeat the request to finish."},
+                status=status.HTTP_409_CONFLICT,
+            )
+        audit.record(request, comment, model, [(pk, AuditEntry.DELETE, audit.diff(before, {}))])
+        return Response(counts, status=status.HTTP_200_OK)
+
+    @action(detail=True, methods=["post"], url_path="restore")
+    def restore(self, request, *args, **kwargs):
+        comment = audit.require_comment(request)
+        instance = self.get_any_object()
+        if instance.retired_at is None:
+            raise exceptions.ValidationError({"retired_at": ["This record is not retired."]})
+        try:
+            changes = set_retired(instance, False)
+        except IntegrityError:
+            instance.refresh_from_db(fields=["retired_at"])
+            return Response(
+                {"detail": "An active record conflicts with this one; change or retire it first."},
+                status=status.HTTP_409_CONFLICT,
+            )
+        audit.record(request, comment, type(instance), [(instance.pk, AuditEntry.UPDATE, changes)])
+        return Response(self.get_serializer(instance).data)
@@ -0,0 +1,288 @@
+"""
+Read-replica routing.
+
+When ``DATABASE_REPLICAS`` names one or more database aliases,
+:class:`ReplicaRouter` spreads the read traffic of the API over them and
+keeps the primary (``default``) for everything that must see the latest
+data:
+
+* requests with a safe method (``GET``, ``HEAD``, ``OPTIONS``), the
+  dashboard aggregates included, read from one healthy replica chosen per
+  request;
+* writes, ``select_for_update()`` and ``get_or_create()`` (Django routes
+  both as writes), reads inside a transaction on the primary and every
+  query of an unsafe request go to the primary;
+* sessions, users, permissions and content types are always read from
+  the primary, so a login is never lost to replication lag;
+* after a client writes, its reads stay on the primary for
+  ``REPLICA_STICKY_SECONDS`` so that it reads its own writes.  Clients
+  are identified by a hash of their ``Authorization`` header or session
+  cookie, and the pin is kept in the API cache (see ``caching.py``) so
+  that it holds whichever worker process serves the next request;
+* queries outside a request (management commands, the audit writer) and
+  the loads of the response cache and the reference-data tables, which
+  would otherwise keep a stale copy long after the replica caught up, use
+  the primary.
+
+:class:`ReplicaMonitor` checks every replica at most once per
+``REPLICA_CHECK_INTERVAL`` seconds and process.  It reads the single
+:class:`~lims_app.models.ReplicaHeartbeat` row from the primary and from
+each replica, then rewrites it on the primary for the next check.  A
+replica that holds the primary's beat has caught up, however long ago the
+beat was written (the API may have been idle since); otherwise its lag is
+the age of the beat it holds, which includes up to one check interval of
+heartbeat granularity.  A replica that cannot be reached, or lags by more
+than ``REPLICA_MAX_LAG_SECONDS``, is skipped until a later check finds it
+healthy again.  With no healthy replica,
+everything reads from the primary.  One request per process runs the
+check; concurrent requests use the previous result.
+"""
+
+from __future__ import annotations
+
+import hashlib
+import itertools
+import logging
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from dataclasses import dataclass
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, DatabaseError, connections
+from django.utils import timezone
+
+from . import caching
+from .models import ReplicaHeartbeat
+
+
+logger = logging.getLogger(__name__)
+
+PRIMARY = DEFAULT_DB_ALIAS
+# Read from the primary whatever the request.
+PRIMARY_APPS = frozenset({"admin", "auth", "contenttypes", "sessions"})
+PIN_PREFIX = "lisms:pin:"
+SAFE_METHODS = ("GET", "HEAD", "OPTIONS")
+
+
+@dataclass
+class Route:
+    """Where the reads of one request go."""
+
+    primary: bool
+    alias: str | None = None
+
+
+_current_route: ContextVar = ContextVar("lims_read_route", default=None)
+
+
+def replicas() -> list[str]:
+    return list(getattr(settings, "DATABASE_REPLICAS", ()))
+
+
+@contextmanager
+def routed(route: Route | None):
+    token = _current_route.set(route)
+    try:
+        yield route
+    finally:
+        try:
+            _current_route.reset(token)
+        except ValueError:
+            # A streaming body may be consumed in another context.
+            _current_route.set(None)
+
+
+def use_primary():
+    """Context manager sending the reads inside it to the primary."""
+    return routed(None)
+
+
+# -- read-your-writes ------------------------------------------------------
+
+def _pin_key(request) -> str | None:
+    credential = request.headers.get("Authorization") or request.COOKIES.get(settings.SESSION_COOKIE_NAME)
+    if not credential:
+        return None
+    return PIN_PREFIX + hashlib.sha256(credential.encode()).hexdigest()
+
+
+def pin(request) -> None:
+    """Keep the reads of ``request``'s client on the primary for ``REPLICA_STICKY_SECONDS``."""
+    key = _pin_key(request)
+    seconds = getattr(settings, "REPLICA_STICKY_SECONDS", 5)
+    if key is not None and seconds > 0:
+        caching.get_cache().set(key, True, timeout=seconds)
+
+
+def is_pinned(request) -> bool:
+    key = _pin_key(request)
+    return key is not None and caching.get_cache().get(key) is not None
+
+
+# -- health and lag --------------------------------------------------------
+
+@dataclass
+class ReplicaStatus:
+    healthy: bool
+    lag: float | None
+    error: str = ""
+
+
+class ReplicaMonitor:
+    """Last known health and lag of each replica."""
+
+    def __init__(self) -> None:
+        self._status: dict[str, ReplicaStatus] = {}
+        self._checked_at: float | None = None
+        self._lock = threading.Lock()
+        self._turn = itertools.count()
+
+    def choose(self) -> str:
+        """A healthy replica, taken in turn, or the primary if there is none."""
+        healthy = self.healthy()
+        if not healthy:
+            return PRIMARY
+        return healthy[next(self._turn) % len(healthy)]
+
+    def healthy(self) -> list[str]:
+        interval = getattr(settings, "REPLICA_CHECK_INTERVAL", 5)
+        stale = self._checked_at is None or time.monotonic() - self._checked_at >= interval
+        if stale and self._lock.acquire(blocking=False):
+            try:
+                self.check()
+            finally:
+                self._lock.release()
+        return [alias for alias in replicas() if getattr(self._status.get(alias), "healthy", False)]
+
+    def check(self) -> dict[str, ReplicaStatus]:
+        """Probe every replica now against the last heartbeat, then write the next one."""
+        now = timezone.now()
+        max_lag = getattr(settings, "REPLICA_MAX_LAG_SECONDS", 30)
+        written = None
+        if max_lag:
+            try:
+                written = self._beat(PRIMARY)
+            except DatabaseError:
+                logger.exception("Could not read the replica heartbeat.")
+        for alias in replicas():
+            status = self._probe(alias, now, written, max_lag)
+            previous = self._status.get(alias)
+            if not status.healthy and (previous is None or previous.healthy):
+                logger.warning("Reading from the primary instead of replica %s: %s", alias, status.error)
+            elif status.healthy and previous is not None and not previous.healthy:
+                logger.info("Replica %s is healthy again (lag %s s).", alias, status.lag)
+            self._status[alias] = status
+        if max_lag:
+            try:
+                ReplicaHeartbeat.objects.using(PRIMARY).update_or_create(pk=1, defaults={"beat_at": now})
+            except DatabaseError:
+                logger.exception("Could not write the replica heartbeat.")
+        self._checked_at = time.monotonic()
+        return dict(self._status)
+
+    def _beat(self, alias: str):
+        return ReplicaHeartbeat.objects.using(alias).filter(pk=1).values_list("beat_at", flat=True).first()
+
+    def _probe(self, alias: str, now, written, max_lag: float) -> ReplicaStatus:
+        try:
+            beat = self._beat(alias)
+        except DatabaseError as exc:
+            # Reconnect on the next check rather than reuse a broken connection.
+            connections[alias].close()
+            return ReplicaStatus(False, None, f"unreachable ({exc})")
+        if not max_lag:
+            return ReplicaStatus(True, None)
+        if beat is None:
+            return ReplicaStatus(False, None, "no heartbeat replicated yet")
+        if written is not None and beat >= written:
+            return ReplicaStatus(True, 0.0)
+        lag = max(0.0, (now - beat).total_seconds())
+        if lag > max_lag:
+            return ReplicaStatus(False, lag, f"{lag:.1f} s behind (limit {max_lag} s)")
+        return ReplicaStatus(True, lag)
+
+
+monitor = ReplicaMonitor()
+
+
+class ReplicaRouter:
+    """Sends safe-method reads to a replica and everything else to the primary."""
+
+    def db_for_read(self, model, **hints):
+        if model._meta.app_label in PRIMARY_APPS:
+            return PRIMARY
+        route = _current_route.get()
+        if route is None or route.primary or connections[PRIMARY].in_atomic_block:
+            return PRIMARY
+        if route.alias is None:
+            route.alias = monitor.choose()
+        return route.alias
+
+    def db_for_write(self, model, **hints):
+        return PRIMARY
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Replicas hold the same rows as the primary.
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        # Replicas receive the schema through replication.
+        return db not in replicas()
+
+
+class ReplicaRoutingMiddleware:
+    """Routes the reads of each request (see module docstring); pins writing clients."""
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response) -> None:
+        self.get_response = get_response
+        self.enabled = bool(replicas())
+        self.is_async = iscoroutinefunction(get_response)
+        if self.is_async:
+            markcoroutinefunction(self)
+
+    def _route(self, request) -> Route:
+        return Route(primary=request.method not in SAFE_METHODS or is_pinned(request))
+
+    def __call__(self, request):
+        if self.is_async:
+            return self.__acall__(request)
+        if not self.enabled:
+            return self.get_response(request)
+        route = self._route(request)
+        with routed(route):
+            response = self.get_response(request)
+        return self._complete(request, response, route)
+
+    async def __acall__(self, request):
+        if not self.enabled:
+            return await self.get_response(request)
+        route = self._route(request)
+        with routed(route):
+            response = await self.get_response(request)
+        return self._complete(request, response, route)
+
+    def _complete(self, request, response, route):
+        if request.method not in SAFE_METHODS:
+            pin(request)
+        if response.streaming:
+            content = response.streaming_content
+            if response.is_async:
+                response.streaming_content = self._astream(content, route)
+            else:
+                response.streaming_content = self._stream(content, route)
+        return response
+
+    def _stream(self, content, route):
+        with routed(route):
+            yield from content
+
+    async def _astream(self, content, route):
+        with routed(route):
+            async for chunk in content:
+                yield chunk
@@ -3,16 +3,25 @@ Serializers translate Django model instances into JSON and back again.
 
 The LISMS API uses Django REST Framework (DRF) for serialization.  Each
 model has an associated ``ModelSerializer`` that exposes all fields by
-default.  Additional serializers aggregate information for dashboard
-visualisations.
+default.  The model serializers derive from ``DynamicFieldsModelSerializer``
+so that read requests can narrow them with ``?fields=``/``?expand=``/
+``?depth=`` (see ``fieldsets.py``).  Nested SOPs, locations and warehouses
+are rendered from the in-process reference-data cache (see
+``refdata.py``).  Additional serializers aggregate
+information for dashboard visualisations.
 """
 
 from __future__ import annotations
 
 from rest_framework import serializers
+from rest_framework.validators import UniqueValidator
 
+from . import stock
+from .fieldsets import DynamicFieldsModelSerializer
+from .refdata import ReferenceDataSerializer
 from .models import (
     Administrator,
+    AuditEntry,
     Analyst,
     Client,
     Equipment,
@@ -25,6 +34,7 @@ from .models import (
     SampleTestLink,
     SOP,
     Stability,
+    StockMovement,
     Test,
     TestEquipmentLink,
     TestReagentLink,
@@ -38,13 +48,13 @@ from .models import (
 )
 
 
-class UserAccountSerializer(serializers.ModelSerializer):
+class UserAccountSerializer(DynamicFieldsModelSerializer):
     class Meta:
         model = UserAccount
         fields = "__all__"
 
 
-class AnalystSerializer(serializers.ModelSerializer):
+class AnalystSerializer(DynamicFieldsModelSerializer):
     user_account = UserAccountSerializer(read_only=True)
 
     class Meta:
@@ -52,7 +62,7 @@ class AnalystSerializer(serializers.ModelSerializer):
         fields = "__all__"
 
 
-class AdministratorSerializer(serializers.ModelSerializer):
+class AdministratorSerializer(DynamicFieldsModelSerializer):
     user_account = UserAccountSerializer(read_only=True)
 
     class Meta:
@@ -60,31 +70,34 @@ class AdministratorSerializer(serializers.ModelSerializer):
         fields = "__all__"
 
 
-class SOPSerializer(serializers.ModelSerializer):
+class SOPSerializer(ReferenceDataSerializer):
     class Meta:
         model = SOP
         fields = "__all__"
+        # Names are unique among active SOPs only (a partial constraint,
+        # which DRF cannot turn into a validator), so check against those.
+        extra_kwargs = {"sop_name": {"validators": [UniqueValidator(queryset=SOP.objects.all())]}}
 
 
-class UserSOPActionSerializer(serializers.ModelSerializer):
+class UserSOPActionSerializer(DynamicFieldsModelSerializer):
     class Meta:
         model = UserSOPAction
         fields = "__all__"
 
 
-class ClientSerializer(serializers.ModelSerializer):
+class ClientSerializer(DynamicFieldsModelSerializer):
     class Meta:
         model = Client
         fields = "__all__"
 
 
-class WarehouseSerializer(serializers.ModelSerializer):
+class WarehouseSerializer(ReferenceDataSerializer):
     class Meta:
         model = Warehouse
         fields = "__all__"
 
 
-class WarehouseClientLinkSerializer(serializers.ModelSerializer):
+class WarehouseClientLinkSerializer(DynamicFieldsModelSerializer):
     warehouse = WarehouseSerializer(read_only=True)
     client = ClientSerializer(read_only=True)
 
@@ -93,13 +106,13 @@ class WarehouseClientLinkSerializer(serializers.ModelSerializer):
         fields = "__all__"
 
 
-class LocationSerializer(serializers.ModelSerializer):
+class LocationSerializer(ReferenceDataSerializer):
     class Meta:
         model = Location
         fields = "__all__"
 
 
-class EquipmentSerializer(serializers.ModelSerializer):
+class EquipmentSerializer(DynamicFieldsModelSerializer):
     location = LocationSerializer(read_only=True)
     sop = SOPSerializer(read_only=True)
 
@@ -108,7 +121,7 @@ class EquipmentSerializer(serializers.ModelSerializer):
         fields = "__all__"
 
 
-class MaintenanceLogSerializer(serializers.ModelSerializer):
+class MaintenanceLogSerializer(DynamicFieldsModelSerializer):
     equipment = EquipmentSerializer(read_only=True)
     sop = SOPSerializer(read_only=True)
 
@@ -117,7 +130,7 @@ class MaintenanceLogSerializer(serializers.ModelSerializer):
         fields = "__all__"
 
 
-class SampleSerializer(serializers.ModelSerializer):
+class SampleSerializer(DynamicFieldsModelSerializer):
     location = LocationSerializer(read_only=True)
     warehouse = WarehouseSerializer(read_only=True)
     sop = SOPSerializer(read_only=True)
@@ -125,9 +138,21 @@ class SampleSerializer(serializers.ModelSerializer):
     class Meta:
         model = Sample
         fields = "__all__"
+        # The opening stock; later changes are posted to ``stock-movements/``
+        # (see ``stock.py``).  Also honoured by ``samples/bulk/``.
+        create_only_fields = ("quantity",)
 
+    def get_fields(self):
+        fields = super().get_fields()
+        if self.instance is not None:
+            for name in self.Meta.create_only_fields:
+                if name in fields:
+                    fields[name].read_only = True
+                    fields[name].required = False
+        return fields
 
-class InProcessSerializer(serializers.ModelSerializer):
+
+class InProcessSerializer(DynamicFieldsModelSerializer):
     sample = SampleSerializer(read_only=True)
 
     class Meta:
@@ -135,7 +160,7 @@ class InProcessSerializer(serializers.ModelSerializer):
         fields = "__all__"
 
 
-class StabilitySerializer(serializers.ModelSerializer):
+class StabilitySerializer(DynamicFieldsModelSerializer):
     sample = SampleSerializer(read_only=True)
 
     class Meta:
@@ -143,7 +168,7 @@ class StabilitySerializer(serializers.ModelSerializer):
         fields = "__all__"
 
 
-class FinishedProductSerializer(serializers.ModelSerializer):
+class FinishedProductSerializer(DynamicFieldsModelSerializer):
     sample = SampleSerializer(read_only=True)
 
     class Meta:
@@ -151,7 +176,7 @@ class FinishedProductSerializer(serializers.ModelSerializer):
         fields = "__all__"
 
 
-class UserSampleActionSerializer(serializers.ModelSerializer):
+class UserSampleActionSerializer(DynamicFieldsModelSerializer):
     user_account = UserAccountSerializer(read_only=True)
     sample = SampleSerializer(read_only=True)
 
@@ -160,7 +185,7 @@ class UserSampleActionSerializer(serializers.ModelSerializer):
         fields = "__all__"
 
 
-class TestSerializer(serializers.ModelSerializer):
+class TestSerializer(DynamicFieldsModelSerializer):
     user_account = UserAccountSerializer(read_only=True)
     sop = SOPSerializer(read_only=True)
 
@@ -169,7 +194,7 @@ class TestSerializer(serializers.ModelSerializer):
         fields = "__all__"
 
 
-class SampleTestLinkSerializer(serializers.ModelSerializer):
+class SampleTestLinkSerializer(DynamicFieldsModelSerializer):
     sample = SampleSerializer(read_only=True)
     test = TestSerializer(read_only=True)
 
@@ -178,7 +203,7 @@ class SampleTestLinkSerializer(serializers.ModelSerializer):
         fields = "__all__"
 
 
-class TestEquipmentLinkSerializer(serializers.ModelSerializer):
+class TestEquipmentLinkSerializer(DynamicFieldsModelSerializer):
     test = TestSerializer(read_only=True)
     equipment = EquipmentSerializer(read_only=True)
 
@@ -187,7 +212,7 @@ class TestEquipmentLinkSerializer(serializers.ModelSerializer):
         fields = "__all__"
 
 
-class ReagentSerializer(serializers.ModelSerializer):
+class ReagentSerializer(DynamicFieldsModelSerializer):
     sop = SOPSerializer(read_only=True)
 
     class Meta:
@@ -195,7 +220,7 @@ class ReagentSerializer(serializers.ModelSerializer):
         fields = "__all__"
 
 
-class UserReagentActionSerializer(serializers.ModelSerializer):
+class UserReagentActionSerializer(DynamicFieldsModelSerializer):
     user_account = UserAccountSerializer(read_only=True)
     reagent = ReagentSerializer(read_only=True)
 
@@ -204,7 +229,7 @@ class UserReagentActionSerializer(serializers.ModelSerializer):
         fields = "__all__"
 
 
-class TestReagentLinkSerializer(serializers.ModelSerializer):
+class TestReagentLinkSerializer(DynamicFieldsModelSerializer):
     test = TestSerializer(read_only=True)
     reagent = ReagentSerializer(read_only=True)
 
@@ -212,8 +237,16 @@ class TestReagentLinkSerializer(serializers.ModelSerializer):
         model = TestReagentLink
         fields = "__all__"
 
+    def validate(self, attrs):
+        # The usage is posted to the ledger as consumption (see ``stock.py``).
+        reagent_id = getattr(attrs.get("reagent"), "pk", None) or getattr(self.instance, "reagent_id", None)
+        volume_used = attrs.get("volume_used", getattr(self.instance, "volume_used", None))
+        if reagent_id is not None and volume_used is not None:
+            stock.check_test_reagent_link(getattr(self.instance, "pk", None), reagent_id, volume_used)
+        return attrs
+
 
-class VersionChangeSerializer(serializers.ModelSerializer):
+class VersionChangeSerializer(DynamicFieldsModelSerializer):
     sop = SOPSerializer(read_only=True)
 
     class Meta:
@@ -221,6 +254,115 @@ class VersionChangeSerializer(serializers.ModelSerializer):
         fields = "__all__"
 
 
+class StockMovementSerializer(DynamicFieldsModelSerializer):
+    """Ledger entries; created through ``stock.record`` so the balance follows."""
+
+    class Meta:
+        model = StockMovement
+        fields = "__all__"
+        read_only_fields = ("test_reagent_link", "recorded_at")
+
+    def validate(self, attrs):
+        stock.validate_movement(
+            attrs["kind"],
+            attrs["quantity"],
+            reagent_id=getattr(attrs.get("reagent"), "pk", None),
+            sample_id=getattr(attrs.get("sample"), "pk", None),
+        )
+        return attrs
+
+    def create(self, validated_data):
+        return stock.record(
+            validated_data["kind"],
+            validated_data["quantity"],
+            reagent_id=getattr(validated_data.get("reagent"), "pk", None),
+            sample_id=getattr(validated_data.get("sample"), "pk", None),
+            reference=validated_data.get("reference", ""),
+        )
+
+
+class TimelineActionSerializer(DynamicFieldsModelSerializer):
+    user_account = UserAccountSerializer(read_only=True)
+
+    class Meta:
+        model = UserSampleAction
+        exclude = ("sample",)
+
+
+class TimelineEquipmentSerializer(DynamicFieldsModelSerializer):
+    equipment = EquipmentSerializer(read_only=True)
+
+    class Meta:
+        model = TestEquipmentLink
+        exclude = ("test",)
+
+
+class TimelineReagentSerializer(DynamicFieldsModelSerializer):
+    reagent = ReagentSerializer(read_only=True)
+
+    class Meta:
+        model = TestReagentLink
+        exclude = ("test",)
+
+
+class TimelineTestSerializer(DynamicFieldsModelSerializer):
+    test = TestSerializer(read_only=True)
+    equipment = TimelineEquipmentSerializer(source="test.testequipmentlink_set", many=True, read_only=True)
+    reagents = TimelineReagentSerializer(source="test.testreagentlink_set", many=True, read_only=True)
+
+    class Meta:
+        model = SampleTestLink
+        exclude = ("sample",)
+
+
+class TimelineMovementSerializer(DynamicFieldsModelSerializer):
+    class Meta:
+        model = StockMovement
+        exclude = ("sample", "reagent")
+
+
+class TimelineInProcessSerializer(DynamicFieldsModelSerializer):
+    class Meta:
+        model = InProcess
+        exclude = ("sample",)
+
+
+class TimelineStabilitySerializer(DynamicFieldsModelSerializer):
+    class Meta:
+        model = Stability
+        exclude = ("sample",)
+
+
+class TimelineFinishedProductSerializer(DynamicFieldsModelSerializer):
+    class Meta:
+        model = FinishedProduct
+        exclude = ("sample",)
+
+
+class SampleTimelineSerializer(SampleSerializer):
+    """A sample with its subtype, handling, tests (with equipment and reagents) and stock movements.
+
+    Rendered from the prefetched graph of ``timeline.timeline_queryset``;
+    the subtype that does not apply to the sample is ``null``.
+    """
+
+    in_process = TimelineInProcessSerializer(source="inprocess", read_only=True)
+    stability = TimelineStabilitySerializer(read_only=True)
+    finished_product = TimelineFinishedProductSerializer(source="finishedproduct", read_only=True)
+    actions = TimelineActionSerializer(source="usersampleaction_set", many=True, read_only=True)
+    tests = TimelineTestSerializer(source="sampletestlink_set", many=True, read_only=True)
+    movements = TimelineMovementSerializer(source="stockmovement_set", many=True, read_only=True)
+
+    class Meta(SampleSerializer.Meta):
+        pass
+
+
+class AuditEntrySerializer(DynamicFieldsModelSerializer):
+    class Meta:
+        model = AuditEntry
+        fields = "__all__"
+
+
 class DashboardWarehouseClientsSerializer(serializers.Serializer):
     """Aggregates the number of clients per warehouse."""
 
@@ -0,0 +1,493 @@
+"""
+Horizontal sharding of the sample data by warehouse.
+
+When ``SAMPLE_SHARDS`` names one or more database aliases, every sample
+and the rows that hang off it (its in-process, stability or
+finished-product record, user sample actions, test results, stock
+movements and stock balance) live on the shard of the sample's
+warehouse: the one ``WAREHOUSE_SHARDS`` maps it to, else
+``SAMPLE_SHARDS[warehouse_id % len(SAMPLE_SHARDS)]``.  The tables those
+rows reference (SOPs, user accounts, locations, warehouses and tests) are
+kept on the primary and copied to every shard, so each shard joins a
+sample with everything it renders without leaving the shard.  Everything
+else stays on the primary.
+
+:class:`ShardRouter`, which runs before the replica router (see
+``routers.py``), sends the queries of the sharded models to
+
+* the shard an instance was loaded from, for its updates, deletes and
+  related lookups;
+* the shard selected with :func:`on_shard`, which the viewsets set for
+  the object of a detail request and the bulk writer for each group of
+  rows;
+* for a new row saved with ``save()``, the shard of its warehouse or of
+  its sample (``objects.create()`` and ``bulk_create()`` have no instance
+  to route by and need :func:`on_shard`);
+
+and leaves the other queries, and the sharded models without a shard to
+go to, to the primary.  Samples, test results, user sample actions and
+stock movements take their IDs from a :class:`~lims_app.models.ShardSequence`
+on the primary, reserved ``SHARD_ID_BLOCK`` at a time, so IDs stay
+unique across shards and a sample can be found by ID alone.
+
+The list endpoints of the sharded resources (:class:`ShardedViewSetMixin`)
+query every shard concurrently, each for one page in the requested
+ordering after the cursor, and merge the pages (scatter-gather).  A
+``?warehouse=`` filter, or ``?sample=`` on the dependent resources,
+narrows the query to the shard that holds the rows.  Cursors hold the
+ordering values of the boundary row as in ``AsyncKeysetPagination``, so
+a page costs one indexed range scan per shard however deep it is.  The
+async list views gather the same pages with :meth:`ShardedPagination.apaginate`,
+and the test-result analytics merge the rows of every database
+:func:`databases_for` returns.
+
+``python manage.py shard_data`` copies the shared tables to the shards
+and moves existing sample data there, and ``python manage.py
+benchmark_shards`` compares single-shard with fan-out list requests.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import threading
+from concurrent import futures
+from contextlib import contextmanager
+from contextvars import ContextVar, copy_context
+from functools import cmp_to_key
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, close_old_connections, transaction
+from django.db.models import Max
+from rest_framework import exceptions
+from rest_framework.response import Response
+
+from . import bulk
+from .models import (
+    SOP,
+    FinishedProduct,
+    InProcess,
+    Location,
+    Sample,
+    SampleStock,
+    SampleTestLink,
+    ShardSequence,
+    Stability,
+    StockMovement,
+    Test,
+    UserAccount,
+    UserSampleAction,
+    Warehouse,
+)
+from .pagination import AsyncKeysetPagination
+
+
+PRIMARY = DEFAULT_DB_ALIAS
+# Rows stored on the shard of their sample's warehouse.  Stock movements
+# of reagents stay on the primary.
+SHARDED_MODELS = (Sample, InProcess, Stability, FinishedProduct, UserSampleAction, SampleTestLink, SampleStock, StockMovement)
+# Tables referenced by the sharded rows, copied to every shard; parents first.
+REFERENCE_MODELS = (SOP, UserAccount, Location, Warehouse, Test)
+# Sharded models whose primary key is allocated from a ``ShardSequence``
+# (the others share their sample's).
+SEQUENCED_MODELS = (Sample, UserSampleAction, SampleTestLink, StockMovement)
+
+
+def shards() -> list[str]:
+    return list(getattr(settings, "SAMPLE_SHARDS", ()))
+
+
+def enabled() -> bool:
+    return bool(shards())
+
+
+def shard_for_warehouse(warehouse_id) -> str:
+    explicit = getattr(settings, "WAREHOUSE_SHARDS", {})
+    if warehouse_id in explicit:
+        return explicit[warehouse_id]
+    aliases = shards()
+    return aliases[int(warehouse_id) % len(aliases)]
+
+
+def _integer(value) -> int | None:
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return None
+
+
+# -- explicit shard selection ----------------------------------------------
+
+_current_shard: ContextVar = ContextVar("lims_sample_shard", default=None)
+
+
+@contextmanager
+def on_shard(alias: str | None):
+    """Send the queries of the sharded models inside it to shard ``alias``.
+
+    ``None`` leaves them to the router's other rules.
+    """
+    token = _current_shard.set(alias)
+    try:
+        yield alias
+    finally:
+        _current_shard.reset(token)
+
+
+def databases_for(model) -> list[str | None]:
+    """The aliases to read all rows of ``model`` from; ``[None]`` for the routed default."""
+    if enabled() and model in SHARDED_MODELS:
+        return shards()
+    return [None]
+
+
+# -- fan-out ---------------------------------------------------------------
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def get_executor() -> futures.ThreadPoolExecutor:
+    global _executor
+    if _executor is None:
+        with _executor_lock:
+            if _executor is None:
+                _executor = futures.ThreadPoolExecutor(
+                    max_workers=getattr(settings, "SHARD_WORKERS", 8),
+                    thread_name_prefix="shard-query",
+                )
+    return _executor
+
+
+def _run(function, alias):
+    try:
+        return function(alias)
+    finally:
+        # Worker threads outlive requests; release their connections the
+        # way the request cycle does.
+        close_old_connections()
+
+
+def fan_out(function, aliases) -> list:
+    """``[function(alias) for alias in aliases]``, run concurrently on the shard pool.
+
+    A single alias is queried on the calling thread.
+    """
+    aliases = list(aliases)
+    if len(aliases) <= 1:
+        return [function(alias) for alias in aliases]
+    # Each query runs in a copy of the request's context so that the query
+    # metrics of the request (see ``middleware.py``) include it.
+    pending = [get_executor().submit(copy_context().run, _run, function, alias) for alias in aliases]
+    return [future.result() for future in pending]
+
+
+def locate(model, pks) -> dict:
+    """``{pk: alias}`` of the shard holding each of ``pks`` that is found on one."""
+    pks = list(pks)
+
+    def find(alias):
+        found = []
+        for chunk in bulk.chunked(pks, bulk.parameter_limit()):
+            found += model._base_manager.using(alias).filter(pk__in=chunk).values_list("pk", flat=True)
+        return found
+
+    if not pks or not enabled():
+        return {}
+    return {pk: alias for alias, found in zip(shards(), fan_out(find, shards())) for pk in found}
+
+
+def shard_of(model, pk) -> str | None:
+    """The shard holding ``model`` row ``pk``, or ``None`` (sharding off or no such row)."""
+    pk = _integer(pk)
+    return None if pk is None else locate(model, [pk]).get(pk)
+
+
+def shard_of_sample(sample_id) -> str | None:
+    return shard_of(Sample, sample_id)
+
+
+def partition(model, pks) -> dict:
+    """``{alias: [pk, ...]}`` of the shards holding ``pks``; unknown ones under ``None``."""
+    if not enabled():
+        return {None: list(pks)}
+    found = locate(model, pks)
+    groups: dict = {}
+    for pk in pks:
+        groups.setdefault(found.get(pk), []).append(pk)
+    return groups
+
+
+# -- IDs -------------------------------------------------------------------
+
+class IdAllocator:
+    """Hands out primary keys from blocks reserved in ``ShardSequence``."""
+
+    def __init__(self) -> None:
+        self._blocks: dict[str, range] = {}
+        self._lock = threading.Lock()
+
+    def allocate(self, model, count: int = 1) -> list[int]:
+        label = model._meta.label_lower
+        with self._lock:
+            block = self._blocks.get(label, range(0))
+            if len(block) < count:
+                # The rest of the old block is abandoned; IDs may have gaps.
+                block = self._reserve(model, max(count, getattr(settings, "SHARD_ID_BLOCK", 100)))
+            ids, self._blocks[label] = list(block[:count]), block[count:]
+        return ids
+
+    def _reserve(self, model, size: int) -> range:
+        label = model._meta.label_lower
+        with transaction.atomic(using=PRIMARY):
+            sequences = ShardSequence.objects.using(PRIMARY)
+            if not sequences.filter(name=label).exists():
+                sequences.get_or_create(name=label, defaults={"next_value": highest_id(model) + 1})
+            sequence = sequences.select_for_update().get(name=label)
+            start = sequence.next_value
+            sequence.next_value = start + size
+            sequence.save(update_fields=["next_value"])
+        return range(start, start + size)
+
+
+def highest_id(model) -> int:
+    """The largest primary key of ``model`` on the primary and the shards."""
+    values = [
+        model._base_manager.using(alias).aggregate(highest=Max("pk"))["highest"] or 0
+        for alias in [PRIMARY, *shards()]
+    ]
+    return max(values)
+
+
+allocator = IdAllocator()
+
+
+def assign_ids(model, objects) -> None:
+    """Give the new ``objects`` of a sequenced model IDs unique across shards."""
+    if not enabled() or model not in SEQUENCED_MODELS:
+        return
+    missing = [obj for obj in objects if obj.pk is None]
+    for obj, pk in zip(missing, allocator.allocate(model, len(missing)) if missing else ()):
+        obj.pk = pk
+
+
+# -- shared tables ---------------------------------------------------------
+
+def copy_reference_rows(model, pks=None) -> int:
+    """Insert or update ``model`` rows ``pks`` (default: all) on every shard from the primary."""
+    rows = model._base_manager.using(PRIMARY).order_by("pk")
+    if pks is not None:
+        rows = rows.filter(pk__in=list(pks))
+    rows = list(rows)
+    fields = [field.attname for field in model._meta.concrete_fields if not field.primary_key]
+    for alias in shards():
+        manager = model._base_manager.using(alias)
+        existing = set()
+        for chunk in bulk.chunked([row.pk for row in rows], bulk.parameter_limit()):
+            existing.update(manager.filter(pk__in=chunk).values_list("pk", flat=True))
+        batch_size = max(1, bulk.parameter_limit() // (len(fields) + 1))
+        with transaction.atomic(using=alias):
+            manager.bulk_create([row for row in rows if row.pk not in existing], batch_size=batch_size)
+            if fields:
+                manager.bulk_update(
+                    [row for row in rows if row.pk in existing], fields,
+                    batch_size=max(1, bulk.parameter_limit() // (2 * len(fields) + 1)),
+                )
+    return len(rows)
+
+
+def delete_reference_rows(model, pks) -> None:
+    """Delete ``model`` rows ``pks`` from every shard, with what cascades from them there."""
+    for alias in shards():
+        model._base_manager.using(alias).filter(pk__in=list(pks)).delete()
+
+
+# -- router ----------------------------------------------------------------
+
+def _placement(instance) -> str | None:
+    """The shard a new sharded row belongs on, or ``None`` if its sample is not on one."""
+    if isinstance(instance, Sample):
+        return None if instance.warehouse_id is None else shard_for_warehouse(instance.warehouse_id)
+    sample_field = type(instance)._meta.get_field("sample")
+    if sample_field.is_cached(instance):
+        db = instance.sample._state.db
+        return db if db in shards() else None
+    return shard_of_sample(instance.sample_id)
+
+
+class ShardRouter:
+    """Routes the sharded models to their shard (see module docstring)."""
+
+    def _route(self, model, hints) -> str | None:
+        if model not in SHARDED_MODELS or not enabled():
+            return None
+        instance = hints.get("instance")
+        if instance is not None and instance._state.db in shards():
+            return instance._state.db
+        current = _current_shard.get()
+        if current is not None:
+            return current
+        if isinstance(instance, model) and instance._state.adding:
+            return _placement(instance)
+        return None
+
+    def db_for_read(self, model, **hints):
+        return self._route(model, hints)
+
+    def db_for_write(self, model, **hints):
+        return self._route(model, hints)
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # The shared tables are on every shard.
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        # Shards get the full schema; the shared tables need it, the rest stays empty.
+        return None
+
+
+# -- API -------------------------------------------------------------------
+
+class ShardedPagination(AsyncKeysetPagination):
+    """Keyset pages merged from the per-shard pages of the same ordering."""
+
+    def compare(self, a, b, reverse: bool) -> int:
+        for name, descending in self.ordering:
+            left, right = getattr(a, name), getattr(b, name)
+            if left != right:
+                return (1 if left > right else -1) * (-1 if descending != reverse else 1)
+        return 0
+
+    def _page_query(self, queryset, request) -> tuple:
+        page_size = self.get_page_size(request)
+        positions, reverse = self.decode_cursor(request)
+        ordering = [("-" if descending != reverse else "") + name for name, descending in self.ordering]
+        queryset = queryset.order_by(*ordering)
+        if positions is not None:
+            queryset = queryset.filter(self._after(positions, reverse))
+        return queryset[: page_size + 1], page_size, positions, reverse
+
+    def paginate(self, queryset, request, aliases) -> tuple[list, str | None, str | None]:
+        """Return the merged rows of the requested page and the next/previous links."""
+        page, page_size, positions, reverse = self._page_query(queryset, request)
+        pages = fan_out(lambda alias: list(page.using(alias)), aliases)
+        return self._merge(request, pages, page_size, positions, reverse)
+
+    async def apaginate(self, queryset, request, aliases) -> tuple[list, str | None, str | None]:
+        """:meth:`paginate` for the async views, reading each shard with ``aiterator()``."""
+        page, page_size, positions, reverse = self._page_query(queryset, request)
+
+        async def read(alias):
+            return [row async for row in page.using(alias).aiterator(chunk_size=page_size + 1)]
+
+        pages = await asyncio.gather(*(read(alias) for alias in aliases))
+        return self._merge(request, pages, page_size, positions, reverse)
+
+    def _merge(self, request, pages, page_size: int, positions, reverse: bool) -> tuple:
+        rows = sorted(
+            (row for page in pages for row in page),
+            key=cmp_to_key(lambda a, b: self.compare(a, b, reverse)),
+        )
+        has_more = len(rows) > page_size
+        rows = rows[:page_size]
+        if reverse:
+            rows.reverse()
+        return rows, *self.get_links(request, rows, has_more, positions, reverse)
+
+
+def shard_for_key(shard_key: str, value) -> str | None:
+    """The shard of a new row whose ``shard_key`` (``warehouse`` or ``sample``) is ``value``."""
+    key = _integer(value)
+    if key is None or not enabled():
+        return None
+    if shard_key == "warehouse":
+        return shard_for_warehouse(key)
+    return shard_of_sample(key)
+
+
+def list_shards(shard_key: str, params) -> list[str]:
+    """The shards that can hold rows matching the ``shard_key`` filter in ``params``."""
+    raw = [params.get(shard_key, ""), *params.get(f"{shard_key}__in", "").split(",")]
+    keys = {_integer(value) for value in raw if value.strip()}
+    if not keys or None in keys:
+        # Malformed values are rejected by the filter backend.
+        return shards()
+    if shard_key == "warehouse":
+        selected = {shard_for_warehouse(key) for key in keys}
+    else:
+        selected = set(locate(Sample, keys).values())
+    return [alias for alias in shards() if alias in selected]
+
+
+class ShardedViewSetMixin:
+    """Serves a sharded resource from the shards once sharding is configured.
+
+    Detail requests, their actions included, run on the shard that holds
+    the object, and creates on the shard of their ``shard_key``; lists are
+    gathered from every shard, or from the one selected by the
+    ``shard_key`` filter (``warehouse`` for samples, ``sample`` for the
+    rows of a sample).
+    """
+
+    shard_key = "sample"
+
+    def dispatch(self, request, *args, **kwargs):
+        alias = None
+        lookup = kwargs.get(self.lookup_url_kwarg or self.lookup_field)
+        if lookup is not None:
+            alias = shard_of(self.queryset.model, lookup)
+        with on_shard(alias):
+            return super().dispatch(request, *args, **kwargs)
+
+    def get_list_shards(self) -> list[str]:
+        """The shards that can hold rows matching the ``shard_key`` filter."""
+        return list_shards(self.shard_key, self.request.query_params)
+
+    def create(self, request, *args, **kwargs):
+        # Validate and save the row on the shard of its ``shard_key``, so
+        # that a sharded foreign key (``sample``) is looked up there.
+        value = request.data.get(self.shard_key) if isinstance(request.data, dict) else None
+        with on_shard(shard_for_key(self.shard_key, value)):
+            return super().create(request, *args, **kwargs)
+
+    def get_bulk_groups(self, rows: list, mode: str) -> tuple[dict, dict]:
+        """Group bulk rows by the shard of the row they update or of their ``shard_key``."""
+        if not enabled():
+            return super().get_bulk_groups(rows, mode)
+        model = self.queryset.model
+        rows = [row if isinstance(row, dict) else {} for row in rows]
+        existing = locate(model, {_integer(row.get("id")) for row in rows} - {None}) if mode != "create" else {}
+        if self.shard_key == "warehouse":
+            target = shard_for_warehouse
+        else:
+            target = locate(Sample, {_integer(row.get(self.shard_key)) for row in rows} - {None}).get
+        groups, errors = {}, {}
+        for index, row in enumerate(rows):
+            current = existing.get(_integer(row.get("id")))
+            key = _integer(row.get(self.shard_key))
+            wanted = None if key is None else target(key)
+            if current is not None and wanted is not None and current != wanted:
+                errors[index] = {self.shard_key: ["Rows cannot be moved to another shard."]}
+                continue
+            # Rows placed nowhere go to the primary, where validation reports them.
+            groups.setdefault(current or wanted, []).append(index)
+        return groups, errors
+
+    def list(self, request, *args, **kwargs):
+        if not enabled():
+            return super().list(request, *args, **kwargs)
+        queryset = self.filter_queryset(self.get_queryset())
+        if self.paginator is None:
+            raise exceptions.APIException("Sharded lists need a paginator.")
+        paginator = ShardedPagination(queryset.model, self.paginator.get_ordering(request, queryset, self))
+        compiled = self.get_compiled_serializer()
+        if compiled is not None:
+            queryset = compiled.values(queryset.prefetch_related(None), [name for name, _ in paginator.ordering])
+        rows, next_link, previous_link = paginator.paginate(queryset, request, self.get_list_shards())
+        if compiled is not None:
+            build = compiled.builder()
+            data = [build(row) for row in rows]
+        else:
+            data = self.get_serializer(rows, many=True).data
+        response = Response({"next": next_link, "previous": previous_link, "results": data})
+        response.compiled = compiled is not None
+        return response
@@ -0,0 +1,190 @@
+"""
+Signal handlers for the LISMS app.
+
+The handlers are connected when ``LimsAppConfig.ready`` imports this module.
+They keep the dashboard summary tables (see ``dashboard.py``) in step with
+``WarehouseClientLink`` and ``VersionChange`` writes.  Each instance keeps a
+snapshot of the values it was loaded with so that an update can retract
+its old contribution before adding the new one.  Instances loaded with
+deferred fields (``?fields=`` requests use ``.only()``) take the snapshot
+from the database just before they are saved or deleted instead, since
+reading a deferred field in ``post_init`` would issue a query per row.  They also bump the cache
+generation of the reference-data models whose API responses are cached
+(see ``caching.py``) and keep the due-date calendars of reagents and
+maintenance logs current once a write commits (see ``duedates.py``),
+and post the opening stock of new samples and reagent usage recorded on
+``TestReagentLink`` to the stock ledger (see ``stock.py``).
+The reversal for a deleted usage is posted once the delete commits, when
+it is known whether the reagent itself was deleted with it.  With sample
+sharding on (see ``sharding.py``), new sample rows get IDs unique across
+the shards, and committed writes of the shared tables are copied to every
+shard.
+"""
+
+from __future__ import annotations
+
+from django.db import transaction
+from django.db.models.signals import post_delete, post_init, post_save, pre_delete, pre_save
+from django.dispatch import receiver
+
+from . import dashboard, sharding, stock
+from .caching import bump_generation
+from .duedates import DUE_DATE_FIELDS, due_index
+from .models import (
+    SOP, Client, Equipment, Location, Sample, TestReagentLink, VersionChange, Warehouse, WarehouseClientLink,
+)
+
+
+CACHED_MODELS = (SOP, Location, Warehouse, Client, Equipment)
+
+
+def _snapshot(instance, key):
+    if instance.get_deferred_fields():
+        return None
+    return key(instance)
+
+
+def _load_snapshot(sender, instance, key) -> None:
+    if instance._dashboard_snapshot is None and instance.pk is not None:
+        stored = sender._base_manager.filter(pk=instance.pk).first()
+        if stored is not None:
+            instance._dashboard_snapshot = key(stored)
+
+
+@receiver(post_init, sender=WarehouseClientLink)
+def snapshot_link(sender, instance, **kwargs):
+    instance._dashboard_snapshot = _snapshot(instance, dashboard.link_key)
+
+
+@receiver(pre_save, sender=WarehouseClientLink)
+@receiver(pre_delete, sender=WarehouseClientLink)
+def load_link_snapshot(sender, instance, raw=False, **kwargs):
+    if not raw:
+        _load_snapshot(sender, instance, dashboard.link_key)
+
+
+@receiver(post_save, sender=WarehouseClientLink)
+def link_saved(sender, instance, created, raw=False, **kwargs):
+    if raw:
+        return
+    current = dashboard.link_key(instance)
+    if not created and instance._dashboard_snapshot is not None:
+        if current == instance._dashboard_snapshot:
+            return
+        dashboard.remove_link(*instance._dashboard_snapshot)
+    dashboard.add_link(*current)
+    instance._dashboard_snapshot = current
+
+
+@receiver(post_delete, sender=WarehouseClientLink)
+def link_deleted(sender, instance, **kwargs):
+    if instance._dashboard_snapshot is not None:
+        dashboard.remove_link(*instance._dashboard_snapshot)
+
+
+@receiver(post_init, sender=VersionChange)
+def snapshot_version_change(sender, instance, **kwargs):
+    instance._dashboard_snapshot = _snapshot(instance, dashboard.version_change_key)
+
+
+@receiver(pre_save, sender=VersionChange)
+@receiver(pre_delete, sender=VersionChange)
+def load_version_change_snapshot(sender, instance, raw=False, **kwargs):
+    if not raw:
+        _load_snapshot(sender, instance, dashboard.version_change_key)
+
+
+@receiver(post_save, sender=VersionChange)
+def version_change_saved(sender, instance, created, raw=False, **kwargs):
+    if raw:
+        return
+    current = dashboard.version_change_key(instance)
+    if not created and instance._dashboard_snapshot is not None:
+        if current == instance._dashboard_snapshot:
+            return
+        dashboard.remove_version_change(*instance._dashboard_snapshot)
+    dashboard.add_version_change(*current)
+    instance._dashboard_snapshot = current
+
+
+@receiver(post_delete, sender=VersionChange)
+def version_change_deleted(sender, instance, **kwargs):
+    if instance._dashboard_snapshot is not None:
+        dashboard.remove_version_change(*instance._dashboard_snapshot)
+
+
+def invalidate_cached_responses(sender, **kwargs):
+    bump_generation(sender)
+
+
+for model in CACHED_MODELS:
+    post_save.connect(invalidate_cached_responses, sender=model, dispatch_uid=f"cache-save-{model._meta.label_lower}")
+    post_delete.connect(invalidate_cached_responses, sender=model, dispatch_uid=f"cache-delete-{model._meta.label_lower}")
+
+
+def due_date_saved(sender, instance, raw=False, **kwargs):
+    field = DUE_DATE_FIELDS[sender]
+    if raw or field in instance.get_deferred_fields():
+        # A deferred due date was not written, so the calendar is unchanged.
+        return
+    pk, due = instance.pk, getattr(instance, field)
+    # A write that rolls back must leave the calendar and its generation alone.
+    transaction.on_commit(lambda: due_index.update(sender, pk, due), using=instance._state.db)
+
+
+def due_date_deleted(sender, instance, **kwargs):
+    pk = instance.pk
+    transaction.on_commit(lambda: due_index.update(sender, pk, None), using=instance._state.db)
+
+
+for model in DUE_DATE_FIELDS:
+    post_save.connect(due_date_saved, sender=model, dispatch_uid=f"due-save-{model._meta.label_lower}")
+    post_delete.connect(due_date_deleted, sender=model, dispatch_uid=f"due-delete-{model._meta.label_lower}")
+
+
+@receiver(post_save, sender=Sample)
+def sample_saved(sender, instance, created=False, raw=False, **kwargs):
+    # ``samples/bulk/`` inserts without signals and opens the stock itself.
+    if created and not raw:
+        stock.open_sample_stock([instance])
+
+
+@receiver(post_save, sender=TestReagentLink)
+def reagent_usage_saved(sender, instance, raw=False, **kwargs):
+    if raw or {"reagent", "volume_used"} & instance.get_deferred_fields():
+        return
+    stock.sync_test_reagent_link(instance)
+
+
+@receiver(pre_delete, sender=TestReagentLink)
+def reagent_usage_deleted(sender, instance, **kwargs):
+    # Read before the delete clears ``test_reagent_link`` on the movements.
+    posted = stock.posted_for_link(instance.pk)
+    if posted:
+        transaction.on_commit(lambda: stock.release_test_reagent_link(instance.test_id, posted))
+
+
+def assign_shard_id(sender, instance, raw=False, **kwargs):
+    if not raw and instance.pk is None:
+        sharding.assign_ids(sender, [instance])
+
+
+for model in sharding.SEQUENCED_MODELS:
+    pre_save.connect(assign_shard_id, sender=model, dispatch_uid=f"shard-id-{model._meta.label_lower}")
+
+
+def reference_saved(sender, instance, raw=False, using=None, **kwargs):
+    if not raw and using == sharding.PRIMARY and sharding.enabled():
+        pk = instance.pk
+        transaction.on_commit(lambda: sharding.copy_reference_rows(sender, [pk]), using=using)
+
+
+def reference_deleted(sender, instance, using=None, **kwargs):
+    if using == sharding.PRIMARY and sharding.enabled():
+        pk = instance.pk
+        transaction.on_commit(lambda: sharding.delete_reference_rows(sender, [pk]), using=using)
+
+
+for model in sharding.REFERENCE_MODELS:
+    post_save.connect(reference_saved, sender=model, dispatch_uid=f"shard-copy-{model._meta.label_lower}")
+    post_delete.connect(reference_deleted, sender=model, dispatch_uid=f"shard-delete-{model._meta.label_lower}")
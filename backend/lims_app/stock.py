@@ -0,0 +1,391 @@
+"""
+Append-only stock ledger for reagent lots and samples.
+
+Every change of stock is a :class:`~lims_app.models.StockMovement` row:
+receipts add to the stock of a reagent lot or sample, consumption,
+aliquots and shipments take from it, and adjustments correct it either
+way.  Movements are only ever inserted.  Next to the ledger,
+``ReagentStock`` and ``SampleStock`` hold the running balance and
+movement count of each lot and sample, so "how much of lot X is left" is
+a single primary-key lookup instead of a sum over its history.
+
+:func:`record` inserts a movement and applies it to the balance in one
+transaction.  The balance row is locked with ``select_for_update`` while
+an outgoing movement is checked against it, and the balance (and
+``Sample.quantity``, which mirrors the sample balance) is changed with an
+``F()`` expression, so concurrent movements on the same item serialize
+instead of overwriting each other.
+
+Reagent usage recorded on ``TestReagentLink.volume_used`` is posted to
+the ledger automatically (see ``signals.py``): saving a link posts the
+consumption, or the difference when the volume or reagent changed, and
+deleting it posts the reversal.  Usage the lot has not got the stock for
+is rejected like any other outgoing movement.
+
+The balance of a lot or sample is served at ``GET
+/api/reagents/<id>/stock/`` and ``GET /api/samples/<id>/stock/``, and
+movements are posted to and listed from ``/api/stock-movements/``.
+
+With sample sharding (see ``sharding.py``) the movements and balance of
+a sample are kept on the sample's shard and reagent stock stays on the
+primary; the ``stock-movements/`` list reads both, and the
+reconciliation below checks every database against its own ledger.
+
+The ``quantity`` a sample is created with, singly or through
+``samples/bulk/``, is posted as its opening receipt
+(:func:`open_sample_stock`); afterwards it is read-only in the API, so a
+sample's stock only changes through movements and ``Sample.quantity``
+always equals its balance.  ``python manage.py reconcile_stock`` compares
+the balances with the ledger and can rebuild them, and ``--backfill``
+writes opening entries for samples and test usage that predate the
+ledger.
+"""
+
+from __future__ import annotations
+
+from decimal import Decimal
+
+from django.db import router, transaction
+from django.db.models import Count, F, Sum
+from django.utils import timezone
+from rest_framework import exceptions, serializers
+from rest_framework.decorators import action
+from rest_framework.response import Response
+
+from . import sharding
+from .bulk import chunked
+from .models import Reagent, ReagentStock, Sample, SampleStock, StockMovement, TestReagentLink
+
+
+# Sign each kind of movement must have; ``None`` accepts either.
+KIND_SIGNS = {
+    StockMovement.RECEIPT: 1,
+    StockMovement.CONSUMPTION: -1,
+    StockMovement.ALIQUOT: -1,
+    StockMovement.SHIPMENT: -1,
+    StockMovement.ADJUSTMENT: None,
+}
+OPENING_REFERENCE = "opening balance"
+
+
+def _target(reagent_id, sample_id) -> tuple:
+    if (reagent_id is None) == (sample_id is None):
+        raise exceptions.ValidationError(
+            {"non_field_errors": ["A movement applies to exactly one reagent or one sample."]}
+        )
+    if reagent_id is not None:
+        return ReagentStock, reagent_id
+    return SampleStock, sample_id
+
+
+def validate_movement(kind: str, quantity: Decimal, reagent_id=None, sample_id=None) -> None:
+    """Raise ``ValidationError`` if the movement is malformed (not if stock is short)."""
+    _target(reagent_id, sample_id)
+    if kind not in KIND_SIGNS:
+        raise exceptions.ValidationError({"kind": [f"Unknown movement kind '{kind}'."]})
+    if not quantity:
+        raise exceptions.ValidationError({"quantity": ["Must not be zero."]})
+    sign = KIND_SIGNS[kind]
+    if sign is not None and (quantity > 0) != (sign > 0):
+        direction = "positive" if sign > 0 else "negative"
+        raise exceptions.ValidationError({"quantity": [f"A {kind} must be {direction}."]})
+    if sample_id is not None and quantity != quantity.to_integral_value():
+        raise exceptions.ValidationError({"quantity": ["Sample quantities are whole units."]})
+
+
+def record(kind: str, quantity, *, reagent_id=None, sample_id=None, reference: str = "",
+           test_reagent_link_id=None, recorded_at=None, allow_negative: bool = False) -> StockMovement:
+    """Append a movement to the ledger and apply it to the running balance.
+
+    Unless ``allow_negative`` is set, a movement that would take the
+    balance below zero is rejected with a ``ValidationError``.
+    """
+    quantity = Decimal(quantity)
+    validate_movement(kind, quantity, reagent_id, sample_id)
+    balance_model, pk = _target(reagent_id, sample_id)
+    # A sample's balance and movements are kept on its shard, if sharded.
+    shard = sharding.shard_of_sample(sample_id) if sample_id is not None else None
+    with sharding.on_shard(shard), transaction.atomic(using=router.db_for_write(balance_model)):
+        balance, _ = balance_model.objects.select_for_update().get_or_create(pk=pk)
+        if quantity < 0 and not allow_negative and balance.quantity + quantity < 0:
+            raise exceptions.ValidationError(
+                {"quantity": [f"Only {balance.quantity} in stock; cannot take {-quantity}."]}
+            )
+        movement = StockMovement.objects.create(
+            reagent_id=reagent_id,
+            sample_id=sample_id,
+            kind=kind,
+            quantity=quantity,
+            reference=reference,
+            test_reagent_link_id=test_reagent_link_id,
+            recorded_at=recorded_at or timezone.now(),
+        )
+        balance_model.objects.filter(pk=pk).update(
+            quantity=F("quantity") + quantity,
+            movement_count=F("movement_count") + 1,
+            updated_at=movement.recorded_at,
+        )
+        if sample_id is not None:
+            Sample._base_manager.filter(pk=sample_id).update(quantity=F("quantity") + quantity)
+    return movement
+
+
+def open_sample_stock(samples, recorded_at=None) -> int:
+    """Post the opening receipt of ``samples`` just inserted with a ``quantity``.
+
+    :func:`record` in bulk for rows no other transaction can see yet:
+    ``Sample.quantity`` already holds the stock, so only the movements and
+    balance rows are written, on the database each sample was saved to.
+    Returns the number of receipts posted.
+    """
+    recorded_at = recorded_at or timezone.now()
+    by_database: dict = {}
+    for sample in samples:
+        if sample.quantity:
+            validate_movement(StockMovement.RECEIPT, Decimal(sample.quantity), sample_id=sample.pk)
+            by_database.setdefault(sample._state.db, []).append(sample)
+    for using, opened in by_database.items():
+        movements = [
+            StockMovement(sample_id=sample.pk, kind=StockMovement.RECEIPT, quantity=sample.quantity,
+                          reference=OPENING_REFERENCE, recorded_at=recorded_at)
+            for sample in opened
+        ]
+        balances = [
+            SampleStock(sample_id=sample.pk, quantity=sample.quantity, movement_count=1, updated_at=recorded_at)
+            for sample in opened
+        ]
+        sharding.assign_ids(StockMovement, movements)
+        with transaction.atomic(using=using):
+            StockMovement._base_manager.db_manager(using).bulk_create(movements, batch_size=500)
+            SampleStock._base_manager.db_manager(using).bulk_create(balances, batch_size=500)
+    return sum(len(opened) for opened in by_database.values())
+
+
+def current_stock(reagent_id=None, sample_id=None) -> dict:
+    """Balance of one reagent lot or sample, read from its snapshot row."""
+    balance_model, pk = _target(reagent_id, sample_id)
+    row = balance_model.objects.filter(pk=pk).values("quantity", "movement_count", "updated_at").first()
+    return row or {"quantity": Decimal("0"), "movement_count": 0, "updated_at": None}
+
+
+class BalanceSerializer(serializers.Serializer):
+    quantity = serializers.DecimalField(max_digits=16, decimal_places=6)
+    movement_count = serializers.IntegerField()
+    updated_at = serializers.DateTimeField(allow_null=True)
+
+
+class StockMixin:
+    """Adds ``GET <resource>/<pk>/stock/`` to the reagent and sample viewsets."""
+
+    @action(detail=True, methods=["get"], url_path="stock")
+    def stock(self, request, pk=None, *args, **kwargs):
+        field = {Reagent: "reagent_id", Sample: "sample_id"}[self.get_queryset().model]
+        try:
+            pk = int(pk)
+        except (TypeError, ValueError):
+            raise exceptions.NotFound()
+        balance = current_stock(**{field: pk})
+        # Without a balance row the item either has no movements yet or does not exist.
+        if balance["updated_at"] is None and not self.get_queryset().filter(pk=pk).exists():
+            raise exceptions.NotFound()
+        return Response({field[:-3]: pk, **BalanceSerializer(balance).data})
+
+
+# ---------------------------------------------------------------------------
+# Test usage
+# ---------------------------------------------------------------------------
+
+def posted_for_link(link_pk) -> dict:
+    """``{reagent_id: net quantity}`` posted to the ledger for one test usage."""
+    rows = (
+        StockMovement.objects.filter(test_reagent_link_id=link_pk)
+        .values("reagent_id")
+        .annotate(total=Sum("quantity"))
+        .order_by()
+    )
+    return {row["reagent_id"]: row["total"] for row in rows if row["total"]}
+
+
+def posted_for_links(links, using=None) -> dict:
+    """``{(test_id, reagent_id): net quantity}`` posted for the test usages with a ``pk`` in ``links``."""
+    rows = (
+        StockMovement._base_manager.db_manager(using)
+        .filter(test_reagent_link__in=links)
+        .values("test_reagent_link__test_id", "reagent_id")
+        .annotate(total=Sum("quantity"))
+        .order_by()
+    )
+    return {(row["test_reagent_link__test_id"], row["reagent_id"]): row["total"] for row in rows if row["total"]}
+
+
+def _usage_change(link_pk, reagent_id, volume_used) -> tuple[dict, Decimal]:
+    """What is posted for a test usage, and what its reagent is still to be charged."""
+    posted = posted_for_link(link_pk) if link_pk is not None else {}
+    # The ledger sums come back from some backends with more places than the column has.
+    return posted, (-Decimal(volume_used) - posted.get(reagent_id, 0)).quantize(Decimal("0.000001"))
+
+
+def check_test_reagent_link(link_pk, reagent_id, volume_used) -> None:
+    """Raise ``ValidationError`` if the reagent has not got the stock for the usage."""
+    _, delta = _usage_change(link_pk, reagent_id, volume_used)
+    if delta < 0:
+        validate_movement(StockMovement.CONSUMPTION, delta, reagent_id=reagent_id)
+        available = ReagentStock.objects.filter(pk=reagent_id).values_list("quantity", flat=True).first()
+        available = available or Decimal("0")
+        if available + delta < 0:
+            raise exceptions.ValidationError(
+                {"volume_used": [f"Only {available} of the reagent in stock; cannot take {-delta}."]}
+            )
+
+
+def sync_test_reagent_link(link: TestReagentLink) -> None:
+    """Post whatever brings the ledger in line with ``link.volume_used``.
+
+    Reversals of what was posted for another reagent may take its stock
+    below zero; new consumption may not.
+    """
+    posted, delta = _usage_change(link.pk, link.reagent_id, link.volume_used)
+    reference = f"test {link.test_id}"
+    with transaction.atomic():
+        for reagent_id, total in posted.items():
+            if reagent_id != link.reagent_id:
+                record(StockMovement.ADJUSTMENT, -total, reagent_id=reagent_id, reference=reference,
+                       test_reagent_link_id=link.pk, allow_negative=True)
+        if delta:
+            kind = StockMovement.CONSUMPTION if delta < 0 else StockMovement.ADJUSTMENT
+            record(kind, delta, reagent_id=link.reagent_id, reference=reference, test_reagent_link_id=link.pk)
+
+
+def release_test_reagent_link(test_id, posted: dict) -> None:
+    """Reverse the consumption ``posted`` for a deleted test usage.
+
+    Reagents deleted along with the usage have no stock left to return.
+    """
+    existing = set(Reagent.objects.filter(pk__in=list(posted)).values_list("pk", flat=True))
+    for reagent_id, total in posted.items():
+        if reagent_id in existing:
+            record(StockMovement.ADJUSTMENT, -total, reagent_id=reagent_id,
+                   reference=f"test {test_id} usage deleted", allow_negative=True)
+
+
+# ---------------------------------------------------------------------------
+# Reconciliation
+# ---------------------------------------------------------------------------
+
+def databases() -> list[str]:
+    """The databases holding stock: the primary, then the sample shards."""
+    return [sharding.PRIMARY, *sharding.shards()]
+
+
+def live_balances(field: str, using: str = sharding.PRIMARY) -> dict:
+    """``{id: (total, movement count)}`` summed from the ledger for ``reagent`` or ``sample``."""
+    rows = (
+        StockMovement._base_manager.using(using).filter(**{f"{field}__isnull": False})
+        .values(f"{field}_id")
+        .annotate(total=Sum("quantity"), count=Count("id"))
+        .order_by()
+    )
+    return {row[f"{field}_id"]: (row["total"], row["count"]) for row in rows}
+
+
+def verify_balances() -> list[str]:
+    """Compare the snapshots with the ledger and ``Sample.quantity`` on every database; return mismatches."""
+    problems = []
+    for using in databases():
+        where = "" if using == sharding.PRIMARY else f" ({using})"
+        for label, balance_model, field in (("reagent", ReagentStock, "reagent"), ("sample", SampleStock, "sample")):
+            stored = {
+                pk: (quantity, count)
+                for pk, quantity, count in balance_model._base_manager.using(using).values_list(
+                    "pk", "quantity", "movement_count"
+                )
+            }
+            live = live_balances(field, using)
+            for pk in sorted(set(stored) | set(live)):
+                have = stored.get(pk, (Decimal("0"), 0))
+                want = live.get(pk, (Decimal("0"), 0))
+                if have[0] != want[0] or have[1] != want[1]:
+                    problems.append(
+                        f"{label} {pk}{where}: snapshot has {have[0]} from {have[1]} movements, "
+                        f"ledger sums to {want[0]} from {want[1]}"
+                    )
+        mirrored = (
+            Sample._base_manager.using(using).filter(stock__isnull=False).exclude(quantity=F("stock__quantity"))
+        )
+        for pk, quantity, balance in mirrored.values_list("pk", "quantity", "stock__quantity").order_by("pk"):
+            problems.append(f"sample {pk}{where}: quantity is {quantity}, stock balance is {balance}")
+    return problems
+
+
+def rebuild_balances() -> None:
+    """Recompute every snapshot (and ``Sample.quantity`` of ledgered samples) from the ledger."""
+    now = timezone.now()
+    for using in databases():
+        with transaction.atomic(using=using):
+            ReagentStock._base_manager.using(using).all().delete()
+            SampleStock._base_manager.using(using).all().delete()
+            ReagentStock._base_manager.using(using).bulk_create(
+                [
+                    ReagentStock(reagent_id=pk, quantity=total, movement_count=count, updated_at=now)
+                    for pk, (total, count) in live_balances("reagent", using).items()
+                ],
+                batch_size=500,
+            )
+            samples = live_balances("sample", using)
+            SampleStock._base_manager.using(using).bulk_create(
+                [
+                    SampleStock(sample_id=pk, quantity=total, movement_count=count, updated_at=now)
+                    for pk, (total, count) in samples.items()
+                ],
+                batch_size=500,
+            )
+            stale = [
+                Sample(pk=pk, quantity=samples[pk][0])
+                for pk, quantity in Sample._base_manager.using(using).filter(pk__in=list(samples)).values_list(
+                    "pk", "quantity"
+                )
+                if quantity != samples[pk][0]
+            ]
+            Sample._base_manager.using(using).bulk_update(stale, ["quantity"], batch_size=500)
+
+
+def backfill_opening_entries(chunk_size: int = 2000) -> dict:
+    """Write ledger entries for stock that predates the ledger, then rebuild the snapshots.
+
+    Samples without movements get an opening adjustment of their current
+    ``quantity``, on the database that holds them; test usage without
+    movements gets its consumption.
+    """
+    now = timezone.now()
+    written = {"samples": 0, "test_reagent_links": 0}
+    for using in databases():
+        samples = (
+            Sample._base_manager.using(using).filter(stockmovement__isnull=True).exclude(quantity=0)
+            .values_list("pk", "quantity").order_by("pk")
+        )
+        with transaction.atomic(using=using):
+            for chunk in chunked(list(samples), chunk_size):
+                movements = [
+                    StockMovement(sample_id=pk, kind=StockMovement.ADJUSTMENT, quantity=quantity,
+                                  reference=OPENING_REFERENCE, recorded_at=now)
+                    for pk, quantity in chunk
+                ]
+                sharding.assign_ids(StockMovement, movements)
+                StockMovement._base_manager.using(using).bulk_create(movements)
+                written["samples"] += len(chunk)
+    links = (
+        TestReagentLink.objects.filter(stockmovement__isnull=True).exclude(volume_used=0)
+        .values_list("pk", "reagent_id", "test_id", "volume_used").order_by("pk")
+    )
+    with transaction.atomic(using=sharding.PRIMARY):
+        for chunk in chunked(list(links), chunk_size):
+            movements = [
+                StockMovement(reagent_id=reagent_id, kind=StockMovement.CONSUMPTION, quantity=-volume,
+                              test_reagent_link_id=pk, reference=f"test {test_id}", recorded_at=now)
+                for pk, reagent_id, test_id, volume in chunk
+            ]
+            sharding.assign_ids(StockMovement, movements)
+            StockMovement._base_manager.using(sharding.PRIMARY).bulk_create(movements)
+            written["test_reagent_links"] += len(chunk)
+    rebuild_balances()
+    return written
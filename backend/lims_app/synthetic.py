@@ -0,0 +1,420 @@
+"""
+Reproducible synthetic data for load tests and benchmarks.
+
+The MSSQL script seeds only a handful of rows, which says nothing about how
+the API behaves with a year of laboratory data.  :func:`generate` fills
+every model with configurable volumes of realistic-looking rows:
+
+* counts are given per model (see :data:`DEFAULT_COUNTS`) and can be scaled
+  together, e.g. ``sample=1_000_000`` and ``sampletestlink=5_000_000``;
+* foreign keys fan out over the rows generated in the same run, and the
+  one-to-one subtype tables (``Analyst``, ``InProcess``, ...) follow their
+  parent's flags and ``sample_type``;
+* rows are built in chunks and written with ``bulk_create`` using explicit
+  primary keys, so memory stays flat and no IDs have to be read back;
+* the same seed and anchor date always produce the same data.
+
+``bulk_create`` bypasses model signals, so the dashboard summaries are
+rebuilt, opening stock-ledger entries written for the new samples and
+reagent usage, and the generations behind the response cache and the
+due-date calendars bumped at the end.
+"""
+
+from __future__ import annotations
+
+import datetime
+import random
+from decimal import Decimal
+
+from django.core.management.color import no_style
+from django.db import connection, transaction
+from django.db.models import Max
+
+from . import dashboard, stock
+from .bulk import parameter_limit
+from .caching import bump_generation
+from .duedates import DUE_DATE_FIELDS
+from .models import (
+    SOP,
+    Administrator,
+    Analyst,
+    Client,
+    Equipment,
+    FinishedProduct,
+    InProcess,
+    Location,
+    MaintenanceLog,
+    Reagent,
+    Sample,
+    SampleTestLink,
+    Stability,
+    Test,
+    TestEquipmentLink,
+    TestReagentLink,
+    UserAccount,
+    UserReagentAction,
+    UserSampleAction,
+    UserSOPAction,
+    VersionChange,
+    Warehouse,
+    WarehouseClientLink,
+)
+from .signals import CACHED_MODELS
+
+
+# Rows per model at ``scale=1``.  ``Analyst``, ``Administrator`` and the
+# sample subtype tables are derived from their parents and not listed.
+DEFAULT_COUNTS = {
+    "useraccount": 50,
+    "sop": 40,
+    "usersopaction": 200,
+    "client": 100,
+    "warehouse": 20,
+    "warehouseclientlink": 2_000,
+    "location": 50,
+    "equipment": 200,
+    "maintenancelog": 2_000,
+    "sample": 10_000,
+    "usersampleaction": 10_000,
+    "test": 100,
+    "sampletestlink": 50_000,
+    "testequipmentlink": 300,
+    "reagent": 1_000,
+    "userreagentaction": 2_000,
+    "testreagentlink": 500,
+    "versionchange": 200,
+}
+
+COUNTED_MODELS = (
+    UserAccount, SOP, UserSOPAction, Client, Warehouse, WarehouseClientLink, Location, Equipment,
+    MaintenanceLog, Sample, UserSampleAction, Test, SampleTestLink, TestEquipmentLink, Reagent,
+    UserReagentAction, TestReagentLink, VersionChange,
+)
+
+# Parent models that must have rows before a child model can be generated.
+DEPENDENCIES = {
+    "usersopaction": ("useraccount", "sop"),
+    "warehouse": ("sop",),
+    "warehouseclientlink": ("warehouse", "client"),
+    "equipment": ("location", "sop"),
+    "maintenancelog": ("equipment", "sop"),
+    "sample": ("location", "warehouse", "sop"),
+    "usersampleaction": ("useraccount", "sample"),
+    "test": ("useraccount", "sop"),
+    "sampletestlink": ("sample", "test"),
+    "testequipmentlink": ("test", "equipment"),
+    "reagent": ("sop",),
+    "userreagentaction": ("useraccount", "reagent"),
+    "testreagentlink": ("test", "reagent"),
+    "versionchange": ("sop",),
+}
+
+SAMPLE_TYPES = "ISF"
+PRODUCT_STAGES = ("raw material", "bulk", "intermediate", "packaged", "released")
+STORAGE_CONDITIONS = ("RT", "2-8C", "-20C", "-80C", "25/60")
+DEPARTMENTS = ("QC", "QA", "R&D", "Manufacturing", "Warehouse")
+LOCATION_TYPES = ("Lab", "Cold Room", "Freezer", "Storage", "Office")
+DELIVERY_SERVICES = ("UPS", "FedEx", "DHL", "Courier")
+EQUIPMENT_NAMES = ("HPLC", "GC", "Balance", "pH Meter", "Karl Fischer", "UV-Vis", "Dissolution Bath")
+REAGENT_NAMES = ("Sodium chloride", "Acetonitrile", "Methanol", "Phosphate buffer", "Hydrochloric acid")
+VENDORS = ("Sigma-Aldrich", "Fisher", "VWR", "Merck")
+ANALYSTS = tuple(f"analyst{i:02d}" for i in range(1, 41))
+
+# Fixed reference point so that runs on different days are comparable.
+ANCHOR = datetime.datetime(2025, 1, 1, tzinfo=datetime.timezone.utc)
+
+
+class Plan:
+    """ID ranges of the rows generated in this run."""
+
+    def __init__(self, rng: random.Random, anchor: datetime.datetime) -> None:
+        self.rng = rng
+        self.ranges: dict[str, tuple[int, int]] = {}
+        self.now = anchor
+
+    def start(self, key: str) -> int:
+        return self.ranges[key][0]
+
+    def pick(self, key: str) -> int:
+        start, count = self.ranges[key]
+        return start + self.rng.randrange(count)
+
+    def moment(self, days_back: int = 730) -> datetime.datetime:
+        return self.now - datetime.timedelta(seconds=self.rng.randrange(days_back * 86_400))
+
+    def day(self, days_back: int = 730, days_ahead: int = 0) -> datetime.date:
+        return self.now.date() + datetime.timedelta(days=self.rng.randint(-days_back, days_ahead))
+
+    def decimal(self, low: float, high: float, places: int = 6) -> Decimal:
+        return Decimal(f"{self.rng.uniform(low, high):.{places}f}")
+
+
+def _sample_type(index: int) -> str:
+    return SAMPLE_TYPES[index % len(SAMPLE_TYPES)]
+
+
+def _is_analyst(index: int) -> bool:
+    return index % 3 != 0
+
+
+def _is_administrator(index: int) -> bool:
+    return index % 5 == 0
+
+
+def _builders(plan: Plan) -> dict:
+    """Return ``{key: build(index, pk)}`` for every counted model."""
+    rng = plan.rng
+
+    def user(index, pk):
+        return UserAccount(
+            id=pk,
+            account_username=f"user{pk}",
+            first_name=f"First{pk}",
+            last_name=f"Last{pk}",
+            phone=f"555-{pk % 10_000:04d}",
+            email=f"user{pk}@example.com",
+            department=rng.choice(DEPARTMENTS),
+            training_completed=rng.random() < 0.9,
+            is_analyst=_is_analyst(index),
+            is_administrator=_is_administrator(index),
+        )
+
+    def sop(index, pk):
+        return SOP(
+            id=pk,
+            sop_name=f"SOP-{pk:06d}",
+            version_number=Decimal(f"{rng.randint(1, 9)}.{rng.randint(0, 9)}"),
+            effective_date=plan.day(1_500),
+        )
+
+    def sample(index, pk):
+        return Sample(
+            id=pk,
+            location_id=plan.pick("location"),
+            warehouse_id=plan.pick("warehouse"),
+            sop_id=plan.pick("sop"),
+            product_name=f"Product {rng.randrange(500):03d}",
+            product_stage=rng.choice(PRODUCT_STAGES),
+            quantity=Decimal(rng.randint(1, 500)),
+            time_received=plan.moment(),
+            sample_type=_sample_type(index),
+            storage_conditions=rng.choice(STORAGE_CONDITIONS),
+        )
+
+    def test(index, pk):
+        low = plan.decimal(0, 50, 2)
+        return Test(
+            id=pk,
+            user_account_id=plan.pick("useraccount"),
+            sop_id=plan.pick("sop"),
+            min_acceptable_result=low,
+            max_acceptable_result=low + plan.decimal(1, 50, 2),
+        )
+
+    def sample_test_link(index, pk):
+        return SampleTestLink(
+            id=pk,
+            sample_id=plan.pick("sample"),
+            test_id=plan.pick("test"),
+            testing_analyst=rng.choice(ANALYSTS),
+            reviewing_analyst=rng.choice(ANALYSTS),
+            test_result=plan.decimal(0, 120),
+            deadline=plan.moment(365) + datetime.timedelta(days=400),
+            pass_or_fail=rng.random() < 0.93,
+        )
+
+    def reagent(index, pk):
+        made = plan.day(1_000)
+        return Reagent(
+            id=pk,
+            sop_id=plan.pick("sop"),
+            reagent_name=rng.choice(REAGENT_NAMES),
+            cas_number=f"{rng.randint(50, 99999)}-{rng.randint(10, 99)}-{rng.randint(0, 9)}",
+            lot_number=f"LOT{pk:08d}",
+            vendor=rng.choice(VENDORS),
+            manufacturing_date=made,
+            expiration_date=made + datetime.timedelta(days=rng.randint(180, 1_460)),
+        )
+
+    def version_change(index, pk):
+        old = plan.day(1_500)
+        return VersionChange(
+            id=pk,
+            old_version_number=Decimal(f"{rng.randint(1, 8)}.0"),
+            new_version_number=Decimal(f"{rng.randint(1, 8)}.5"),
+            old_effective_date=old,
+            new_effective_date=old + datetime.timedelta(days=rng.randint(30, 720)),
+            sop_id=plan.pick("sop"),
+            change_date=old,
+        )
+
+    def maintenance_log(index, pk):
+        serviced = plan.day(730)
+        return MaintenanceLog(
+            id=pk,
+            equipment_id=plan.pick("equipment"),
+            sop_id=plan.pick("sop"),
+            service_date=serviced,
+            service_description="Routine calibration and inspection.",
+            service_interval=rng.choice(("3 months", "6 months", "1 year")),
+            next_service_date=serviced + datetime.timedelta(days=rng.choice((90, 180, 365))),
+        )
+
+    def shipment(index, pk):
+        shipped = plan.moment()
+        return WarehouseClientLink(
+            id=pk,
+            warehouse_id=plan.pick("warehouse"),
+            client_id=plan.pick("client"),
+            quantity_shipped=Decimal(rng.randint(1, 999)),
+            delivery_service=rng.choice(DELIVERY_SERVICES),
+            shipping_time=shipped,
+            delivery_time=shipped + datetime.timedelta(hours=rng.randint(4, 120)),
+            acceptable_delivery=rng.random() < 0.95,
+        )
+
+    return {
+        "useraccount": user,
+        "sop": sop,
+        "usersopaction": lambda index, pk: UserSOPAction(
+            id=pk,
+            user_account_id=plan.pick("useraccount"),
+            sop_id=plan.pick("sop"),
+            qa_author=rng.choice(ANALYSTS),
+            qa_reviewer=rng.choice(ANALYSTS),
+            qa_approver=rng.choice(ANALYSTS),
+        ),
+        "client": lambda index, pk: Client(id=pk, client_name=f"Client {pk}"),
+        "warehouse": lambda index, pk: Warehouse(
+            id=pk,
+            sop_id=plan.pick("sop"),
+            warehouse_technician=rng.choice(ANALYSTS),
+            warehouse_facility=f"Facility {pk}",
+            warehouse_company=f"Company {pk % 7}",
+        ),
+        "warehouseclientlink": shipment,
+        "location": lambda index, pk: Location(
+            id=pk, location_type=LOCATION_TYPES[index % len(LOCATION_TYPES)], room_number=pk
+        ),
+        "equipment": lambda index, pk: Equipment(
+            id=pk,
+            location_id=plan.pick("location"),
+            sop_id=plan.pick("sop"),
+            equipment_name=f"{rng.choice(EQUIPMENT_NAMES)} {pk}",
+            min_use_range=plan.decimal(0, 10),
+            max_use_range=plan.decimal(10, 1000),
+            in_use=rng.random() < 0.85,
+        ),
+        "maintenancelog": maintenance_log,
+        "sample": sample,
+        "usersampleaction": lambda index, pk: UserSampleAction(
+            id=pk,
+            user_account_id=plan.pick("useraccount"),
+            sample_id=plan.start("sample") + index % plan.ranges["sample"][1],
+            receiving_analyst=rng.choice(ANALYSTS),
+            aliquoting_analyst=rng.choice(ANALYSTS) if rng.random() < 0.5 else None,
+        ),
+        "test": test,
+        "sampletestlink": sample_test_link,
+        "testequipmentlink": lambda index, pk: TestEquipmentLink(
+            id=pk, test_id=plan.pick("test"), equipment_id=plan.pick("equipment")
+        ),
+        "reagent": reagent,
+        "userreagentaction": lambda index, pk: UserReagentAction(
+            id=pk,
+            user_account_id=plan.pick("useraccount"),
+            reagent_id=plan.pick("reagent"),
+            reagent_manager=rng.choice(ANALYSTS),
+        ),
+        "testreagentlink": lambda index, pk: TestReagentLink(
+            id=pk, test_id=plan.pick("test"), reagent_id=plan.pick("reagent"), volume_used=plan.decimal(0.1, 50)
+        ),
+        "versionchange": version_change,
+    }
+
+
+def _derived(plan: Plan) -> list[tuple]:
+    """One-to-one subtype rows: ``(model, count, build(index))`` per table."""
+    rng = plan.rng
+    users = plan.ranges.get("useraccount", (1, 0))
+    samples = plan.ranges.get("sample", (1, 0))
+
+    def subset(span, predicate):
+        start, count = span
+        return [start + index for index in range(count) if predicate(index)]
+
+    analysts = subset(users, _is_analyst)
+    administrators = subset(users, _is_administrator)
+    by_type = {kind: subset(samples, lambda index, kind=kind: _sample_type(index) == kind) for kind in SAMPLE_TYPES}
+    return [
+        (Analyst, analysts, lambda pk: Analyst(
+            user_account_id=pk, access_level=rng.randint(1, 5), analyst_supervisor=rng.choice(ANALYSTS)
+        )),
+        (Administrator, administrators, lambda pk: Administrator(
+            user_account_id=pk, is_supervisor=rng.random() < 0.3
+        )),
+        (InProcess, by_type["I"], lambda pk: InProcess(sample_id=pk, time_sampled=plan.moment())),
+        (Stability, by_type["S"], lambda pk: Stability(
+            sample_id=pk, stability_conditions=rng.choice(("25C/60%RH", "30C/65%RH", "40C/75%RH"))
+        )),
+        (FinishedProduct, by_type["F"], lambda pk: FinishedProduct(
+            sample_id=pk, product_lot_number=rng.randrange(10**9)
+        )),
+    ]
+
+
+def _write(model, objects: list) -> None:
+    batch_size = max(1, parameter_limit() // len(model._meta.concrete_fields))
+    with transaction.atomic():
+        model._base_manager.bulk_create(objects, batch_size=batch_size)
+
+
+def generate(counts: dict[str, int], seed: int = 0, chunk_size: int = 10_000, anchor=None, log=None) -> dict[str, int]:
+    """Insert synthetic rows; return the number of rows written per model.
+
+    Timestamps are spread around ``anchor`` (default :data:`ANCHOR`); pass
+    the current time to get data that is "recent" relative to today.
+    """
+    counts = {key: int(value) for key, value in counts.items() if int(value) > 0}
+    for key, parents in DEPENDENCIES.items():
+        missing = [parent for parent in parents if key in counts and parent not in counts]
+        if missing:
+            raise ValueError(f"{key} needs rows for {', '.join(missing)} in the same run.")
+    plan = Plan(random.Random(seed), anchor or ANCHOR)
+    builders = _builders(plan)
+    models = {model._meta.model_name: model for model in COUNTED_MODELS}
+    written: dict[str, int] = {}
+    for key, build in builders.items():
+        if key not in counts:
+            continue
+        model = models[key]
+        start = (model._base_manager.aggregate(top=Max("pk"))["top"] or 0) + 1
+        plan.ranges[key] = (start, counts[key])
+        for offset in range(0, counts[key], chunk_size):
+            stop = min(offset + chunk_size, counts[key])
+            _write(model, [build(index, start + index) for index in range(offset, stop)])
+        written[key] = counts[key]
+        if log:
+            log(f"{model.__name__}: {counts[key]} rows")
+    for model, parents, build in _derived(plan):
+        for offset in range(0, len(parents), chunk_size):
+            _write(model, [build(pk) for pk in parents[offset:offset + chunk_size]])
+        if parents:
+            written[model._meta.model_name] = len(parents)
+            if log:
+                log(f"{model.__name__}: {len(parents)} rows")
+    _reset_sequences(list(models.values()))
+    dashboard.rebuild_summaries()
+    stock.backfill_opening_entries(chunk_size)
+    for model in (*CACHED_MODELS, *DUE_DATE_FIELDS):
+        bump_generation(model)
+    return written
+
+
+def _reset_sequences(models) -> None:
+    """Move auto-increment sequences past the explicit IDs (no-op on SQLite)."""
+    statements = connection.ops.sequence_reset_sql(no_style(), list(models))
+    if statements:
+        with connection.cursor() as cursor:
+            for sql in statements:
+                cursor.execute(sql)
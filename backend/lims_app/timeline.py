@@ -0,0 +1,126 @@
+"""
+Chain-of-custody timeline of samples.
+
+Following one sample through the lab used to take a request per resource:
+the sample, its in-process/stability/finished-product record, the user
+sample actions, its test results, and then the equipment and reagents of
+each test through the link tables.  Viewsets that mix in
+:class:`TimelineMixin` serve the whole graph at once::
+
+    GET /api/samples/42/timeline/
+    GET /api/samples/timeline/?ids=42,43,44
+
+The response is the sample rendered as usual plus ``in_process``,
+``stability`` and ``finished_product`` (``null`` unless it is that type of
+sample), ``actions``, ``tests`` (each with its ``equipment`` and
+``reagents``), its stock ``movements`` (see ``stock.py``) and ``events``,
+the dated steps of all of them in chronological order.  ``?fields=`` and
+``?expand=`` narrow it as on the other endpoints.
+
+:func:`timeline_queryset` loads the graph with one ``select_related`` for
+the sample and its subtypes and one ``Prefetch`` per related table, so a
+timeline costs the same six queries whether it covers one sample with a
+handful of tests or ``TIMELINE_MAX_SAMPLES`` samples with thousands.
+SOPs, locations and warehouses come from the reference-data cache (see
+``refdata.py``).  With sample sharding (see ``sharding.py``) the batch is
+loaded with the same queries from each shard that holds some of the
+samples.
+"""
+
+from __future__ import annotations
+
+from django.conf import settings
+from django.db.models import Prefetch
+from rest_framework import exceptions
+from rest_framework.decorators import action
+from rest_framework.response import Response
+
+from . import sharding
+from .models import Sample, SampleTestLink, StockMovement, TestEquipmentLink, TestReagentLink, UserSampleAction
+from .serializers import SampleTimelineSerializer
+
+
+def timeline_queryset():
+    """Samples with every relation the timeline renders joined or prefetched."""
+    tests = (
+        SampleTestLink.objects.select_related("test__user_account")
+        .prefetch_related(
+            Prefetch(
+                "test__testequipmentlink_set",
+                queryset=TestEquipmentLink.objects.select_related("equipment").order_by("id"),
+            ),
+            Prefetch(
+                "test__testreagentlink_set",
+                queryset=TestReagentLink.objects.select_related("reagent").order_by("id"),
+            ),
+        )
+        .order_by("deadline", "id")
+    )
+    return Sample.objects.select_related("inprocess", "stability", "finishedproduct").prefetch_related(
+        Prefetch("usersampleaction_set", queryset=UserSampleAction.objects.select_related("user_account").order_by("id")),
+        Prefetch("sampletestlink_set", queryset=tests),
+        Prefetch("stockmovement_set", queryset=StockMovement.objects.order_by("recorded_at", "id")),
+    )
+
+
+def events(sample) -> list[dict]:
+    """The dated steps in the history of a prefetched ``sample``, oldest first."""
+    found = [{"at": sample.time_received, "event": "received", "id": sample.pk}]
+    in_process = getattr(sample, "inprocess", None)
+    if in_process is not None:
+        found.append({"at": in_process.time_sampled, "event": "sampled", "id": sample.pk})
+    for link in sample.sampletestlink_set.all():
+        found.append({"at": link.deadline, "event": "test", "id": link.pk})
+    for movement in sample.stockmovement_set.all():
+        found.append({"at": movement.recorded_at, "event": movement.kind, "id": movement.pk})
+    found.sort(key=lambda entry: entry["at"])
+    return [{**entry, "at": entry["at"].isoformat()} for entry in found]
+
+
+def max_samples() -> int:
+    return getattr(settings, "TIMELINE_MAX_SAMPLES", 100)
+
+
+def parse_ids(raw: str | None) -> list[int]:
+    """Parse ``?ids=1,2,3`` into distinct IDs in the order given."""
+    try:
+        ids = [int(part) for part in (raw or "").split(",") if part.strip()]
+    except ValueError:
+        raise exceptions.ValidationError({"ids": ["Enter a comma-separated list of sample IDs."]})
+    ids = list(dict.fromkeys(ids))
+    if not ids:
+        raise exceptions.ValidationError({"ids": ["This parameter is required."]})
+    if len(ids) > max_samples():
+        raise exceptions.ValidationError({"ids": [f"At most {max_samples()} samples per request."]})
+    return ids
+
+
+class TimelineMixin:
+    """Adds ``<resource>/<pk>/timeline/`` and ``<resource>/timeline/?ids=`` to the sample viewset."""
+
+    def render_timelines(self, samples) -> list[dict]:
+        serializer = SampleTimelineSerializer(samples, many=True, context=self.get_serializer_context())
+        return [
+            {**data, "events": events(sample)}
+            for data, sample in zip(serializer.data, samples)
+        ]
+
+    @action(detail=True, methods=["get"], url_path="timeline")
+    def timeline(self, request, pk=None, *args, **kwargs):
+        samples = list(timeline_queryset().filter(pk=pk)) if str(pk).isdigit() else []
+        if not samples:
+            raise exceptions.NotFound()
+        return Response(self.render_timelines(samples)[0])
+
+    @action(detail=False, methods=["get"], url_path="timeline")
+    def timelines(self, request, *args, **kwargs):
+        ids = parse_ids(request.query_params.get("ids"))
+        found = {}
+        for shard, pks in sharding.partition(Sample, ids).items():
+            with sharding.on_shard(shard):
+                found.update(timeline_queryset().in_bulk(pks))
+        samples = [found[pk] for pk in ids if pk in found]
+        return Response({
+            "results": self.render_timelines(samples),
+            "missing": [pk for pk in ids if pk not in found],
+        })
@@ -3,13 +3,14 @@ Routes for the LISMS API.
 
 This module wires up model view sets into a single router under the
 ``/api/`` prefix defined in ``lims_project/urls.py``.  Additional
-non‑standard endpoints for dashboard data are registered separately.
+non‑standard endpoints for dashboard data and the async read endpoints
+are registered separately.
 """
 
 from django.urls import include, path
 from rest_framework.routers import DefaultRouter
 
-from . import views
+from . import async_views, views
 
 
 # Create a router and register our viewsets.  The router automatically
@@ -39,10 +40,19 @@ router.register(r"reagents", views.ReagentViewSet)
 router.register(r"user-reagent-actions", views.UserReagentActionViewSet)
 router.register(r"test-reagent-links", views.TestReagentLinkViewSet)
 router.register(r"version-changes", views.VersionChangeViewSet)
+router.register(r"stock-movements", views.StockMovementViewSet)
+router.register(r"audit-entries", views.AuditEntryViewSet)
 
 urlpatterns = [
     path("", include(router.urls)),
     # Custom dashboard endpoints
     path("dashboard/warehouse-clients/", views.DashboardWarehouseClientsView.as_view(), name="dashboard-warehouse-clients"),
     path("dashboard/version-changes/", views.DashboardVersionChangeView.as_view(), name="dashboard-version-changes"),
+    path("dashboard/summary/", views.DashboardSummaryView.as_view(), name="dashboard-summary"),
+    path("analytics/test-results/", views.TestResultAnalyticsView.as_view(), name="analytics-test-results"),
+    # Async (ASGI) versions of the hot read endpoints, see async_views.py
+    path("async/samples/", async_views.AsyncSampleListView.as_view(), name="async-samples"),
+    path("async/sample-test-links/", async_views.AsyncSampleTestLinkListView.as_view(), name="async-sample-test-links"),
+    path("async/dashboard/warehouse-clients/", async_views.AsyncDashboardWarehouseClientsView.as_view(), name="async-dashboard-warehouse-clients"),
+    path("async/dashboard/version-changes/", async_views.AsyncDashboardVersionChangeView.as_view(), name="async-dashboard-version-changes"),
 ]
\ No newline at end of file
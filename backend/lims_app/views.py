@@ -2,21 +2,54 @@
 API views for the LISMS back end.
 
 Each model is exposed as a RESTful resource through a DRF ``ModelViewSet``.
+List endpoints are cursor-paginated (see ``pagination.py``); views whose
+natural order is not the primary key declare an ``ordering`` on an indexed
+column.  ``LimsModelViewSet`` joins whatever the serializer nests, so list
+endpoints run in a constant number of queries.  The high-volume resources
+also accept whitelisted query-parameter filters and ``?ordering=`` (see
+``filters.py``), each backed by an index in ``models.py``.  Samples and
+test results additionally accept batched writes at ``<resource>/bulk/``
+(see ``bulk.py``), and together with maintenance logs can be streamed out
+as NDJSON or CSV from ``<resource>/export/`` (see ``export.py``).
+Instrument result files of any size are imported as a stream at
+``sample-test-links/ingest/`` (see ``ingest.py``).
+Reagents and maintenance logs falling due in a date window are listed at
+``<resource>/due/`` from an in-process calendar (see ``duedates.py``).
+Stock of reagent lots and samples is kept in an append-only ledger with a
+running balance per item, read at ``<resource>/<pk>/stock/`` (see
+``stock.py``).  ``samples/<pk>/timeline/`` and ``samples/timeline/?ids=``
+return the chain of custody of samples in a fixed number of queries (see
+``timeline.py``).
+With ``DB_SHARDS`` set, samples and the rows that hang off them are
+stored on one shard per warehouse and their lists are gathered from all
+shards (see ``sharding.py``).
+Responses of the rarely-changing reference data (SOPs, clients,
+warehouses, locations and equipment) are cached and revalidated with
+ETags (see ``caching.py``).  Every write is audited (see ``audit.py``),
+and the trail is listed at ``audit-entries/``.  Deleting an SOP, sample
+or test retires it; ``?purge=true`` deletes it with everything below it
+in a few set-based statements (see ``retire.py`` and ``purge.py``).
 Additional endpoints provide aggregated data for dashboards, such as the
 number of clients per warehouse and the average time between SOP
-effective dates.
+effective dates.  Those are read from the summary tables maintained by
+``dashboard.py`` rather than aggregated over the raw tables per request.
+``dashboard/summary/`` returns all dashboard widgets at once, computed
+concurrently (see ``widgets.py``), and ``analytics/test-results/`` checks
+results against their acceptance limits and computes SPC statistics (see
+``analytics.py``).
 """
 
 from __future__ import annotations
 
-from django.db.models import Avg, Count, F, Func, Value
-from django.db.models.functions import Cast
-from rest_framework import viewsets
+from django.db import transaction
+from rest_framework import exceptions, viewsets
+from rest_framework.filters import OrderingFilter
 from rest_framework.response import Response
 from rest_framework.views import APIView
 
 from .models import (
     Administrator,
+    AuditEntry,
     Analyst,
     Client,
     Equipment,
@@ -29,6 +62,7 @@ from .models import (
     SampleTestLink,
     SOP,
     Stability,
+    StockMovement,
     Test,
     TestEquipmentLink,
     TestReagentLink,
@@ -42,6 +76,7 @@ from .models import (
 )
 from .serializers import (
     AdministratorSerializer,
+    AuditEntrySerializer,
     AnalystSerializer,
     ClientSerializer,
     EquipmentSerializer,
@@ -54,6 +89,7 @@ from .serializers import (
     SampleTestLinkSerializer,
     SOPSerializer,
     StabilitySerializer,
+    StockMovementSerializer,
     TestSerializer,
     TestEquipmentLinkSerializer,
     TestReagentLinkSerializer,
@@ -67,120 +103,296 @@ from .serializers import (
     DashboardWarehouseClientsSerializer,
     DashboardVersionChangeSerializer,
 )
-
-
-class UserAccountViewSet(viewsets.ModelViewSet):
+from . import analytics, audit, dashboard, sharding, stock, widgets
+from .bulk import BulkWriteMixin
+from .caching import CachedResponseMixin
+from .duedates import DueSoonMixin
+from .export import ExportMixin
+from .fastpath import CompiledListMixin
+from .fieldsets import FieldSpec
+from .filters import QueryParamFilterBackend
+from .ingest import IngestMixin
+from .querysets import optimize_queryset, plan_queryset
+from .retire import RetireMixin
+from .sharding import ShardedViewSetMixin
+from .stock import StockMixin
+from .timeline import TimelineMixin
+
+
+class LimsModelViewSet(CompiledListMixin, viewsets.ModelViewSet):
+    """Base class for the model viewsets exposed by the API.
+
+    The joins needed to render each row are derived from the serializer's
+    nested fields (see ``querysets.related_paths``), so a list response is
+    assembled in a constant number of queries however many rows it holds.
+    Viewsets therefore declare a plain ``queryset`` without hand-written
+    ``select_related`` calls.
+
+    Read requests may narrow the representation with ``?fields=``,
+    ``?expand=`` and ``?depth=`` (see ``fieldsets.py``); the queryset then
+    only joins the expanded relations and only loads the rendered columns.
+    Without them, list pages are read and assembled by the compiled
+    serializer (see ``fastpath.py``).
+
+    Creates, updates and deletes are audited (see ``audit.py``) and need an
+    ``X-Audit-Comment`` header.
+    """
+
+    def get_field_spec(self) -> FieldSpec | None:
+        if not hasattr(self, "_field_spec"):
+            self._field_spec = None
+            if self.request is not None and self.request.method in ("GET", "HEAD"):
+                self._field_spec = FieldSpec.from_query_params(self.request.query_params)
+        return self._field_spec
+
+    def get_serializer_context(self):
+        context = super().get_serializer_context()
+        context["field_spec"] = self.get_field_spec()
+        return context
+
+    def get_queryset(self):
+        queryset = super().get_queryset()
+        if self.get_field_spec() is None:
+            return optimize_queryset(queryset, self.get_serializer_class())
+        plan = plan_queryset(self.get_serializer())
+        # Cursor pagination reads the ordering columns from every row, so
+        # they must be loaded even when they are not rendered.
+        ordering = getattr(self, "ordering", None) or ()
+        if isinstance(ordering, str):
+            ordering = (ordering,)
+        for name in (*ordering, *getattr(self, "ordering_fields", ())):
+            name = name.lstrip("-")
+            if name != "pk":
+                plan.columns.append(name)
+        return plan.apply(queryset, defer=True)
+
+    def perform_create(self, serializer):
+        comment = audit.require_comment(self.request)
+        super().perform_create(serializer)
+        instance = serializer.instance
+        changes = audit.diff({}, audit.snapshot(instance))
+        audit.record(self.request, comment, type(instance), [(instance.pk, AuditEntry.CREATE, changes)])
+
+    def perform_update(self, serializer):
+        comment = audit.require_comment(self.request)
+        before = audit.snapshot(serializer.instance)
+        super().perform_update(serializer)
+        instance = serializer.instance
+        changes = audit.diff(before, audit.snapshot(instance))
+        if changes:
+            audit.record(self.request, comment, type(instance), [(instance.pk, AuditEntry.UPDATE, changes)])
+
+    def perform_destroy(self, instance):
+        comment = audit.require_comment(self.request)
+        pk, before = instance.pk, audit.snapshot(instance)
+        super().perform_destroy(instance)
+        audit.record(self.request, comment, type(instance), [(pk, AuditEntry.DELETE, audit.diff(before, {}))])
+
+
+class UserAccountViewSet(LimsModelViewSet):
     queryset = UserAccount.objects.all().order_by("id")
     serializer_class = UserAccountSerializer
 
 
-class AnalystViewSet(viewsets.ModelViewSet):
-    queryset = Analyst.objects.select_related("user_account").all()
+class AnalystViewSet(LimsModelViewSet):
+    queryset = Analyst.objects.all()
     serializer_class = AnalystSerializer
 
 
-class AdministratorViewSet(viewsets.ModelViewSet):
-    queryset = Administrator.objects.select_related("user_account").all()
+class AdministratorViewSet(LimsModelViewSet):
+    queryset = Administrator.objects.all()
     serializer_class = AdministratorSerializer
 
 
-class SOPViewSet(viewsets.ModelViewSet):
+class SOPViewSet(CachedResponseMixin, RetireMixin, LimsModelViewSet):
     queryset = SOP.objects.all()
     serializer_class = SOPSerializer
 
 
-class UserSOPActionViewSet(viewsets.ModelViewSet):
-    queryset = UserSOPAction.objects.select_related("user_account", "sop").all()
+class UserSOPActionViewSet(LimsModelViewSet):
+    queryset = UserSOPAction.objects.all()
     serializer_class = UserSOPActionSerializer
 
 
-class ClientViewSet(viewsets.ModelViewSet):
+class ClientViewSet(CachedResponseMixin, LimsModelViewSet):
     queryset = Client.objects.all()
     serializer_class = ClientSerializer
 
 
-class WarehouseViewSet(viewsets.ModelViewSet):
-    queryset = Warehouse.objects.select_related("sop").all()
+class WarehouseViewSet(CachedResponseMixin, LimsModelViewSet):
+    queryset = Warehouse.objects.all()
     serializer_class = WarehouseSerializer
 
 
-class WarehouseClientLinkViewSet(viewsets.ModelViewSet):
-    queryset = WarehouseClientLink.objects.select_related("warehouse", "client").all()
+class WarehouseClientLinkViewSet(LimsModelViewSet):
+    queryset = WarehouseClientLink.objects.all()
     serializer_class = WarehouseClientLinkSerializer
 
 
-class LocationViewSet(viewsets.ModelViewSet):
+class LocationViewSet(CachedResponseMixin, LimsModelViewSet):
     queryset = Location.objects.all()
     serializer_class = LocationSerializer
 
 
-class EquipmentViewSet(viewsets.ModelViewSet):
-    queryset = Equipment.objects.select_related("location", "sop").all()
+class EquipmentViewSet(CachedResponseMixin, LimsModelViewSet):
+    queryset = Equipment.objects.all()
     serializer_class = EquipmentSerializer
 
 
-class MaintenanceLogViewSet(viewsets.ModelViewSet):
-    queryset = MaintenanceLog.objects.select_related("equipment", "sop").all()
+class MaintenanceLogViewSet(DueSoonMixin, ExportMixin, LimsModelViewSet):
+    queryset = MaintenanceLog.objects.all()
     serializer_class = MaintenanceLogSerializer
-
-
-class SampleViewSet(viewsets.ModelViewSet):
-    queryset = Sample.objects.select_related("location", "warehouse", "sop").all()
+    ordering = ("-service_date", "-id")
+    filter_backends = [QueryParamFilterBackend, OrderingFilter]
+    filter_fields = {
+        "equipment": ("exact",),
+        "next_service_date": ("gte", "lte", "gt", "lt"),
+    }
+    ordering_fields = ["service_date", "next_service_date", "id"]
+
+
+class SampleViewSet(
+    ShardedViewSetMixin, TimelineMixin, StockMixin, BulkWriteMixin, RetireMixin, ExportMixin, LimsModelViewSet
+):
+    queryset = Sample.objects.all()
     serializer_class = SampleSerializer
-
-
-class InProcessViewSet(viewsets.ModelViewSet):
-    queryset = InProcess.objects.select_related("sample").all()
+    ordering = ("-time_received", "-id")
+    filter_backends = [QueryParamFilterBackend, OrderingFilter]
+    filter_fields = {
+        "sample_type": ("exact", "in"),
+        "product_stage": ("exact", "in"),
+        "warehouse": ("exact", "in"),
+        "location": ("exact", "in"),
+        "time_received": ("gte", "lte", "gt", "lt"),
+    }
+    ordering_fields = ["time_received", "id"]
+    bulk_upsert_keys = ("id",)
+    shard_key = "warehouse"
+
+    def bulk_created(self, objects):
+        # ``bulk_create`` sends no ``post_save``; see ``signals.sample_saved``.
+        stock.open_sample_stock(objects)
+
+
+class InProcessViewSet(ShardedViewSetMixin, LimsModelViewSet):
+    queryset = InProcess.objects.all()
     serializer_class = InProcessSerializer
 
 
-class StabilityViewSet(viewsets.ModelViewSet):
-    queryset = Stability.objects.select_related("sample").all()
+class StabilityViewSet(ShardedViewSetMixin, LimsModelViewSet):
+    queryset = Stability.objects.all()
     serializer_class = StabilitySerializer
 
 
-class FinishedProductViewSet(viewsets.ModelViewSet):
-    queryset = FinishedProduct.objects.select_related("sample").all()
+class FinishedProductViewSet(ShardedViewSetMixin, LimsModelViewSet):
+    queryset = FinishedProduct.objects.all()
     serializer_class = FinishedProductSerializer
 
 
-class UserSampleActionViewSet(viewsets.ModelViewSet):
-    queryset = UserSampleAction.objects.select_related("user_account", "sample").all()
+class UserSampleActionViewSet(ShardedViewSetMixin, LimsModelViewSet):
+    queryset = UserSampleAction.objects.all()
     serializer_class = UserSampleActionSerializer
 
 
-class TestViewSet(viewsets.ModelViewSet):
-    queryset = Test.objects.select_related("user_account", "sop").all()
+class TestViewSet(RetireMixin, LimsModelViewSet):
+    queryset = Test.objects.all()
     serializer_class = TestSerializer
 
 
-class SampleTestLinkViewSet(viewsets.ModelViewSet):
-    queryset = SampleTestLink.objects.select_related("sample", "test").all()
+class SampleTestLinkViewSet(ShardedViewSetMixin, BulkWriteMixin, IngestMixin, ExportMixin, LimsModelViewSet):
+    queryset = SampleTestLink.objects.all()
     serializer_class = SampleTestLinkSerializer
-
-
-class TestEquipmentLinkViewSet(viewsets.ModelViewSet):
-    queryset = TestEquipmentLink.objects.select_related("test", "equipment").all()
+    ordering = ("deadline", "id")
+    filter_backends = [QueryParamFilterBackend, OrderingFilter]
+    filter_fields = {
+        "sample": ("exact",),
+        "test": ("exact",),
+        "pass_or_fail": ("exact",),
+        "testing_analyst": ("exact",),
+        "deadline": ("gte", "lte", "gt", "lt"),
+    }
+    ordering_fields = ["deadline", "id"]
+    bulk_upsert_keys = ("sample", "test")
+
+
+class TestEquipmentLinkViewSet(LimsModelViewSet):
+    queryset = TestEquipmentLink.objects.all()
     serializer_class = TestEquipmentLinkSerializer
 
 
-class ReagentViewSet(viewsets.ModelViewSet):
-    queryset = Reagent.objects.select_related("sop").all()
+class ReagentViewSet(StockMixin, DueSoonMixin, LimsModelViewSet):
+    queryset = Reagent.objects.all()
     serializer_class = ReagentSerializer
+    ordering = ("id",)
+    filter_backends = [QueryParamFilterBackend, OrderingFilter]
+    filter_fields = {
+        "expiration_date": ("gte", "lte", "gt", "lt"),
+    }
+    ordering_fields = ["expiration_date", "id"]
 
 
-class UserReagentActionViewSet(viewsets.ModelViewSet):
-    queryset = UserReagentAction.objects.select_related("user_account", "reagent").all()
+class UserReagentActionViewSet(LimsModelViewSet):
+    queryset = UserReagentAction.objects.all()
     serializer_class = UserReagentActionSerializer
 
 
-class TestReagentLinkViewSet(viewsets.ModelViewSet):
-    queryset = TestReagentLink.objects.select_related("test", "reagent").all()
+class TestReagentLinkViewSet(LimsModelViewSet):
+    queryset = TestReagentLink.objects.all()
     serializer_class = TestReagentLinkSerializer
 
-
-class VersionChangeViewSet(viewsets.ModelViewSet):
-    queryset = VersionChange.objects.select_related("sop").all()
+    def perform_create(self, serializer):
+        # The usage is posted as consumption after the row is saved (see
+        # ``signals.py``); stock found short there must undo the save.
+        with transaction.atomic():
+            super().perform_create(serializer)
+
+    def perform_update(self, serializer):
+        with transaction.atomic():
+            super().perform_update(serializer)
+
+
+class StockMovementViewSet(ShardedViewSetMixin, LimsModelViewSet):
+    """The stock ledger is append-only: movements can be listed and posted only.
+
+    Sample movements are sharded with their sample; reagent movements stay
+    on the primary, so lists read the primary as well.
+    """
+
+    queryset = StockMovement.objects.all()
+    serializer_class = StockMovementSerializer
+    http_method_names = ["get", "post", "head", "options"]
+    ordering = ("id",)
+    filter_backends = [QueryParamFilterBackend]
+    filter_fields = {
+        "reagent": ("exact",),
+        "sample": ("exact",),
+    }
+
+    def get_list_shards(self):
+        if self.request.query_params.get("reagent"):
+            return [sharding.PRIMARY]
+        if self.request.query_params.get("sample"):
+            return super().get_list_shards()
+        return [*super().get_list_shards(), sharding.PRIMARY]
+
+
+class AuditEntryViewSet(LimsModelViewSet):
+    """The audit trail, newest first; narrowed to one row with ``?model=&object_id=``."""
+
+    queryset = AuditEntry.objects.all()
+    serializer_class = AuditEntrySerializer
+    http_method_names = ["get", "head", "options"]
+    ordering = ("-id",)
+    filter_backends = [QueryParamFilterBackend]
+    filter_fields = {
+        "model": ("exact",),
+        "object_id": ("exact",),
+        "recorded_at": ("gte", "lte", "gt", "lt"),
+    }
+
+
+class VersionChangeViewSet(LimsModelViewSet):
+    queryset = VersionChange.objects.all()
     serializer_class = VersionChangeSerializer
 
 
@@ -188,13 +400,8 @@ class DashboardWarehouseClientsView(APIView):
     """Returns the number of distinct clients served by each warehouse facility."""
 
     def get(self, request, format=None):  # type: ignore[override]
-        data = (
-            WarehouseClientLink.objects
-            .values("warehouse__warehouse_facility")
-            .annotate(total_clients=Count("client", distinct=True))
-            .order_by("-total_clients")
-        )
-        serializer = DashboardWarehouseClientsSerializer(data, many=True)
+        formatted = dashboard.format_warehouse_clients(dashboard.warehouse_clients_query())
+        serializer = DashboardWarehouseClientsSerializer(formatted, many=True)
         return Response(serializer.data)
 
 
@@ -202,23 +409,42 @@ class DashboardVersionChangeView(APIView):
     """Returns the average number of days between SOP effective date changes."""
 
     def get(self, request, format=None):  # type: ignore[override]
-        # Compute the difference in days between the old and new effective dates
-        data = (
-            VersionChange.objects
-            .annotate(days_between=Cast(F("new_effective_date"), models.DateField()) - Cast(F("old_effective_date"), models.DateField()))
-            .values("sop__sop_name")
-            .annotate(average_days_between_effective_dates=Avg(F("days_between")))
-            .order_by("sop__sop_name")
-        )
-        # Convert timedeltas to days (if aggregated as timedeltas).  The ORM will return
-        # ``datetime.timedelta`` objects for the average; extract the ``days`` attribute.
-        formatted = []
-        for item in data:
-            avg_period = item["average_days_between_effective_dates"]
-            days = avg_period.days if hasattr(avg_period, "days") else avg_period
-            formatted.append({
-                "sop_name": item["sop__sop_name"],
-                "average_days_between_effective_dates": days,
-            })
+        formatted = dashboard.format_version_changes(dashboard.version_changes_query())
         serializer = DashboardVersionChangeSerializer(formatted, many=True)
-        return Response(serializer.data)
\ No newline at end of file
+        return Response(serializer.data)
+
+
+class DashboardSummaryView(APIView):
+    """Returns every dashboard widget in one response (see ``widgets.py``).
+
+    ``?widgets=warehouse_clients,overdue_tests`` restricts the response to
+    the named widgets.
+    """
+
+    def get(self, request, format=None):  # type: ignore[override]
+        names = [name.strip() for name in request.query_params.get("widgets", "").split(",") if name.strip()]
+        unknown = [name for name in names if name not in widgets.registry]
+        if unknown:
+            raise exceptions.ValidationError({"widgets": [f"Unknown widget(s): {', '.join(unknown)}."]})
+        return Response(widgets.compute(names or None))
+
+
+class TestResultAnalyticsView(APIView):
+    """Per-test OOS flags and SPC statistics of the results (see ``analytics.py``).
+
+    Accepts ``?test=``, ``?test__in=``, ``?sop=`` and ``?deadline__gte=``-style
+    filters to narrow the analysed results.
+    """
+
+    filter_fields = {
+        "test": ("exact", "in"),
+        "deadline": ("gte", "lte", "gt", "lt"),
+    }
+
+    def get(self, request, format=None):  # type: ignore[override]
+        backend = QueryParamFilterBackend()
+        queryset = backend.filter_queryset(request, SampleTestLink.objects.all(), self)
+        conditions = backend.build_conditions(request.query_params, Test, {"sop": ("exact", "in")})
+        if conditions:
+            queryset = queryset.filter(**{f"test__{lookup}": value for lookup, value in conditions.items()})
+        return Response({"results": analytics.analyse(queryset)})
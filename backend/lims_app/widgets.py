@@ -0,0 +1,220 @@
+"""
+Dashboard widgets and the combined ``/api/dashboard/summary/`` endpoint.
+
+Each widget is a function registered with :func:`widget` that computes one
+aggregate for the dashboard page and returns JSON-ready data::
+
+    @widget("expiring_reagents")
+    def expiring_reagents(now):
+        ...
+
+``DashboardSummaryView`` runs every registered widget (or the ones named
+in ``?widgets=``) concurrently on a bounded, process-wide thread pool of
+``DASHBOARD_WORKERS`` threads.  Django connections are per thread, so each
+widget queries on its own database connection, and the page waits for
+the slowest aggregate rather than for the sum of them.  A widget that has
+not finished within its timeout (``DASHBOARD_WIDGET_TIMEOUT`` seconds
+unless it sets its own) or that raises is reported with ``"status":
+"timeout"`` or ``"error"`` while the others are still returned::
+
+    {
+        "complete": false,
+        "widgets": {
+            "warehouse_clients": {"status": "ok", "data": [...], "ms": 2.1},
+            "overdue_tests": {"status": "timeout", "ms": 5000.4},
+            ...
+        }
+    }
+
+A timed-out widget keeps its worker thread until its query returns, so
+the pool size also bounds how many slow aggregates can pile up.
+"""
+
+from __future__ import annotations
+
+import logging
+import threading
+import time
+from concurrent import futures
+from contextvars import copy_context
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import close_old_connections
+from django.db.models import Max
+from django.utils import timezone
+
+from . import dashboard, sharding
+from .models import MaintenanceLog, Reagent, SampleTestLink
+from .serializers import DashboardVersionChangeSerializer, DashboardWarehouseClientsSerializer
+
+
+logger = logging.getLogger(__name__)
+
+# Number of items listed by the widgets that return the soonest rows.
+TOP_ITEMS = 10
+
+
+class Widget:
+    def __init__(self, name: str, function, timeout: float | None = None) -> None:
+        self.name = name
+        self.function = function
+        self.timeout = timeout
+
+    def get_timeout(self) -> float:
+        if self.timeout is not None:
+            return self.timeout
+        return getattr(settings, "DASHBOARD_WIDGET_TIMEOUT", 5.0)
+
+
+registry: dict[str, Widget] = {}
+
+
+def widget(name: str, timeout: float | None = None):
+    """Register the decorated ``function(now)`` as dashboard widget ``name``."""
+
+    def decorator(function):
+        registry[name] = Widget(name, function, timeout)
+        return function
+
+    return decorator
+
+
+def horizon_days() -> int:
+    return getattr(settings, "DASHBOARD_HORIZON_DAYS", 30)
+
+
+# ---------------------------------------------------------------------------
+# Built-in widgets
+# ---------------------------------------------------------------------------
+
+@widget("warehouse_clients")
+def warehouse_clients(now):
+    rows = dashboard.format_warehouse_clients(dashboard.warehouse_clients_query())
+    return DashboardWarehouseClientsSerializer(rows, many=True).data
+
+
+@widget("version_changes")
+def version_changes(now):
+    rows = dashboard.format_version_changes(dashboard.version_changes_query())
+    return DashboardVersionChangeSerializer(rows, many=True).data
+
+
+@widget("overdue_tests")
+def overdue_tests(now):
+    """Failed results whose deadline has passed, and results due in the horizon.
+
+    The schema records no "in progress" state for a test, so a failing
+    result past its deadline is what still needs follow-up.  Both counts
+    are range scans of the ``(pass_or_fail, deadline)`` and
+    ``(deadline, id)`` indexes, summed over the shards when results are
+    sharded (see ``sharding.py``).
+    """
+    overdue = SampleTestLink.objects.filter(pass_or_fail=False, deadline__lt=now)
+    due_soon = SampleTestLink.objects.filter(deadline__gte=now, deadline__lt=now + timedelta(days=horizon_days()))
+    databases = sharding.databases_for(SampleTestLink)
+    return {
+        "overdue": sum(overdue.using(database).count() for database in databases),
+        "due_soon": sum(due_soon.using(database).count() for database in databases),
+        "horizon_days": horizon_days(),
+    }
+
+
+@widget("expiring_reagents")
+def expiring_reagents(now):
+    today = timezone.localdate(now)
+    horizon = today + timedelta(days=horizon_days())
+    expiring = Reagent.objects.filter(expiration_date__gte=today, expiration_date__lte=horizon)
+    return {
+        "expired": Reagent.objects.filter(expiration_date__lt=today).count(),
+        "expiring": expiring.count(),
+        "horizon_days": horizon_days(),
+        "soonest": list(
+            expiring.order_by("expiration_date", "id")
+            .values("id", "reagent_name", "lot_number", "expiration_date")[:TOP_ITEMS]
+        ),
+    }
+
+
+@widget("equipment_due_for_service")
+def equipment_due_for_service(now):
+    """Equipment whose latest scheduled service falls before the horizon."""
+    horizon = timezone.localdate(now) + timedelta(days=horizon_days())
+    due = (
+        MaintenanceLog.objects
+        .values("equipment")
+        .annotate(next_service_date=Max("next_service_date"))
+        .filter(next_service_date__lte=horizon)
+    )
+    return {
+        "due": due.count(),
+        "horizon_days": horizon_days(),
+        "soonest": [
+            {
+                "equipment": row["equipment"],
+                "equipment_name": row["equipment__equipment_name"],
+                "next_service_date": row["next_service_date"],
+            }
+            for row in due.values("equipment", "equipment__equipment_name", "next_service_date")
+            .order_by("next_service_date", "equipment")[:TOP_ITEMS]
+        ],
+    }
+
+
+# ---------------------------------------------------------------------------
+# Fan-out
+# ---------------------------------------------------------------------------
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def get_executor() -> futures.ThreadPoolExecutor:
+    global _executor
+    if _executor is None:
+        with _executor_lock:
+            if _executor is None:
+                _executor = futures.ThreadPoolExecutor(
+                    max_workers=getattr(settings, "DASHBOARD_WORKERS", 4),
+                    thread_name_prefix="dashboard-widget",
+                )
+    return _executor
+
+
+def _run(item: Widget, now) -> tuple:
+    start = time.perf_counter()
+    try:
+        return item.function(now), time.perf_counter() - start
+    finally:
+        # Worker threads outlive requests; release their connections the
+        # way the request cycle does.
+        close_old_connections()
+
+
+def compute(names=None, now=None) -> dict:
+    """Run the named widgets (default: all) concurrently; see the module docstring."""
+    now = now or timezone.now()
+    selected = [registry[name] for name in (names or registry)]
+    executor = get_executor()
+    start = time.perf_counter()
+    # Each widget runs in a copy of the request's context so that the query
+    # metrics of the request (see ``middleware.py``) include its queries.
+    pending = {item.name: executor.submit(copy_context().run, _run, item, now) for item in selected}
+    results = {}
+    for item in selected:
+        future = pending[item.name]
+        remaining = item.get_timeout() - (time.perf_counter() - start)
+        try:
+            data, seconds = future.result(timeout=max(remaining, 0))
+        except futures.TimeoutError:
+            future.cancel()
+            results[item.name] = {"status": "timeout", "ms": round((time.perf_counter() - start) * 1000, 1)}
+        except Exception:
+            logger.exception("Dashboard widget %s failed", item.name)
+            results[item.name] = {"status": "error"}
+        else:
+            results[item.name] = {"status": "ok", "data": data, "ms": round(seconds * 1000, 1)}
+    return {
+        "complete": all(result["status"] == "ok" for result in results.values()),
+        "widgets": results,
+    }
@@ -12,6 +12,7 @@ credentials.
 from __future__ import annotations
 
 import os
+import tempfile
 from pathlib import Path
 
 
@@ -45,6 +46,9 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    # Outermost so that its timings cover the rest of the stack.
+    "lims_app.middleware.RequestMetricsMiddleware",
+    "lims_app.routers.ReplicaRoutingMiddleware",
     "corsheaders.middleware.CorsMiddleware",
     "django.middleware.security.SecurityMiddleware",
     "django.contrib.sessions.middleware.SessionMiddleware",
@@ -105,6 +109,47 @@ DATABASES = {
     }
 }
 
+# Read replicas (see ``lims_app/routers.py``).  ``DB_REPLICAS`` is a
+# comma-separated list of replica hosts that share the credentials above
+# (with SQLite: of database files); they become the aliases ``replica1``,
+# ``replica2``, ...  Safe-method requests read from a healthy replica;
+# a client that writes reads from the primary for the next
+# ``REPLICA_STICKY_SECONDS``.  A replica is skipped while it is unreachable
+# or its heartbeat lags by more than ``REPLICA_MAX_LAG_SECONDS`` (0 only
+# checks that it is reachable); both are checked every
+# ``REPLICA_CHECK_INTERVAL`` seconds.
+DATABASE_REPLICAS = []
+for _index, _target in enumerate(filter(None, map(str.strip, os.environ.get("DB_REPLICAS", "").split(","))), 1):
+    _key = "NAME" if DATABASES["default"]["ENGINE"].endswith("sqlite3") else "HOST"
+    DATABASES[f"replica{_index}"] = {**DATABASES["default"], _key: _target, "TEST": {"MIRROR": "default"}}
+    DATABASE_REPLICAS.append(f"replica{_index}")
+REPLICA_STICKY_SECONDS = float(os.environ.get("REPLICA_STICKY_SECONDS", "5"))
+REPLICA_MAX_LAG_SECONDS = float(os.environ.get("REPLICA_MAX_LAG_SECONDS", "30"))
+REPLICA_CHECK_INTERVAL = float(os.environ.get("REPLICA_CHECK_INTERVAL", "5"))
+
+# Sharding of the sample data by warehouse (see ``lims_app/sharding.py``).
+# ``DB_SHARDS`` lists the shard hosts (with SQLite: database files) as
+# above; they become the aliases ``shard1``, ``shard2``, ...  A sample and
+# its results, actions and stock are stored on
+# ``SAMPLE_SHARDS[warehouse_id % len(SAMPLE_SHARDS)]`` unless
+# ``WAREHOUSE_SHARDS`` ("<warehouse id>:<alias>,...") places its warehouse
+# explicitly.  ``SHARD_WORKERS`` threads query the shards of a list
+# request concurrently, and IDs are reserved ``SHARD_ID_BLOCK`` at a time.
+SAMPLE_SHARDS = []
+for _index, _target in enumerate(filter(None, map(str.strip, os.environ.get("DB_SHARDS", "").split(","))), 1):
+    _key = "NAME" if DATABASES["default"]["ENGINE"].endswith("sqlite3") else "HOST"
+    DATABASES[f"shard{_index}"] = {**DATABASES["default"], _key: _target}
+    SAMPLE_SHARDS.append(f"shard{_index}")
+WAREHOUSE_SHARDS = {
+    int(_warehouse): _alias.strip()
+    for _warehouse, _, _alias in (
+        _entry.partition(":") for _entry in filter(None, map(str.strip, os.environ.get("WAREHOUSE_SHARDS", "").split(",")))
+    )
+}
+SHARD_WORKERS = int(os.environ.get("SHARD_WORKERS", "8"))
+SHARD_ID_BLOCK = int(os.environ.get("SHARD_ID_BLOCK", "100"))
+DATABASE_ROUTERS = ["lims_app.sharding.ShardRouter", "lims_app.routers.ReplicaRouter"]
+
 # Internationalization
 LANGUAGE_CODE = "en-us"
 TIME_ZONE = os.environ.get("DJANGO_TIME_ZONE", "UTC")
@@ -131,6 +176,120 @@ REST_FRAMEWORK = {
     "DEFAULT_PERMISSION_CLASSES": (
         "rest_framework.permissions.IsAuthenticated",
     ),
+    # List endpoints return ``{"next", "previous", "results"}`` pages using
+    # keyset pagination on each view's ``ordering``.
+    "DEFAULT_PAGINATION_CLASS": "lims_app.pagination.LimsCursorPagination",
+    "PAGE_SIZE": int(os.environ.get("API_PAGE_SIZE", "100")),
+    # Compiled list pages are encoded with orjson when it is installed;
+    # everything else is rendered exactly as by DRF's ``JSONRenderer``.
+    "DEFAULT_RENDERER_CLASSES": (
+        "lims_app.fastpath.CompiledJSONRenderer",
+        "rest_framework.renderers.BrowsableAPIRenderer",
+    ),
+}
+
+# List endpoints render through the compiled serializers of
+# ``lims_app/fastpath.py`` where possible.
+API_COMPILED_READS = os.environ.get("API_COMPILED_READS", "True").lower() in {"1", "true", "yes"}
+
+# Upper bound for the ``?page_size=`` query parameter on list endpoints.
+API_MAX_PAGE_SIZE = int(os.environ.get("API_MAX_PAGE_SIZE", "500"))
+
+# Bulk write endpoints (``<resource>/bulk/``).  Statements are chunked to
+# stay below SQL Server's limit of 2100 bind parameters per query.
+BULK_MAX_ROWS = int(os.environ.get("BULK_MAX_ROWS", "5000"))
+BULK_PARAMETER_LIMIT = int(os.environ.get("BULK_PARAMETER_LIMIT", "2000"))
+
+# Rows fetched per database round-trip by the streaming ``export/`` endpoints.
+EXPORT_CHUNK_SIZE = int(os.environ.get("EXPORT_CHUNK_SIZE", "2000"))
+
+# Imports of instrument result files (see ``lims_app/ingest.py``).  Files
+# are read ``INGEST_CHUNK_ROWS`` rows at a time and checked on a pool of
+# ``INGEST_WORKERS`` processes (0 checks in the importing process); the
+# upload endpoint reports at most ``INGEST_MAX_REPORTED_REJECTS`` rejected
+# rows.
+INGEST_CHUNK_ROWS = int(os.environ.get("INGEST_CHUNK_ROWS", "2000"))
+INGEST_WORKERS = int(os.environ.get("INGEST_WORKERS", "2"))
+INGEST_MAX_REPORTED_REJECTS = int(os.environ.get("INGEST_MAX_REPORTED_REJECTS", "1000"))
+
+# Rows deleted per statement when SOPs, samples or tests are purged (see
+# ``lims_app/purge.py``).  Kept below 5000, the number of row locks at
+# which SQL Server escalates to a table lock.
+PURGE_BATCH_SIZE = int(os.environ.get("PURGE_BATCH_SIZE", "4000"))
+
+# Cache used for API responses and their invalidation counters (see
+# ``lims_app/caching.py``).  The file-based backend is shared by every
+# worker process on the host, so a write handled by one worker invalidates
+# the entries seen by the others; a local-memory cache is only safe with a
+# single worker process.
+CACHES = {
+    "default": {
+        "BACKEND": os.environ.get(
+            "API_CACHE_BACKEND", "django.core.cache.backends.filebased.FileBasedCache"
+        ),
+        "LOCATION": os.environ.get(
+            "API_CACHE_LOCATION", os.path.join(tempfile.gettempdir(), "lisms_api_cache")
+        ),
+    }
+}
+API_CACHE_ALIAS = "default"
+API_CACHE_ENABLED = os.environ.get("API_CACHE_ENABLED", "True").lower() in {"1", "true", "yes"}
+# Seconds a cached response is kept; invalidation does not depend on it.
+API_CACHE_TIMEOUT = int(os.environ.get("API_CACHE_TIMEOUT", "300"))
+
+# ``/api/dashboard/summary/`` computes its widgets on a pool of
+# ``DASHBOARD_WORKERS`` threads, each with its own database connection, and
+# reports a widget as timed out after ``DASHBOARD_WIDGET_TIMEOUT`` seconds.
+# ``DASHBOARD_HORIZON_DAYS`` is how far ahead "due soon" widgets look.
+DASHBOARD_WORKERS = int(os.environ.get("DASHBOARD_WORKERS", "4"))
+DASHBOARD_WIDGET_TIMEOUT = float(os.environ.get("DASHBOARD_WIDGET_TIMEOUT", "5"))
+DASHBOARD_HORIZON_DAYS = int(os.environ.get("DASHBOARD_HORIZON_DAYS", "30"))
+
+# Default window, in days from today, of the ``<resource>/due/`` endpoints.
+DUE_SOON_DAYS = int(os.environ.get("DUE_SOON_DAYS", "30"))
+
+# Most samples one ``samples/timeline/?ids=`` request may ask for.
+TIMELINE_MAX_SAMPLES = int(os.environ.get("TIMELINE_MAX_SAMPLES", "100"))
+
+# Rows fetched per database round-trip by the results analytics endpoint.
+ANALYTICS_CHUNK_SIZE = int(os.environ.get("ANALYTICS_CHUNK_SIZE", "20000"))
+
+# Audit trail of API writes (see ``lims_app/audit.py``).  Entries are
+# inserted by a background thread in batches of up to ``AUDIT_BATCH_SIZE``
+# at least every ``AUDIT_FLUSH_INTERVAL`` seconds; when the queue of
+# ``AUDIT_QUEUE_SIZE`` entries is full or the database is unavailable they
+# are spooled to ``AUDIT_SPOOL_DIR`` and replayed later.
+AUDIT_REQUIRE_COMMENT = os.environ.get("AUDIT_REQUIRE_COMMENT", "True").lower() in {"1", "true", "yes"}
+AUDIT_ASYNC = os.environ.get("AUDIT_ASYNC", "True").lower() in {"1", "true", "yes"}
+AUDIT_QUEUE_SIZE = int(os.environ.get("AUDIT_QUEUE_SIZE", "20000"))
+AUDIT_BATCH_SIZE = int(os.environ.get("AUDIT_BATCH_SIZE", "500"))
+AUDIT_FLUSH_INTERVAL = float(os.environ.get("AUDIT_FLUSH_INTERVAL", "1"))
+AUDIT_SPOOL_DIR = os.environ.get("AUDIT_SPOOL_DIR", str(BASE_DIR / "audit-spool"))
+
+# Per-view latency/query histograms served at ``/metrics`` (see
+# ``lims_app/metrics.py``).  Set ``METRICS_SLOW_REQUEST_MS`` and/or
+# ``METRICS_SLOW_REQUEST_QUERIES`` to log slow or query-heavy requests with
+# their SQL to the ``lims_app.slow_requests`` logger.
+METRICS_ENABLED = os.environ.get("METRICS_ENABLED", "True").lower() in {"1", "true", "yes"}
+METRICS_ALLOWED_IPS = tuple(
+    address.strip()
+    for address in os.environ.get("METRICS_ALLOWED_IPS", "127.0.0.1,::1").split(",")
+    if address.strip()
+)
+METRICS_SLOW_REQUEST_MS = (
+    int(os.environ["METRICS_SLOW_REQUEST_MS"]) if os.environ.get("METRICS_SLOW_REQUEST_MS") else None
+)
+METRICS_SLOW_REQUEST_QUERIES = (
+    int(os.environ["METRICS_SLOW_REQUEST_QUERIES"]) if os.environ.get("METRICS_SLOW_REQUEST_QUERIES") else None
+)
+
+LOGGING = {
+    "version": 1,
+    "disable_existing_loggers": False,
+    "handlers": {"console": {"class": "logging.StreamHandler"}},
+    "loggers": {
+        "lims_app.slow_requests": {"handlers": ["console"], "level": "WARNING", "propagate": False},
+    },
 }
 
 # CORS configuration.  The React front end runs on http://localhost:3000
@@ -145,4 +304,21 @@ CORS_ALLOWED_ORIGINS = [
 # ``Auth0JWTAuthentication`` class will reference these values.
 AUTH0_DOMAIN = os.environ.get("AUTH0_DOMAIN", "YOUR_AUTH0_DOMAIN")
 AUTH0_API_AUDIENCE = os.environ.get("AUTH0_API_AUDIENCE", "YOUR_AUTH0_API_AUDIENCE")
-AUTH0_ALGORITHMS = ["RS256"]
\ No newline at end of file
+AUTH0_ALGORITHMS = ["RS256"]
+
+# Signing keys are fetched from the JWKS endpoint and cached in-process for
+# ``AUTH0_JWKS_CACHE_TTL`` seconds.  Point ``AUTH0_JWKS_FILE`` at a copy of
+# the key set to serve as a fallback when the endpoint is unreachable; for
+# air-gapped deployments set ``AUTH0_JWKS_URL`` to an empty string so that
+# only the file is used.
+AUTH0_JWKS_URL = os.environ.get(
+    "AUTH0_JWKS_URL", f"https://{AUTH0_DOMAIN}/.well-known/jwks.json"
+)
+AUTH0_JWKS_FILE = os.environ.get("AUTH0_JWKS_FILE") or None
+AUTH0_JWKS_CACHE_TTL = int(os.environ.get("AUTH0_JWKS_CACHE_TTL", "3600"))
+# Minimum number of seconds between refreshes triggered by unknown key IDs.
+AUTH0_JWKS_MIN_REFRESH_INTERVAL = int(os.environ.get("AUTH0_JWKS_MIN_REFRESH_INTERVAL", "30"))
+AUTH0_JWKS_TIMEOUT = int(os.environ.get("AUTH0_JWKS_TIMEOUT", "5"))
+# Number of verified token payloads remembered (until their ``exp``) so the
+# signature check is skipped for repeat requests.  Set to 0 to disable.
+AUTH0_TOKEN_CACHE_SIZE = int(os.environ.get("AUTH0_TOKEN_CACHE_SIZE", "1024"))
\ No newline at end of file
@@ -4,14 +4,18 @@ URL configuration for the LISMS back end.
 The ``urlpatterns`` list routes incoming HTTP requests to the appropriate view.
 All REST API endpoints are namespaced under ``/api/`` and defined in
 ``lims_app/urls.py``.  The built‑in Django admin is available under
-``/admin/`` for data inspection and management.
+``/admin/`` for data inspection and management, and request metrics are
+exposed in the Prometheus text format at ``/metrics`` for local scrapers.
 """
 
 from django.contrib import admin
 from django.urls import include, path
 
+from lims_app.metrics import metrics_view
+
 
 urlpatterns = [
     path("admin/", admin.site.urls),
     path("api/", include("lims_app.urls")),
+    path("metrics", metrics_view, name="metrics"),
 ]
\ No newline at end of file
@@ -0,0 +1,22 @@
+import React from 'react';
+import Box from '@mui/material/Box';
+import Button from '@mui/material/Button';
+
+/**
+ * Button shown beneath paginated tables to fetch the next page of rows.
+ * Renders nothing once the last page has been loaded.
+ */
+function LoadMoreButton({ hasMore, loading, onClick }) {
+  if (!hasMore) {
+    return null;
+  }
+  return (
+    <Box sx={{ display: 'flex', justifyContent: 'center', mt: 2 }}>
+      <Button variant="outlined" onClick={onClick} disabled={loading}>
+        {loading ? 'Loading…' : 'Load more'}
+      </Button>
+    </Box>
+  );
+}
+
+export default LoadMoreButton;
@@ -0,0 +1,56 @@
+import { useCallback, useEffect, useState } from 'react';
+import axios from 'axios';
+import { useAuth0 } from '@auth0/auth0-react';
+import config from '../config';
+
+/**
+ * Loads a cursor-paginated list endpoint one page at a time.
+ *
+ * The back end returns ``{ next, previous, results }`` pages.  The first
+ * page is requested when the component mounts; ``loadMore`` follows the
+ * ``next`` link and appends its rows, so large tables are fetched
+ * incrementally instead of in a single response.
+ *
+ * @param {string} path API path relative to ``config.apiBaseUrl`` (e.g. ``/samples/``)
+ */
+function usePaginatedList(path) {
+  const { getAccessTokenSilently } = useAuth0();
+  const [items, setItems] = useState([]);
+  const [next, setNext] = useState(null);
+  const [loading, setLoading] = useState(false);
+  const [error, setError] = useState(null);
+
+  const loadPage = useCallback(
+    async (url, append) => {
+      setLoading(true);
+      try {
+        const token = await getAccessTokenSilently();
+        const resp = await axios.get(url, {
+          headers: { Authorization: `Bearer ${token}` },
+        });
+        setItems((prev) => (append ? [...prev, ...resp.data.results] : resp.data.results));
+        setNext(resp.data.next);
+      } catch (err) {
+        console.error(err);
+        setError(err);
+      } finally {
+        setLoading(false);
+      }
+    },
+    [getAccessTokenSilently]
+  );
+
+  useEffect(() => {
+    loadPage(`${config.apiBaseUrl}${path}`, false);
+  }, [path, loadPage]);
+
+  const loadMore = useCallback(() => {
+    if (next && !loading) {
+      loadPage(next, true);
+    }
+  }, [next, loading, loadPage]);
+
+  return { items, error, loading, hasMore: Boolean(next), loadMore };
+}
+
+export default usePaginatedList;
@@ -26,8 +26,7 @@ ChartJS.register(CategoryScale, LinearScale, BarElement, Title, Tooltip, Legend)
  */
 function Dashboard() {
   const { getAccessTokenSilently } = useAuth0();
-  const [warehouseData, setWarehouseData] = useState([]);
-  const [versionChangeData, setVersionChangeData] = useState([]);
+  const [widgets, setWidgets] = useState({});
   const [error, setError] = useState(null);
 
   useEffect(() => {
@@ -37,18 +36,10 @@ function Dashboard() {
         const headers = {
           Authorization: `Bearer ${token}`,
         };
-        // Fetch warehouse clients aggregated data
-        const warehouseResp = await axios.get(
-          `${config.apiBaseUrl}/dashboard/warehouse-clients/`,
-          { headers }
-        );
-        setWarehouseData(warehouseResp.data);
-        // Fetch version change aggregated data
-        const versionResp = await axios.get(
-          `${config.apiBaseUrl}/dashboard/version-changes/`,
-          { headers }
-        );
-        setVersionChangeData(versionResp.data);
+        // All widgets arrive in one response; each one carries its own
+        // status, so a slow or failing aggregate does not hide the others.
+        const resp = await axios.get(`${config.apiBaseUrl}/dashboard/summary/`, { headers });
+        setWidgets(resp.data.widgets);
       } catch (err) {
         console.error(err);
         setError(err);
@@ -57,6 +48,32 @@ function Dashboard() {
     fetchData();
   }, [getAccessTokenSilently]);
 
+  const widgetData = (name, fallback) =>
+    widgets[name] && widgets[name].status === 'ok' ? widgets[name].data : fallback;
+  const unavailable = Object.keys(widgets).filter((name) => widgets[name].status !== 'ok');
+  const warehouseData = widgetData('warehouse_clients', []);
+  const versionChangeData = widgetData('version_changes', []);
+  const overdueTests = widgetData('overdue_tests', null);
+  const expiringReagents = widgetData('expiring_reagents', null);
+  const equipmentDue = widgetData('equipment_due_for_service', null);
+  const kpis = [
+    {
+      title: 'Failed Tests Past Deadline',
+      value: overdueTests && overdueTests.overdue,
+      detail: overdueTests && `${overdueTests.due_soon} due in the next ${overdueTests.horizon_days} days`,
+    },
+    {
+      title: 'Expiring Reagents',
+      value: expiringReagents && expiringReagents.expiring,
+      detail: expiringReagents && `${expiringReagents.expired} already expired`,
+    },
+    {
+      title: 'Equipment Due for Service',
+      value: equipmentDue && equipmentDue.due,
+      detail: equipmentDue && `within ${equipmentDue.horizon_days} days`,
+    },
+  ];
+
   const warehouseChartData = {
     labels: warehouseData.map((item) => item.warehouse_facility),
     datasets: [
@@ -115,6 +132,28 @@ function Dashboard() {
           Error loading data: {error.message}
         </Typography>
       )}
+      {unavailable.length > 0 && (
+        <Typography color="error" sx={{ mb: 2 }}>
+          Some dashboard data could not be loaded: {unavailable.join(', ')}
+        </Typography>
+      )}
+      <Grid container spacing={4} sx={{ mb: 4 }}>
+        {kpis.map((kpi) => (
+          <Grid item xs={12} md={4} key={kpi.title}>
+            <Card>
+              <CardContent>
+                <Typography variant="subtitle2" color="text.secondary" gutterBottom>
+                  {kpi.title}
+                </Typography>
+                <Typography variant="h4">{kpi.value ?? '–'}</Typography>
+                <Typography variant="body2" color="text.secondary">
+                  {kpi.detail || ''}
+                </Typography>
+              </CardContent>
+            </Card>
+          </Grid>
+        ))}
+      </Grid>
       <Grid container spacing={4}>
         <Grid item xs={12} md={6}>
           <Card>
@@ -1,6 +1,4 @@
-import React, { useEffect, useState } from 'react';
-import axios from 'axios';
-import { useAuth0 } from '@auth0/auth0-react';
+import React from 'react';
 import Box from '@mui/material/Box';
 import Typography from '@mui/material/Typography';
 import Table from '@mui/material/Table';
@@ -11,35 +9,23 @@ import TableHead from '@mui/material/TableHead';
 import TableRow from '@mui/material/TableRow';
 import Paper from '@mui/material/Paper';
 import Grid from '@mui/material/Grid';
-import config from '../config';
+import LoadMoreButton from '../components/LoadMoreButton';
+import usePaginatedList from '../hooks/usePaginatedList';
 
 /**
  * Displays equipment and maintenance logs.
  */
 function EquipmentPage() {
-  const { getAccessTokenSilently } = useAuth0();
-  const [equipment, setEquipment] = useState([]);
-  const [logs, setLogs] = useState([]);
-  const [error, setError] = useState(null);
-
-  useEffect(() => {
-    async function loadData() {
-      try {
-        const token = await getAccessTokenSilently();
-        const headers = { Authorization: `Bearer ${token}` };
-        const [equipResp, logsResp] = await Promise.all([
-          axios.get(`${config.apiBaseUrl}/equipment/`, { headers }),
-          axios.get(`${config.apiBaseUrl}/maintenance-logs/`, { headers }),
-        ]);
-        setEquipment(equipResp.data);
-        setLogs(logsResp.data);
-      } catch (err) {
-        console.error(err);
-        setError(err);
-      }
-    }
-    loadData();
-  }, [getAccessTokenSilently]);
+  const equipmentList = usePaginatedList(
+    '/equipment/?fields=id,equipment_name,location.location_type,location.room_number,' +
+      'min_use_range,max_use_range,in_use'
+  );
+  const logList = usePaginatedList(
+    '/maintenance-logs/?fields=id,equipment.equipment_name,service_date,next_service_date,service_interval'
+  );
+  const equipment = equipmentList.items;
+  const logs = logList.items;
+  const error = equipmentList.error || logList.error;
 
   return (
     <Box sx={{ p: 3 }}>
@@ -84,6 +70,11 @@ function EquipmentPage() {
               </TableBody>
             </Table>
           </TableContainer>
+          <LoadMoreButton
+            hasMore={equipmentList.hasMore}
+            loading={equipmentList.loading}
+            onClick={equipmentList.loadMore}
+          />
         </Grid>
         <Grid item xs={12} md={6}>
           <Typography variant="h6" gutterBottom>
@@ -113,6 +104,7 @@ function EquipmentPage() {
               </TableBody>
             </Table>
           </TableContainer>
+          <LoadMoreButton hasMore={logList.hasMore} loading={logList.loading} onClick={logList.loadMore} />
         </Grid>
       </Grid>
     </Box>
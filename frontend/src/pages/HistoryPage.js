@@ -1,6 +1,4 @@
-import React, { useEffect, useState } from 'react';
-import axios from 'axios';
-import { useAuth0 } from '@auth0/auth0-react';
+import React from 'react';
 import Box from '@mui/material/Box';
 import Typography from '@mui/material/Typography';
 import Table from '@mui/material/Table';
@@ -10,31 +8,17 @@ import TableContainer from '@mui/material/TableContainer';
 import TableHead from '@mui/material/TableHead';
 import TableRow from '@mui/material/TableRow';
 import Paper from '@mui/material/Paper';
-import config from '../config';
+import LoadMoreButton from '../components/LoadMoreButton';
+import usePaginatedList from '../hooks/usePaginatedList';
 
 /**
  * Displays a history of SOP version changes.
  */
 function HistoryPage() {
-  const { getAccessTokenSilently } = useAuth0();
-  const [changes, setChanges] = useState([]);
-  const [error, setError] = useState(null);
-
-  useEffect(() => {
-    async function loadChanges() {
-      try {
-        const token = await getAccessTokenSilently();
-        const resp = await axios.get(`${config.apiBaseUrl}/version-changes/`, {
-          headers: { Authorization: `Bearer ${token}` },
-        });
-        setChanges(resp.data);
-      } catch (err) {
-        console.error(err);
-        setError(err);
-      }
-    }
-    loadChanges();
-  }, [getAccessTokenSilently]);
+  const { items: changes, error, loading, hasMore, loadMore } = usePaginatedList(
+    '/version-changes/?fields=id,sop.sop_name,old_version_number,new_version_number,' +
+      'old_effective_date,new_effective_date,change_date'
+  );
 
   return (
     <Box sx={{ p: 3 }}>
@@ -74,6 +58,7 @@ function HistoryPage() {
           </TableBody>
         </Table>
       </TableContainer>
+      <LoadMoreButton hasMore={hasMore} loading={loading} onClick={loadMore} />
     </Box>
   );
 }
@@ -1,6 +1,4 @@
-import React, { useEffect, useState } from 'react';
-import axios from 'axios';
-import { useAuth0 } from '@auth0/auth0-react';
+import React from 'react';
 import Box from '@mui/material/Box';
 import Typography from '@mui/material/Typography';
 import Table from '@mui/material/Table';
@@ -10,31 +8,18 @@ import TableContainer from '@mui/material/TableContainer';
 import TableHead from '@mui/material/TableHead';
 import TableRow from '@mui/material/TableRow';
 import Paper from '@mui/material/Paper';
-import config from '../config';
+import LoadMoreButton from '../components/LoadMoreButton';
+import usePaginatedList from '../hooks/usePaginatedList';
 
 /**
- * Displays a table of all samples in the system.
+ * Displays a table of all samples in the system, newest first, one page
+ * at a time.
  */
 function SamplesPage() {
-  const { getAccessTokenSilently } = useAuth0();
-  const [samples, setSamples] = useState([]);
-  const [error, setError] = useState(null);
-
-  useEffect(() => {
-    async function loadSamples() {
-      try {
-        const token = await getAccessTokenSilently();
-        const resp = await axios.get(`${config.apiBaseUrl}/samples/`, {
-          headers: { Authorization: `Bearer ${token}` },
-        });
-        setSamples(resp.data);
-      } catch (err) {
-        console.error(err);
-        setError(err);
-      }
-    }
-    loadSamples();
-  }, [getAccessTokenSilently]);
+  const { items: samples, error, loading, hasMore, loadMore } = usePaginatedList(
+    '/samples/?fields=id,product_name,product_stage,quantity,sample_type,storage_conditions,' +
+      'time_received,warehouse.warehouse_facility,location.location_type,location.room_number'
+  );
 
   return (
     <Box sx={{ p: 3 }}>
@@ -80,6 +65,7 @@ function SamplesPage() {
           </TableBody>
         </Table>
       </TableContainer>
+      <LoadMoreButton hasMore={hasMore} loading={loading} onClick={loadMore} />
     </Box>
   );
 }